@@ -1,12 +1,165 @@
 from __future__ import annotations
 import os
-import pandas as pd
+import time
+from contextlib import asynccontextmanager
+import yaml
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
-from src.ranking.inference.rank import rank_candidates
+from typing import List, Dict, Any, Optional
+from src.ranking.api.batching import BatcherConfig, QueueFullError, RankBatcher
+from src.ranking.api.catalog import CatalogStore
+from src.ranking.api.response_cache import ResponseCache, candidates_digest, context_bucket, ranked_nbytes
+from src.ranking.data.interaction_store import store_path
+from src.ranking.features.online_store import OnlineFeatureStore, OnlineStoreFeeder
+from src.ranking.inference.rank import SCORERS, rank_candidates_batch
+from src.ranking.inference.shadow import ShadowScorer
+from src.ranking.models.registry import get_registry, RegistryPaths
+from src.ranking.monitoring.metrics import ERRORS, REQUEST_SECONDS, get_metrics, stage
+from src.ranking.retrieval.cooccurrence import INDEX_DIR, INDEX_FILE, get_index
 
-app = FastAPI(title="Content Ranking API", version="1.0")
+def _config_paths(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return (yaml.safe_load(f) or {}).get("paths", {})
+
+# Directories from the training config's paths: section; the RANKING_* env vars override them
+CONFIG_PATHS = _config_paths(os.environ.get("RANKING_CONFIG", "configs/ranker.yaml"))
+# Demo catalog + interaction log from data/raw.
+RAW_DIR = os.environ.get("RANKING_RAW_DIR", CONFIG_PATHS.get("raw_dir", "data/raw"))
+MODEL_PATHS = RegistryPaths(models_dir=os.environ.get("RANKING_MODELS_DIR", CONFIG_PATHS.get("artifacts_models", "artifacts/models")))
+REPORTS_DIR = CONFIG_PATHS.get("artifacts_reports", "artifacts/reports")
+# "booster" (LightGBM predict) or "compiled" (the registry's flattened NumPy forest)
+SCORER = os.environ.get("RANKING_SCORER", "booster")
+if SCORER not in SCORERS:
+    raise ValueError(f"RANKING_SCORER must be one of {SCORERS}, got {SCORER!r}")
+catalog = CatalogStore(
+    raw_dir=RAW_DIR,
+    check_interval_s=float(os.environ.get("RANKING_CATALOG_CHECK_S", "5")),
+)
+
+# 30-day user/item aggregates, loaded from interactions.csv or the partitioned store and kept current by polling them
+online_store = OnlineFeatureStore(
+    window_days=int(os.environ.get("RANKING_HISTORY_WINDOW_DAYS", "30")),
+    extra_windows=[int(w) for w in os.environ.get("RANKING_EXTRA_WINDOWS_DAYS", "").split(",") if w.strip()],
+    recent_items=int(os.environ.get("RANKING_RECENT_ITEMS", "20")),
+)
+# /recommend: co-occurrence candidates from the user's recent items, then the ranker
+RETRIEVAL_INDEX_PATH = os.environ.get("RANKING_RETRIEVAL_INDEX", os.path.join(MODEL_PATHS.models_dir, INDEX_DIR, INDEX_FILE))
+RETRIEVAL_CANDIDATES = int(os.environ.get("RANKING_RETRIEVAL_CANDIDATES", "300"))
+
+online_feeder = OnlineStoreFeeder(
+    online_store,
+    path=os.path.join(RAW_DIR, "interactions.csv"),
+    poll_interval_s=float(os.environ.get("RANKING_EVENTS_POLL_S", "5")),
+    store_dir=store_path(RAW_DIR),
+)
+
+# routing.json's shadow version scores every request off the response path; comparisons land in this JSONL
+shadow_scorer = ShadowScorer(
+    path=os.environ.get("RANKING_SHADOW_LOG", os.path.join(REPORTS_DIR, "shadow_scores.jsonl")),
+    scorer=SCORER,
+    max_queue=int(os.environ.get("RANKING_SHADOW_MAX_QUEUE", "64")),
+)
+
+def _score_batch(payloads: list[dict]) -> list[tuple[list[dict], str]]:
+    # one routing snapshot per micro-batch; every request reports the version that scored it
+    registry = get_registry()
+    routing = registry.routing(MODEL_PATHS)
+    models = [registry.route(MODEL_PATHS, p["user_row"].get("user_id"), routing)[1] for p in payloads]
+    ranked = rank_candidates_batch(payloads, models=models, online_store=online_store, scorer=SCORER,
+                                   shadow_model=registry.shadow(MODEL_PATHS, routing), shadow=shadow_scorer)
+    return [(r, m.version) for r, m in zip(ranked, models)]
+
+# Concurrent /rank calls are coalesced into one predict per window
+batcher = RankBatcher(_score_batch, BatcherConfig(
+    window_ms=float(os.environ.get("RANKING_BATCH_WINDOW_MS", "2")),
+    max_batch_size=int(os.environ.get("RANKING_BATCH_MAX_SIZE", "64")),
+    max_queue_depth=int(os.environ.get("RANKING_BATCH_MAX_QUEUE", "1024")),
+    workers=int(os.environ.get("RANKING_BATCH_WORKERS", "1")),
+))
+
+# Ranked responses keyed on (user, candidate set, context bucket). An entry remembers the model version,
+# catalog files and the user's online-aggregate version it was scored with and is dropped when any of them
+# moves; item-side aggregates (other users' events) are only bounded by the TTL. RANKING_CACHE_MAX_MB=0 disables.
+response_cache = ResponseCache(
+    max_bytes=int(float(os.environ.get("RANKING_CACHE_MAX_MB", "64")) * 2**20),
+    ttl_s=float(os.environ.get("RANKING_CACHE_TTL_S", "300")),
+)
+# hours per context bucket (1: exact hour)
+CACHE_HOUR_BUCKET = int(os.environ.get("RANKING_CACHE_HOUR_BUCKET", "1"))
+
+def _cache_key(user_id: str, item_ids: List[str], context: dict) -> tuple:
+    return (user_id, candidates_digest(item_ids), context_bucket(context, CACHE_HOUR_BUCKET))
+
+def _feature_state(user_id: str, snap) -> tuple:
+    # read before scoring: an update that lands mid-request invalidates the entry on the next lookup
+    return (snap.signature, online_store.generation, online_store.now_day, online_store.user_version(user_id))
+
+get_metrics().gauge("ranking_batch_queue_depth", "Requests waiting for a scoring batch.",
+                     lambda: {(): batcher.stats()["queue_depth"]})
+get_metrics().gauge("ranking_response_cache_bytes", "Approximate memory held by cached responses.",
+                     lambda: {(): response_cache.bytes})
+get_metrics().gauge("ranking_model_info", "Model version being served.",
+                    lambda: {(v,): 1 for v in [get_registry().serving_version(MODEL_PATHS)] if v}, ["version"])
+
+# error type per status code the endpoints return (anything unhandled is counted by exception class)
+ERROR_TYPES = {400: "catalog_missing", 404: "unknown_id", 422: "invalid_request", 503: "unavailable"}
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: request time by endpoint + status (ranking_request_seconds) and
+    failures by type (ranking_errors_total). Unknown paths share the "other" endpoint label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.endpoints: Optional[set] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if self.endpoints is None:
+            self.endpoints = {getattr(r, "path", None) for r in scope["app"].routes}
+        endpoint = scope["path"] if scope["path"] in self.endpoints else "other"
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as e:
+            ERRORS.inc(endpoint, type(e).__name__)
+            raise
+        finally:
+            REQUEST_SECONDS.labels(endpoint, str(status)).observe(time.perf_counter() - t0)
+        if status >= 400:
+            ERRORS.inc(endpoint, "unknown_endpoint" if endpoint == "other" else ERROR_TYPES.get(status, f"http_{status}"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    catalog.start()
+    online_feeder.start()
+    try:
+        get_registry().warm(MODEL_PATHS)  # load the served (and routed) models before the first request
+    except FileNotFoundError:
+        pass
+    shadow_scorer.start()
+    await batcher.start()
+    yield
+    await batcher.stop()
+    shadow_scorer.stop()
+    online_feeder.stop()
+    catalog.stop()
+
+app = FastAPI(title="Content Ranking API", version="1.0", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 class Context(BaseModel):
     device: str = "tv"
@@ -19,43 +172,147 @@ class RankRequest(BaseModel):
     candidates: List[str] = Field(min_length=1)
     context: Context = Context()
 
+class BatchRankRequest(BaseModel):
+    requests: List[RankRequest] = Field(min_length=1)
+
+class RecommendRequest(BaseModel):
+    user_id: str
+    n: int = Field(default=20, ge=1, le=1000)
+    n_candidates: Optional[int] = Field(default=None, ge=1)
+    context: Context = Context()
+
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    routing = get_registry().status().get(os.path.abspath(MODEL_PATHS.models_dir), {}).get("routing")
+    return {"status": "ok", "model_version": get_registry().serving_version(MODEL_PATHS), "routing": routing}
 
-@app.post("/rank")
-def rank(req: RankRequest):
-    # Load raw user/item info (demo). Production would come from online feature store.
-    raw_dir = "data/raw"
-    users_path = os.path.join(raw_dir, "users.csv")
-    items_path = os.path.join(raw_dir, "items.csv")
+def _lookup(req: RankRequest, snap) -> tuple[dict, list[dict]]:
+    with stage("catalog_lookup").time():
+        user_row = catalog.get_user(req.user_id, snapshot=snap)
+        item_rows, missing = catalog.get_items(req.candidates, snapshot=snap) if user_row is not None else ([], [])
+    if user_row is None:
+        raise HTTPException(status_code=404, detail=f"Unknown user_id: {req.user_id}")
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Unknown item_ids: {sorted(missing)}")
+    return user_row, item_rows
+
+async def _score_cached(user_id: str, candidate_ids: List[str], user_row: dict, item_rows: list[dict],
+                        context: dict, snap) -> tuple[list[dict], str]:
+    key = _cache_key(user_id, candidate_ids, context)
+    state = _feature_state(user_id, snap)
+    hit = response_cache.get(key, (get_registry().route(MODEL_PATHS, user_id)[1].version, state))
+    if hit is not None:
+        return hit
+    try:
+        ranked, version = await batcher.submit({"user_row": user_row, "item_rows": item_rows, "context": context})
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    response_cache.put(key, (version, state), (ranked, version), ranked_nbytes(ranked))
+    return ranked, version
 
-    if not (os.path.exists(users_path) and os.path.exists(items_path)):
+def _catalog_snapshot():
+    snap = catalog.snapshot
+    if snap is None:
         raise HTTPException(status_code=400, detail="Missing data/raw/users.csv or data/raw/items.csv. Run offline generation first.")
+    return snap
 
-    users = pd.read_csv(users_path)
-    items = pd.read_csv(items_path)
+@app.post("/rank")
+async def rank(req: RankRequest):
+    snap = _catalog_snapshot()
+    user_row, item_rows = _lookup(req, snap)
+    ranked, version = await _score_cached(req.user_id, req.candidates, user_row, item_rows, req.context.model_dump(), snap)
+    return {
+        "user_id": req.user_id,
+        "ranked": ranked,
+        "context": req.context.model_dump(),
+        "model_version": version,
+    }
 
-    user = users[users["user_id"] == req.user_id]
-    if user.empty:
+@app.post("/recommend")
+async def recommend(req: RecommendRequest):
+    """
+    Best n items for a user from the whole catalog: retrieve n_candidates items through the
+    co-occurrence index (seeded with the user's recent engaged items from the online store),
+    then score them with the ranker like /rank.
+    """
+    snap = _catalog_snapshot()
+    user_row = catalog.get_user(req.user_id, snapshot=snap)
+    if user_row is None:
         raise HTTPException(status_code=404, detail=f"Unknown user_id: {req.user_id}")
+    try:
+        index = get_index(RETRIEVAL_INDEX_PATH)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
-    cand_items = items[items["item_id"].isin(req.candidates)]
-    missing = set(req.candidates) - set(cand_items["item_id"].tolist())
-    if missing:
-        raise HTTPException(status_code=404, detail=f"Unknown item_ids: {sorted(list(missing))}")
-
-    user_row = user.iloc[0].to_dict()
-    item_rows = cand_items.to_dict(orient="records")
+    t0 = time.perf_counter()
+    recent = online_store.recent_items(req.user_id)
+    n_candidates = max(req.n, req.n_candidates or RETRIEVAL_CANDIDATES)
+    candidate_ids = index.retrieve(recent, n_candidates, exclude=recent)
+    # the index can be older than the catalog: drop items that are gone
+    item_rows, _ = catalog.get_items(candidate_ids, snapshot=snap)
+    retrieval_ms = (time.perf_counter() - t0) * 1000.0
+    stage("retrieval").observe(retrieval_ms / 1000.0)
+    if not item_rows:
+        return {"user_id": req.user_id, "recommended": [], "n_candidates": 0, "retrieval_ms": retrieval_ms,
+                "context": req.context.model_dump(), "model_version": get_registry().serving_version(MODEL_PATHS)}
 
-    ranked = rank_candidates(
-        user_row=user_row,
-        item_rows=item_rows,
-        context=req.context.model_dump(),
-        models_dir="artifacts/models",
-    )
+    ranked, version = await _score_cached(req.user_id, [it["item_id"] for it in item_rows], user_row, item_rows,
+                                          req.context.model_dump(), snap)
     return {
         "user_id": req.user_id,
-        "ranked": ranked,
+        "recommended": ranked[:req.n],
+        "n_candidates": len(item_rows),
+        "retrieval_ms": retrieval_ms,
         "context": req.context.model_dump(),
+        "model_version": version,
     }
+
+@app.post("/rank/batch")
+def rank_batch(req: BatchRankRequest):
+    """
+    Many /rank requests scored with one model call. Results keep request order;
+    a request with an unknown user/item gets an "error" entry instead of failing the batch.
+    """
+    snap = _catalog_snapshot()
+    registry = get_registry()
+    routing = registry.routing(MODEL_PATHS)
+    results: list[Dict[str, Any]] = []
+    batch, slots = [], []
+    for r in req.requests:
+        try:
+            user_row, item_rows = _lookup(r, snap)
+        except HTTPException as e:
+            results.append({"user_id": r.user_id, "error": {"status_code": e.status_code, "detail": e.detail}})
+            continue
+        context = r.context.model_dump()
+        key, state = _cache_key(r.user_id, r.candidates, context), _feature_state(r.user_id, snap)
+        version = registry.route(MODEL_PATHS, r.user_id, routing)[1].version
+        hit = response_cache.get(key, (version, state))
+        results.append({"user_id": r.user_id, "ranked": hit[0] if hit else None, "context": context,
+                        "model_version": version})
+        if hit is None:
+            slots.append((len(results) - 1, key, state))
+            batch.append({"user_row": user_row, "item_rows": item_rows, "context": context})
+
+    if batch:
+        for (i, key, state), (out, version) in zip(slots, _score_batch(batch)):
+            results[i]["ranked"], results[i]["model_version"] = out, version
+            response_cache.put(key, (version, state), (out, version), ranked_nbytes(out))
+    return {"results": results, "model_version": registry.get(MODEL_PATHS).version}
+
+@app.get("/stats/batching")
+def batching_stats():
+    return batcher.stats()
+
+@app.get("/stats/shadow")
+def shadow_stats():
+    return shadow_scorer.stats()
+
+@app.get("/stats/cache")
+def cache_stats():
+    return response_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Stage / request latency histograms, candidate and batch sizes, error counters (Prometheus text format)."""
+    return PlainTextResponse(get_metrics().render(), media_type="text/plain; version=0.0.4; charset=utf-8")
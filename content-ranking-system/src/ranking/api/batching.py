@@ -0,0 +1,179 @@
+from __future__ import annotations
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.ranking.monitoring.metrics import stage
+
+# queue-wait histogram bucket upper bounds (ms)
+WAIT_BUCKETS_MS = [0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, float("inf")]
+
+@dataclass
+class BatcherConfig:
+    window_ms: float = 2.0       # how long the first request of a batch waits for company
+    max_batch_size: int = 64     # requests per predict call
+    max_queue_depth: int = 1024  # pending requests before new ones are rejected
+    workers: int = 1             # batches scored concurrently
+
+class QueueFullError(RuntimeError):
+    pass
+
+class RankBatcher:
+    """
+    Asyncio micro-batcher in front of the ranker.
+    - submit() enqueues one rank request and awaits its own result
+    - A worker collects concurrent requests for up to window_ms (or max_batch_size),
+      scores them with one score_fn call on a worker thread and resolves each future
+      with its slice of the results
+    - If the batch call raises, every request is re-scored on its own, so only the
+      requests that fail by themselves get the exception
+    score_fn: list of payloads -> list of results (same order)
+    """
+
+    def __init__(self, score_fn: Callable[[List[Any]], List[Any]], config: Optional[BatcherConfig] = None):
+        self.score_fn = score_fn
+        self.config = config or BatcherConfig()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self.requests = 0
+        self.batches = 0
+        self.rejected = 0
+        self.errors = 0
+        self.fallbacks = 0
+        self.max_batch_seen = 0
+        self.batch_size_counts: Dict[int, int] = {}
+        self.wait_bucket_counts = [0] * len(WAIT_BUCKETS_MS)
+        self.wait_ms_sum = 0.0
+        self.wait_ms_max = 0.0
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=max(1, int(self.config.max_queue_depth)))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(max(1, int(self.config.workers)))]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, fut, _ = self._queue.get_nowait()
+                if not fut.done():
+                    fut.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, payload: Any) -> Any:
+        if self._queue is None:
+            raise RuntimeError("Batcher not started")
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((payload, fut, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError(f"Rank queue full ({self.config.max_queue_depth} pending)") from None
+        return await fut
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        q = self._queue
+        batch = [await q.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.config.window_ms / 1000.0
+        while len(batch) < self.config.max_batch_size:
+            try:
+                batch.append(q.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(q.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _record(self, batch: List[Tuple[Any, asyncio.Future, float]]) -> None:
+        now = time.perf_counter()
+        n = len(batch)
+        self.batches += 1
+        self.requests += n
+        self.max_batch_seen = max(self.max_batch_seen, n)
+        self.batch_size_counts[n] = self.batch_size_counts.get(n, 0) + 1
+        queue_wait = stage("queue_wait")
+        for _, _, t0 in batch:
+            queue_wait.observe(now - t0)
+            w = (now - t0) * 1000.0
+            self.wait_ms_sum += w
+            self.wait_ms_max = max(self.wait_ms_max, w)
+            for i, ub in enumerate(WAIT_BUCKETS_MS):
+                if w <= ub:
+                    self.wait_bucket_counts[i] += 1
+                    break
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            self._record(batch)
+            live = [(p, f) for p, f, _ in batch if not f.cancelled()]
+            if not live:
+                continue
+            try:
+                results = await loop.run_in_executor(None, self.score_fn, [p for p, _ in live])
+                outcomes = [(True, r) for r in results]
+            except Exception as e:
+                if len(live) == 1:
+                    outcomes = [(False, e)]
+                else:
+                    # one bad request must not fail the others coalesced with it
+                    self.fallbacks += 1
+                    outcomes = await loop.run_in_executor(None, self._score_each, [p for p, _ in live])
+            for (_, f), (ok, res) in zip(live, outcomes):
+                if not ok:
+                    self.errors += 1
+                if f.done():
+                    continue
+                if ok:
+                    f.set_result(res)
+                else:
+                    f.set_exception(res)
+
+    def _score_each(self, payloads: List[Any]) -> List[Tuple[bool, Any]]:
+        out = []
+        for p in payloads:
+            try:
+                out.append((True, self.score_fn([p])[0]))
+            except Exception as e:
+                out.append((False, e))
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "config": {
+                "window_ms": self.config.window_ms,
+                "max_batch_size": self.config.max_batch_size,
+                "max_queue_depth": self.config.max_queue_depth,
+                "workers": self.config.workers,
+            },
+            "requests": self.requests,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "fallbacks": self.fallbacks,
+            "queue_depth": 0 if self._queue is None else self._queue.qsize(),
+            "batch_size": {
+                "mean": self.requests / self.batches if self.batches else 0.0,
+                "max": self.max_batch_seen,
+                "counts": {str(k): v for k, v in sorted(self.batch_size_counts.items())},
+            },
+            "queue_wait_ms": {
+                "mean": self.wait_ms_sum / self.requests if self.requests else 0.0,
+                "max": self.wait_ms_max,
+                "buckets": {("+Inf" if ub == float("inf") else str(ub)): c
+                            for ub, c in zip(WAIT_BUCKETS_MS, self.wait_bucket_counts)},
+            },
+        }
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+
+from src.ranking.monitoring.metrics import stage
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    users: Dict[str, dict]
+    items: Dict[str, dict]
+    signature: tuple
+    loaded_at: float
+
+class CatalogStore:
+    """
+    In-memory user/item catalog for online ranking.
+    - Loaded once at startup, keyed by user_id / item_id (O(1) row lookups)
+    - A watcher thread reloads it when users.csv / items.csv change on disk
+    - Readers always see one complete snapshot: a reload builds a new one and swaps the reference
+    """
+
+    def __init__(self, raw_dir: str = "data/raw", check_interval_s: float = 5.0):
+        self.users_path = os.path.join(raw_dir, "users.csv")
+        self.items_path = os.path.join(raw_dir, "items.csv")
+        self.check_interval_s = float(check_interval_s)
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        return self._snapshot
+
+    def _signature(self) -> Optional[tuple]:
+        try:
+            su = os.stat(self.users_path)
+            si = os.stat(self.items_path)
+        except FileNotFoundError:
+            return None
+        return (su.st_mtime_ns, su.st_size, si.st_mtime_ns, si.st_size)
+
+    def load(self) -> bool:
+        """
+        (Re)load both files into a new snapshot. Returns True if a snapshot was swapped in.
+        A failed or torn read (files changed while parsing) keeps serving the previous snapshot.
+        """
+        with self._lock:
+            sig = self._signature()
+            if sig is None:
+                return False
+            t0 = time.perf_counter()
+            try:
+                users = pd.read_csv(self.users_path)
+                items = pd.read_csv(self.items_path)
+            except (OSError, ValueError, pd.errors.ParserError):
+                return False
+            if self._signature() != sig:
+                return False
+
+            # first row wins on duplicate ids (same as the old users[...].iloc[0] lookup)
+            users = users.drop_duplicates(subset="user_id", keep="first")
+            items = items.drop_duplicates(subset="item_id", keep="first")
+            snap = CatalogSnapshot(
+                users={str(r["user_id"]): r for r in users.to_dict(orient="records")},
+                items={str(r["item_id"]): r for r in items.to_dict(orient="records")},
+                signature=sig,
+                loaded_at=time.time(),
+            )
+            self._snapshot = snap
+            stage("catalog_load").observe(time.perf_counter() - t0)
+            return True
+
+    def maybe_reload(self) -> bool:
+        sig = self._signature()
+        snap = self._snapshot
+        if sig is None or (snap is not None and snap.signature == sig):
+            return False
+        return self.load()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.check_interval_s):
+            self.maybe_reload()
+
+    def start(self) -> None:
+        self.load()
+        if self._watcher is None and self.check_interval_s > 0:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="catalog-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.check_interval_s + 1.0)
+            self._watcher = None
+
+    def get_user(self, user_id: str, snapshot: Optional[CatalogSnapshot] = None) -> Optional[dict]:
+        snap = snapshot or self._snapshot
+        return None if snap is None else snap.users.get(user_id)
+
+    def get_items(self, item_ids: List[str], snapshot: Optional[CatalogSnapshot] = None) -> Tuple[List[dict], List[str]]:
+        """
+        Rows for the given ids in request order (duplicates collapsed) plus the ids that are not in the catalog.
+        """
+        snap = snapshot or self._snapshot
+        if snap is None:
+            return [], list(dict.fromkeys(item_ids))
+        rows, missing = [], []
+        for it in dict.fromkeys(item_ids):
+            row = snap.items.get(it)
+            if row is None:
+                missing.append(it)
+            else:
+                rows.append(row)
+        return rows, missing
@@ -0,0 +1,116 @@
+from __future__ import annotations
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from src.ranking.monitoring.metrics import RESPONSE_CACHE
+
+def candidates_digest(item_ids: List[str]) -> str:
+    """Order- and duplicate-independent hash of a candidate list (the catalog lookup collapses duplicates before ranking)."""
+    h = hashlib.blake2b(digest_size=16)
+    for it in sorted(set(map(str, item_ids))):
+        h.update(it.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def context_bucket(context: Dict[str, Any], hour_bucket: int = 1) -> Tuple:
+    """(device, hour // hour_bucket, day_of_week, session_id): requests in one bucket share a cached ranking."""
+    return (
+        str(context.get("device", "tv")),
+        int(context.get("hour", 20)) // max(1, int(hour_bucket)),
+        int(context.get("day_of_week", 2)),
+        str(context.get("session_id", "s_online")),
+    )
+
+def ranked_nbytes(ranked: List[dict]) -> int:
+    """Approximate memory held by a ranked list of flat dicts."""
+    n = sys.getsizeof(ranked)
+    for r in ranked:
+        n += sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r.values())
+    return n
+
+class ResponseCache:
+    """
+    LRU + TTL cache of ranked responses, bounded by approximate bytes.
+    - key: what was asked (user, candidate-set hash, context bucket)
+    - stamp: what the answer depended on (model version, the user's online-feature version, ...);
+      a lookup whose stamp differs from the stored one is a miss and drops the entry
+    - Entries older than ttl_s are dropped on lookup; least recently used ones when over max_bytes
+    max_bytes <= 0 disables the cache (every get is a miss, put does nothing).
+    """
+
+    def __init__(self, max_bytes: int, ttl_s: float, clock: Callable[[], float] = time.monotonic):
+        self.max_bytes = int(max_bytes)
+        self.ttl_s = float(ttl_s)
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, Any, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.counts = {e: 0 for e in ("hit", "miss", "expired", "invalidated", "evicted")}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _count(self, event: str) -> None:
+        self.counts[event] += 1
+        RESPONSE_CACHE.labels(event).inc()
+
+    def _drop(self, key: Hashable) -> None:
+        _, _, nbytes, _ = self._entries.pop(key)
+        self.bytes -= nbytes
+
+    def get(self, key: Hashable, stamp: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._count("miss")
+                return None
+            stored_stamp, value, _, created = entry
+            if self.clock() - created > self.ttl_s:
+                self._drop(key)
+                self._count("expired")
+                self._count("miss")
+                return None
+            if stored_stamp != stamp:
+                self._drop(key)
+                self._count("invalidated")
+                self._count("miss")
+                return None
+            self._entries.move_to_end(key)
+            self._count("hit")
+            return value
+
+    def put(self, key: Hashable, stamp: Hashable, value: Any, nbytes: int) -> None:
+        if not self.enabled or nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (stamp, value, int(nbytes), self.clock())
+            self.bytes += int(nbytes)
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._count("evicted")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counts["hit"] + self.counts["miss"]
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            **self.counts,
+            "hit_rate": self.counts["hit"] / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,92 @@
+"""
+Benchmark one-hot vs native (int32-coded) categoricals on the processed splits written by train_ltr:
+training RAM, encode/train time and single-slate predict latency.
+
+    python -m src.ranking.bench.categorical_encoding --config configs/ranker.yaml
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import yaml
+import lightgbm as lgb
+
+from src.ranking.bench.common import run_isolated, write_report, git_commit
+from src.ranking.models.train_ltr import _encode_frame, _build_params, _build_group_sizes
+
+CAT_COLS = ["user_id", "session_id", "item_id", "age_bucket", "country", "genre", "maturity", "device"]
+DROP_COLS = ["label", "timestamp", "watch_minutes"]
+
+def _run_mode(processed_dir: str, mode: str, feat_cfg: dict, model_cfg: dict,
+              num_boost_round: int, slate_size: int, n_predict: int) -> dict:
+    train_df = pd.read_parquet(os.path.join(processed_dir, "train.parquet"))
+    val_df = pd.read_parquet(os.path.join(processed_dir, "val.parquet"))
+
+    t0 = time.perf_counter()
+    train_rows, val_rows = slice(0, len(train_df)), slice(len(train_df), len(train_df) + len(val_df))
+    X, enc_meta = _encode_frame(pd.concat([train_df, val_df], ignore_index=True).drop(columns=DROP_COLS),
+                                train_rows, CAT_COLS, {**feat_cfg, "categorical_encoding": mode})
+    X_train, X_val = X.iloc[train_rows], X.iloc[val_rows]
+    encode_s = time.perf_counter() - t0
+
+    categorical_feature = enc_meta.get("categorical_features", "auto")
+    train_set = lgb.Dataset(X_train, label=train_df["label"].to_numpy(), group=_build_group_sizes(train_df[["user_id", "session_id"]]),
+                            categorical_feature=categorical_feature)
+    t0 = time.perf_counter()
+    booster = lgb.train(_build_params(model_cfg), train_set, num_boost_round=num_boost_round)
+    train_s = time.perf_counter() - t0
+
+    X = X_val.to_numpy(dtype=np.float32)
+    rng = np.random.default_rng(0)
+    lat = []
+    for _ in range(n_predict):
+        start = int(rng.integers(0, max(1, len(X) - slate_size)))
+        slate = X[start:start + slate_size]
+        t0 = time.perf_counter()
+        booster.predict(slate)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+
+    return {
+        "n_features": int(X_train.shape[1]),
+        "train_matrix_mb": float(X_train.memory_usage(deep=True).sum() / 1e6),
+        "encode_s": encode_s,
+        "train_s": train_s,
+        "predict_ms_p50": float(np.percentile(lat, 50)),
+        "predict_ms_p95": float(np.percentile(lat, 95)),
+    }
+
+def main(config_path: str, num_boost_round: int, slate_size: int, n_predict: int) -> None:
+    with open(config_path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    processed_dir = cfg["paths"]["processed_dir"]
+    if not os.path.exists(os.path.join(processed_dir, "train.parquet")):
+        raise FileNotFoundError(f"Missing processed splits in {processed_dir}. Run train_ltr first.")
+
+    results = {}
+    for mode in ("onehot", "native"):
+        out = run_isolated(_run_mode, processed_dir, mode, cfg["features"], cfg["model"], num_boost_round, slate_size, n_predict)
+        results[mode] = {**out["result"], "peak_rss_mb": out["peak_rss_mb"], "rss_before_mb": out["rss_before_mb"]}
+        r = results[mode]
+        print(f"{mode:>7}: features={r['n_features']:>6} peak_rss={r['peak_rss_mb']:8.1f}MB encode={r['encode_s']:.2f}s "
+              f"train={r['train_s']:.2f}s predict p50={r['predict_ms_p50']:.3f}ms p95={r['predict_ms_p95']:.3f}ms")
+
+    report = {
+        "benchmark": "categorical_encoding",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "commit": git_commit(),
+        "num_boost_round": num_boost_round,
+        "slate_size": slate_size,
+        "results": results,
+    }
+    write_report(os.path.join(cfg["paths"]["artifacts_reports"], "bench_categorical_encoding.json"), report)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", required=True)
+    ap.add_argument("--rounds", type=int, default=100)
+    ap.add_argument("--slate-size", type=int, default=100)
+    ap.add_argument("--n-predict", type=int, default=200)
+    args = ap.parse_args()
+    main(args.config, args.rounds, args.slate_size, args.n_predict)
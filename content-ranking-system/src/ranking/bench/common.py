@@ -0,0 +1,73 @@
+from __future__ import annotations
+import json
+import multiprocessing as mp
+import os
+import resource
+import subprocess
+import sys
+import time
+import traceback
+from typing import Any, Callable, Dict
+
+def peak_rss_mb() -> float:
+    """High-water resident set size of this process (MB)."""
+    # VmHWM belongs to the current address space; ru_maxrss survives fork+exec on Linux,
+    # so a spawned child would report its parent's peak
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return r / (1024.0 * 1024.0) if sys.platform == "darwin" else r / 1024.0
+
+def _child(conn, fn: Callable, args: tuple, kwargs: dict) -> None:
+    rss_before = peak_rss_mb()
+    t0 = time.perf_counter()
+    try:
+        result, error = fn(*args, **kwargs), None
+    except Exception:
+        result, error = None, traceback.format_exc()
+    conn.send({
+        "result": result,
+        "error": error,
+        "wall_s": time.perf_counter() - t0,
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+    })
+    conn.close()
+
+def run_isolated(fn: Callable, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+    """
+    Run fn(*args, **kwargs) in a fresh spawned process so peak RSS belongs to that call alone.
+    Returns {"result", "wall_s", "rss_before_mb", "peak_rss_mb"}; fn must be importable (top-level).
+    """
+    ctx = mp.get_context("spawn")
+    recv, send = ctx.Pipe(duplex=False)
+    p = ctx.Process(target=_child, args=(send, fn, args, kwargs))
+    p.start()
+    send.close()
+    try:
+        out = recv.recv()
+    except EOFError:
+        p.join()
+        raise RuntimeError(f"Benchmark process for {fn.__name__} died (exit code {p.exitcode})")
+    p.join()
+    if out["error"]:
+        raise RuntimeError(f"Benchmark {fn.__name__} failed:\n{out['error']}")
+    return out
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_report(path: str, payload: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"✅ Saved report: {path}")
@@ -0,0 +1,118 @@
+"""
+Scoring latency of LightGBM Booster.predict vs the registry's compiled NumPy forest, per batch
+size, on feature matrices built by the online encoder from catalog rows (the /rank path without
+the HTTP layer). Also checks that both scorers agree.
+
+    python -m src.ranking.bench.compiled_forest --config configs/ranker.yaml
+    python -m src.ranking.bench.compiled_forest --config configs/ranker.yaml --synthetic-rounds 300
+
+--synthetic-rounds trains a forest with the config's model params on random labels of the served
+feature layout instead, for trees of realistic size when the served model is small.
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+from typing import List
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+import yaml
+
+from src.ranking.bench.common import git_commit, write_report
+from src.ranking.inference.compiled_forest import compile_booster
+from src.ranking.inference.encoder import get_encoder
+from src.ranking.models.registry import LoadedModel, RegistryPaths, get_registry
+from src.ranking.models.train_ltr import _build_params
+
+CONTEXT = {"device": "tv", "hour": 20, "day_of_week": 2, "session_id": "s_bench"}
+
+def _feature_matrix(model: LoadedModel, raw_dir: str, n: int, seed: int) -> np.ndarray:
+    users = pd.read_csv(os.path.join(raw_dir, "users.csv")).drop_duplicates("user_id")
+    items = pd.read_csv(os.path.join(raw_dir, "items.csv")).drop_duplicates("item_id")
+    rng = np.random.default_rng(seed)
+    encoder = get_encoder(model.version, model.meta)
+    X = np.zeros((n, encoder.n_features), dtype=np.float32)
+    user_rows = users.to_dict(orient="records")
+    item_rows = items.to_dict(orient="records")
+    for s in range(0, n, len(item_rows)):
+        e = min(n, s + len(item_rows))
+        user_row = user_rows[int(rng.integers(len(user_rows)))]
+        encoder.transform(user_row, item_rows[: e - s], CONTEXT, out=X[s:e])
+    return X
+
+def _synthetic_model(model: LoadedModel, cfg: dict, X: np.ndarray, rounds: int, seed: int) -> LoadedModel:
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 4, len(X))
+    group = [50] * (len(X) // 50)
+    params = {**_build_params(cfg["model"]), "verbosity": -1, "seed": seed}
+    booster = lgb.train(params, lgb.Dataset(X[: sum(group)], label=y[: sum(group)], group=group), num_boost_round=rounds)
+    meta = {**model.meta, "best_iteration": 0}
+    return LoadedModel(booster=booster, meta=meta, version=f"{model.version}-synthetic", signature=(),
+                       loaded_at=time.time(), compiled=compile_booster(booster))
+
+def _latency_ms(fn, X: np.ndarray, repeats: int) -> List[float]:
+    fn(X)  # warm-up
+    out = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn(X)
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+def main(config_path: str, batch_sizes: List[int], repeats: int, synthetic_rounds: int) -> None:
+    with open(config_path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    seed = int(cfg["project"]["seed"])
+    model = get_registry().get(RegistryPaths(models_dir=cfg["paths"]["artifacts_models"]))
+    X_all = _feature_matrix(model, cfg["paths"]["raw_dir"], max(max(batch_sizes), 5000 if synthetic_rounds else 0), seed)
+    if synthetic_rounds:
+        model = _synthetic_model(model, cfg, X_all, synthetic_rounds, seed)
+    forest = model.compiled
+    best_iteration = model.meta.get("best_iteration", None)
+    booster_fn = lambda X: model.booster.predict(X, num_iteration=best_iteration)
+
+    results = []
+    for bs in batch_sizes:
+        X = X_all[:bs]
+        booster_ms = _latency_ms(booster_fn, X, repeats)
+        compiled_ms = _latency_ms(forest.predict, X, repeats)
+        row = {
+            "batch_size": bs,
+            "booster_ms_p50": float(np.percentile(booster_ms, 50)),
+            "booster_ms_p95": float(np.percentile(booster_ms, 95)),
+            "compiled_ms_p50": float(np.percentile(compiled_ms, 50)),
+            "compiled_ms_p95": float(np.percentile(compiled_ms, 95)),
+            "max_abs_diff": float(np.abs(forest.predict(X) - booster_fn(X)).max()),
+        }
+        row["speedup_p50"] = row["booster_ms_p50"] / row["compiled_ms_p50"]
+        results.append(row)
+        print(f"batch {bs:>5}: booster p50={row['booster_ms_p50']:.3f}ms compiled p50={row['compiled_ms_p50']:.3f}ms "
+              f"(x{row['speedup_p50']:.2f}) max|diff|={row['max_abs_diff']:.2e}")
+
+    report = {
+        "benchmark": "compiled_forest",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "commit": git_commit(),
+        "model_version": model.version,
+        "forest": {
+            "trees": forest.n_trees,
+            "split_nodes": int(len(forest.left)),
+            "leaves": int(len(forest.leaf_value)),
+            "max_depth": forest.max_depth,
+            "features": forest.n_features,
+        },
+        "repeats": repeats,
+        "threads": os.environ.get("OMP_NUM_THREADS"),
+        "results": results,
+    }
+    write_report(os.path.join(cfg["paths"]["artifacts_reports"], "bench_compiled_forest.json"), report)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", required=True)
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 20, 50, 100, 200, 1000])
+    ap.add_argument("--repeats", type=int, default=200)
+    ap.add_argument("--synthetic-rounds", type=int, default=0)
+    args = ap.parse_args()
+    main(args.config, args.batch_sizes, args.repeats, args.synthetic_rounds)
@@ -0,0 +1,73 @@
+"""
+Load time and peak RSS of raw interactions: interactions.csv vs the date-partitioned parquet
+store (full read, and the column/date-pruned read the online store bootstrap does).
+Each read runs in its own process.
+
+    python -m src.ranking.bench.interaction_store --rows 5000000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+import pandas as pd
+
+from src.ranking.bench.common import run_isolated, write_report, git_commit
+from src.ranking.bench.ranking_dataset import synthetic_tables
+from src.ranking.data.interaction_store import read_interactions, reset_store, store_path, write_partitioned
+
+RECENT_COLS = ["user_id", "item_id", "timestamp", "label", "watch_minutes"]
+
+def _dir_mb(path: str) -> float:
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 1e6
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs) / 1e6
+
+def _load(raw_dir: str, columns=None, start=None) -> dict:
+    t0 = time.perf_counter()
+    df = read_interactions(raw_dir, columns=columns, start=start)
+    return {"rows": int(len(df)), "load_s": time.perf_counter() - t0}
+
+def main(n_rows: int, recent_days: int, out_path: str, work_dir: str) -> None:
+    interactions, _, _ = synthetic_tables(n_rows, n_users=50_000, n_items=20_000)
+    interactions = interactions.sort_values("timestamp").reset_index(drop=True)
+    csv_dir = os.path.join(work_dir, "csv")
+    pq_dir = os.path.join(work_dir, "store")
+    os.makedirs(csv_dir, exist_ok=True)
+    interactions.to_csv(os.path.join(csv_dir, "interactions.csv"), index=False)
+    reset_store(store_path(pq_dir))
+    write_partitioned(interactions, store_path(pq_dir), "part-00000")
+    recent_start = interactions["timestamp"].max().normalize() - pd.Timedelta(days=recent_days - 1)
+    del interactions
+
+    cases = {
+        "csv_full": (csv_dir, None, None),
+        "parquet_full": (pq_dir, None, None),
+        "csv_recent_cols": (csv_dir, RECENT_COLS, recent_start),
+        "parquet_recent_cols": (pq_dir, RECENT_COLS, recent_start),
+    }
+    results = {}
+    for name, (raw_dir, cols, start) in cases.items():
+        out = run_isolated(_load, raw_dir, cols, start)
+        results[name] = {**out["result"], "peak_rss_mb": out["peak_rss_mb"]}
+        r = results[name]
+        print(f"{name:>20}: rows={r['rows']:>10} load={r['load_s']:6.2f}s peak_rss={r['peak_rss_mb']:8.1f}MB")
+
+    write_report(out_path, {
+        "benchmark": "interaction_store",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "commit": git_commit(),
+        "rows": n_rows,
+        "recent_days": recent_days,
+        "disk_mb": {"csv": _dir_mb(os.path.join(csv_dir, "interactions.csv")), "parquet": _dir_mb(store_path(pq_dir))},
+        "results": results,
+    })
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5_000_000)
+    ap.add_argument("--recent-days", type=int, default=30)
+    ap.add_argument("--out", default=os.path.join("artifacts", "reports", "bench_interaction_store.json"))
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        main(args.rows, args.recent_days, args.out, tmp)
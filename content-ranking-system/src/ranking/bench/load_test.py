@@ -0,0 +1,280 @@
+"""
+Load test of the ranking API: closed-loop clients (one keep-alive connection each) replay a
+request mix built from users.csv / items.csv and the run reports p50/p95/p99 latency, QPS and
+error rate per concurrency level, plus the server-side stage times from /metrics.
+
+The API is started on localhost in a separate process (the default, so client threads do not
+share the server's GIL), in a thread of this process (--in-process) or not at all (--url).
+
+    python -m src.ranking.bench.load_test --config configs/ranker.yaml --concurrency 1 8 32
+    python -m src.ranking.bench.load_test --config configs/ranker.yaml --url http://127.0.0.1:8000
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+import yaml
+
+from src.ranking.bench.common import git_commit, write_report
+
+DEVICES = ["tv", "mobile", "web", "tablet"]
+HEADERS = {"Content-Type": "application/json"}
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _get(host: str, port: int, path: str, timeout: float = 5.0) -> Tuple[int, str]:
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        return resp.status, resp.read().decode("utf-8")
+    finally:
+        conn.close()
+
+def _wait_healthy(host: str, port: int, timeout_s: float, alive: Callable[[], bool]) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if not alive():
+            raise RuntimeError("API server exited during startup")
+        try:
+            if _get(host, port, "/health", timeout=1.0)[0] == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"API server on {host}:{port} not healthy after {timeout_s:.0f}s")
+
+def start_server(raw_dir: str, models_dir: str, port: int, in_process: bool, env: Dict[str, str]) -> Callable[[], None]:
+    """Start the API on 127.0.0.1:port and wait for /health; returns a stop function."""
+    server_env = {**os.environ, **env, "RANKING_RAW_DIR": raw_dir, "RANKING_MODELS_DIR": models_dir}
+    if in_process:
+        import uvicorn
+        os.environ.update(server_env)  # read by src.ranking.api.app at import
+        server = uvicorn.Server(uvicorn.Config("src.ranking.api.app:app", host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, name="api-server", daemon=True)
+        thread.start()
+        _wait_healthy("127.0.0.1", port, 60.0, thread.is_alive)
+
+        def stop() -> None:
+            server.should_exit = True
+            thread.join(timeout=10.0)
+        return stop
+
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.ranking.api.app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=server_env,
+    )
+    try:
+        _wait_healthy("127.0.0.1", port, 60.0, lambda: proc.poll() is None)
+    except Exception:
+        proc.kill()
+        raise
+
+    def stop() -> None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10.0)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return stop
+
+def build_requests(raw_dir: str, n: int, candidate_sizes: List[int], recommend_frac: float, seed: int) -> List[Tuple[str, bytes]]:
+    """
+    n (path, JSON body) pairs: random catalog users, candidate lists of a random size from
+    candidate_sizes drawn without replacement from items.csv, random device/hour context;
+    a recommend_frac share goes to /recommend instead of /rank.
+    """
+    users = pd.read_csv(os.path.join(raw_dir, "users.csv"), usecols=["user_id"])["user_id"].astype(str).unique()
+    items = pd.read_csv(os.path.join(raw_dir, "items.csv"), usecols=["item_id"])["item_id"].astype(str).unique()
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(n):
+        context = {"device": DEVICES[int(rng.integers(len(DEVICES)))], "hour": int(rng.integers(24)),
+                   "day_of_week": int(rng.integers(7)), "session_id": f"s_load_{i}"}
+        user_id = str(users[int(rng.integers(len(users)))])
+        if rng.random() < recommend_frac:
+            out.append(("/recommend", json.dumps({"user_id": user_id, "n": 20, "context": context}).encode("utf-8")))
+            continue
+        size = min(int(candidate_sizes[int(rng.integers(len(candidate_sizes)))]), len(items))
+        candidates = rng.choice(items, size=size, replace=False).tolist()
+        out.append(("/rank", json.dumps({"user_id": user_id, "candidates": candidates, "context": context}).encode("utf-8")))
+    return out
+
+def _client(host: str, port: int, requests: List[Tuple[str, bytes]], offset: int, record_from: float,
+            stop_at: float, samples: List[Tuple[str, int, float]]) -> None:
+    """Send requests back to back until stop_at; samples: (path, status or 0 on a connection error, ms)."""
+    conn = http.client.HTTPConnection(host, port, timeout=30.0)
+    i = offset
+    while True:
+        path, body = requests[i % len(requests)]
+        i += 1
+        t0 = time.perf_counter()
+        if t0 >= stop_at:
+            break
+        try:
+            conn.request("POST", path, body=body, headers=HEADERS)
+            resp = conn.getresponse()
+            resp.read()
+            status = resp.status
+        except (OSError, http.client.HTTPException):
+            status = 0
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30.0)
+        if t0 >= record_from:
+            samples.append((path, status, (time.perf_counter() - t0) * 1000.0))
+    conn.close()
+
+def _summary(samples: List[Tuple[str, int, float]], seconds: float) -> dict:
+    if not samples:
+        return {"requests": 0}
+    lat = np.array([s[2] for s in samples])
+    status = np.array([s[1] for s in samples])
+    counts: Dict[str, int] = {}
+    for s in status:
+        key = "connection_error" if s == 0 else str(int(s))
+        counts[key] = counts.get(key, 0) + 1
+    return {
+        "requests": int(len(samples)),
+        "qps": len(samples) / seconds,
+        "error_rate": float(((status == 0) | (status >= 400)).mean()),
+        "latency_ms_p50": float(np.percentile(lat, 50)),
+        "latency_ms_p95": float(np.percentile(lat, 95)),
+        "latency_ms_p99": float(np.percentile(lat, 99)),
+        "latency_ms_max": float(lat.max()),
+        "status_counts": counts,
+    }
+
+def _stage_totals(metrics_text: str) -> Dict[str, List[float]]:
+    """{stage: [seconds sum, count]} from the ranking_stage_seconds series of a /metrics scrape."""
+    out: Dict[str, List[float]] = {}
+    for line in metrics_text.splitlines():
+        for suffix, slot in (("_sum", 0), ("_count", 1)):
+            prefix = f"ranking_stage_seconds{suffix}{{stage=\""
+            if line.startswith(prefix):
+                name, value = line[len(prefix):].split("\"}", 1)
+                out.setdefault(name, [0.0, 0.0])[slot] = float(value)
+    return out
+
+def _stage_means(before: Dict[str, List[float]], after: Dict[str, List[float]]) -> Dict[str, dict]:
+    out = {}
+    for name, (s, c) in after.items():
+        s0, c0 = before.get(name, [0.0, 0.0])
+        if c > c0:
+            out[name] = {"calls": int(c - c0), "mean_ms": (s - s0) / (c - c0) * 1000.0}
+    return out
+
+def _scrape(host: str, port: int) -> Optional[Dict[str, List[float]]]:
+    try:
+        status, text = _get(host, port, "/metrics")
+    except OSError:
+        return None
+    return _stage_totals(text) if status == 200 else None
+
+def run_level(host: str, port: int, requests: List[Tuple[str, bytes]], concurrency: int,
+              duration_s: float, warmup_s: float) -> dict:
+    """One closed-loop run: `concurrency` clients for warmup_s (not recorded) + duration_s."""
+    before = _scrape(host, port)
+    start = time.perf_counter()
+    record_from, stop_at = start + warmup_s, start + warmup_s + duration_s
+    per_client: List[List[Tuple[str, int, float]]] = [[] for _ in range(concurrency)]
+    threads = [
+        threading.Thread(target=_client, args=(host, port, requests, k * len(requests) // concurrency,
+                                               record_from, stop_at, per_client[k]), daemon=True)
+        for k in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    samples = [s for c in per_client for s in c]
+    result = {"concurrency": concurrency, **_summary(samples, duration_s)}
+    by_endpoint = sorted({s[0] for s in samples})
+    if len(by_endpoint) > 1:
+        result["endpoints"] = {p: _summary([s for s in samples if s[0] == p], duration_s) for p in by_endpoint}
+    after = _scrape(host, port)
+    if before is not None and after is not None:
+        # includes warm-up requests; server-side means per stage
+        result["server_stages"] = _stage_means(before, after)
+    return result
+
+def main(config_path: Optional[str], url: Optional[str], concurrency: List[int], duration_s: float, warmup_s: float,
+         candidate_sizes: List[int], recommend_frac: float, n_requests: int, in_process: bool, out: Optional[str]) -> None:
+    cfg = {}
+    if config_path:
+        with open(config_path, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f)
+    paths = cfg.get("paths", {})
+    raw_dir = paths.get("raw_dir", "data/raw")
+    seed = int(cfg.get("project", {}).get("seed", 42))
+    requests = build_requests(raw_dir, n_requests, candidate_sizes, recommend_frac, seed)
+
+    stop = None
+    if url:
+        u = urlparse(url)
+        host, port, server = u.hostname or "127.0.0.1", u.port or 80, url
+    else:
+        host, port = "127.0.0.1", _free_port()
+        stop = start_server(raw_dir, paths.get("artifacts_models", "artifacts/models"), port, in_process, env={})
+        server = "in-process" if in_process else "subprocess"
+    try:
+        _, health = _get(host, port, "/health")
+        levels = []
+        for c in concurrency:
+            r = run_level(host, port, requests, c, duration_s, warmup_s)
+            levels.append(r)
+            if r["requests"]:
+                print(f"concurrency {c:>4}: {r['qps']:8.1f} req/s  p50={r['latency_ms_p50']:.2f}ms "
+                      f"p95={r['latency_ms_p95']:.2f}ms p99={r['latency_ms_p99']:.2f}ms errors={r['error_rate']:.2%}")
+            else:
+                print(f"concurrency {c:>4}: no completed requests")
+    finally:
+        if stop is not None:
+            stop()
+
+    report = {
+        "benchmark": "load_test",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "commit": git_commit(),
+        "server": server,
+        "model_version": json.loads(health).get("model_version"),
+        "settings": {
+            "duration_s": duration_s,
+            "warmup_s": warmup_s,
+            "candidate_sizes": candidate_sizes,
+            "recommend_frac": recommend_frac,
+            "distinct_requests": len(requests),
+            "server_env": {k: v for k, v in os.environ.items() if k.startswith("RANKING_")},
+        },
+        "levels": levels,
+    }
+    write_report(out or os.path.join(paths.get("artifacts_reports", "artifacts/reports"), "bench_load_test.json"), report)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default=None, help="pipeline config (raw_dir, models dir, reports dir)")
+    ap.add_argument("--url", default=None, help="test a running server instead of starting one")
+    ap.add_argument("--in-process", action="store_true", help="run the server in a thread of this process")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--duration", type=float, default=20.0, help="recorded seconds per concurrency level")
+    ap.add_argument("--warmup", type=float, default=3.0)
+    ap.add_argument("--candidates", type=int, nargs="+", default=[20, 50, 100, 200], help="candidate list sizes to mix")
+    ap.add_argument("--recommend-frac", type=float, default=0.0, help="share of requests sent to /recommend")
+    ap.add_argument("--requests", type=int, default=2000, help="distinct requests generated and replayed")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+    main(args.config, args.url, args.concurrency, args.duration, args.warmup, args.candidates,
+         args.recommend_frac, args.requests, args.in_process, args.out)
@@ -0,0 +1,260 @@
+"""
+Scaling curves of the offline pipeline: every stage of train_ltr (generate, load, negative
+sampling, user / item / context features, time split, encoding, binned Dataset) plus lgb.train,
+predict and evaluate_ranking, at multiples of a base number of synthetic interactions.
+
+Users and sessions grow with the interactions (same history length per user); the item
+catalog stays fixed. Each stage runs in a fresh process that finds its inputs in a per-scale
+stage cache, so wall time, peak RSS and rows/s belong to that stage alone (peak RSS includes
+loading its inputs).
+Per stage a log-log fit of seconds vs interactions gives the scaling exponent (1.0 = linear);
+results are compared with a stored baseline report and slower / heavier stages are flagged.
+
+    python -m src.ranking.bench.pipeline_scaling --config configs/ranker.yaml --base 20000 --scales 1 10 100
+    python -m src.ranking.bench.pipeline_scaling --config configs/ranker.yaml --update-baseline
+"""
+import argparse
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+import yaml
+
+from src.ranking.bench.common import git_commit, run_isolated, write_report
+from src.ranking.data.generate_interactions import main as generate_main
+from src.ranking.data.splits import Splits
+from src.ranking.data.stage_cache import StageCache
+from src.ranking.models.evaluate import evaluate_ranking
+from src.ranking.models.train_ltr import _build_params, _load_yaml, build_pipeline
+
+PIPELINE_STAGES = ["load", "sample", "user_features", "item_features", "context_features", "split", "encode", "dataset"]
+STAGES = ["generate", *PIPELINE_STAGES, "train", "predict", "evaluate"]
+MODEL_FILE = "bench_model.txt"
+SCORES_FILE = "test_scores.npy"
+
+def _rows(value: Dict[str, Any]) -> int:
+    """Largest row count among a stage's outputs."""
+    n = 0
+    for v in value.values():
+        if isinstance(v, (pd.DataFrame, np.ndarray)):
+            n = max(n, len(v))
+        elif isinstance(v, lgb.Dataset):
+            n = max(n, v.construct().num_data())
+    return n
+
+def _pipeline(config_path: str) -> tuple:
+    cfg = _load_yaml(config_path)
+    cache = StageCache(cfg["paths"]["cache_dir"])
+    return cfg, build_pipeline(cfg, int(cfg["project"]["seed"]), cache)
+
+def run_pipeline_stage(config_path: str, name: str) -> dict:
+    """Compute one train_ltr stage (its inputs come from the cache) and persist it for the next."""
+    _, stages = _pipeline(config_path)
+    s = stages[name]
+    value = s.value
+    return {"seconds": s.seconds, "rows": _rows(value)}
+
+def run_generate(config_path: str) -> dict:
+    t0 = time.perf_counter()
+    generate_main(config_path, force=True)
+    seconds = time.perf_counter() - t0
+    cfg = _load_yaml(config_path)
+    return {"seconds": seconds, "rows": int(cfg["data_gen"]["n_interactions"])}
+
+def run_train(config_path: str, rounds: int) -> dict:
+    """lgb.train for a fixed number of rounds (no early stopping: the same work at every scale)."""
+    cfg, stages = _pipeline(config_path)
+    train_set = stages["dataset"].value["train"]
+    t0 = time.perf_counter()
+    booster = lgb.train(_build_params(cfg["model"]), train_set, num_boost_round=rounds)
+    seconds = time.perf_counter() - t0
+    booster.save_model(os.path.join(cfg["paths"]["cache_dir"], MODEL_FILE))
+    return {"seconds": seconds, "rows": int(train_set.num_data())}
+
+def run_predict(config_path: str) -> dict:
+    cfg, stages = _pipeline(config_path)
+    X_test = stages["encode"].value["X_test"]
+    booster = lgb.Booster(model_file=os.path.join(cfg["paths"]["cache_dir"], MODEL_FILE))
+    t0 = time.perf_counter()
+    scores = booster.predict(X_test)
+    seconds = time.perf_counter() - t0
+    np.save(os.path.join(cfg["paths"]["cache_dir"], SCORES_FILE), scores)
+    return {"seconds": seconds, "rows": int(len(scores))}
+
+def run_evaluate(config_path: str) -> dict:
+    cfg, stages = _pipeline(config_path)
+    test_df = Splits(**stages["split"].value).take("test")[["user_id", "session_id", "item_id", "label"]]
+    test_df = test_df.assign(score=np.load(os.path.join(cfg["paths"]["cache_dir"], SCORES_FILE)))
+    ks = sorted({int(cfg["features"]["eval_k"]), *[int(x) for x in cfg["features"].get("eval_ks", [])]})
+    t0 = time.perf_counter()
+    evaluate_ranking(test_df, score_col="score", k=ks)
+    return {"seconds": time.perf_counter() - t0, "rows": int(len(test_df))}
+
+def fit_exponent(n: List[float], seconds: List[float]) -> Optional[float]:
+    """Slope of log(seconds) vs log(n): time ~ n^exponent. None with fewer than two usable points."""
+    pts = [(a, b) for a, b in zip(n, seconds) if a > 0 and b > 0]
+    if len({a for a, _ in pts}) < 2:
+        return None
+    x, y = np.log([a for a, _ in pts]), np.log([b for _, b in pts])
+    return float(np.polyfit(x, y, 1)[0])
+
+def compare_to_baseline(results: Dict[str, List[dict]], exponents: Dict[str, Optional[float]], baseline: dict,
+                        tolerance: float, min_seconds: float, exponent_tolerance: float) -> List[dict]:
+    """
+    Regressions vs a previous report, matched on (stage, n_interactions):
+    - seconds more than (1 + tolerance) x baseline, when both exceed min_seconds (timer noise)
+    - peak RSS more than (1 + tolerance) x baseline
+    - scaling exponent more than exponent_tolerance above the baseline's, when every timing
+      of the stage (both runs) is at least min_seconds
+    """
+    out = []
+    base_rows = {(s, r["n_interactions"]): r for s, rows in baseline.get("results", {}).items() for r in rows}
+    for stage, rows in results.items():
+        for r in rows:
+            b = base_rows.get((stage, r["n_interactions"]))
+            if b is None:
+                continue
+            if max(r["seconds"], b["seconds"]) >= min_seconds and r["seconds"] > b["seconds"] * (1.0 + tolerance):
+                out.append({"stage": stage, "n_interactions": r["n_interactions"], "metric": "seconds",
+                            "baseline": b["seconds"], "current": r["seconds"], "ratio": r["seconds"] / max(b["seconds"], 1e-9)})
+            if r["peak_rss_mb"] > b["peak_rss_mb"] * (1.0 + tolerance):
+                out.append({"stage": stage, "n_interactions": r["n_interactions"], "metric": "peak_rss_mb",
+                            "baseline": b["peak_rss_mb"], "current": r["peak_rss_mb"], "ratio": r["peak_rss_mb"] / b["peak_rss_mb"]})
+        # fits over sub-noise timings mostly measure fixed overhead
+        timed = rows + [base_rows[(stage, r["n_interactions"])] for r in rows if (stage, r["n_interactions"]) in base_rows]
+        if min((r["seconds"] for r in timed), default=0.0) < min_seconds:
+            continue
+        cur, base = exponents.get(stage), baseline.get("exponents", {}).get(stage)
+        if cur is not None and base is not None and cur > base + exponent_tolerance:
+            out.append({"stage": stage, "metric": "exponent", "baseline": base, "current": cur})
+    return out
+
+def _scale_config(cfg: dict, m: int, base: int, scale_dir: str) -> str:
+    """
+    Config for scale m: m x base interactions and m x the users / sessions, so every user's
+    history stays as long as at scale 1 (the item catalog is fixed).
+    """
+    c = copy.deepcopy(cfg)
+    gen = c["data_gen"]
+    ratio = base / float(gen["n_interactions"])
+    gen["n_interactions"] = base * m
+    gen["n_users"] = max(1, int(round(int(gen["n_users"]) * ratio * m)))
+    gen["n_sessions"] = max(1, int(round(int(gen["n_sessions"]) * ratio * m)))
+    c["paths"]["raw_dir"] = os.path.join(scale_dir, "raw")
+    c["paths"]["cache_dir"] = os.path.join(scale_dir, "cache")
+    c.setdefault("pipeline", {})["cache"] = True
+    c["training"].pop("data_start", None)
+    c["training"].pop("data_end", None)
+    path = os.path.join(scale_dir, "config.yaml")
+    os.makedirs(scale_dir, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(c, f)
+    return path
+
+def _run(name: str, config_path: str, rounds: int) -> Dict[str, Any]:
+    if name == "generate":
+        return run_isolated(run_generate, config_path)
+    if name == "train":
+        return run_isolated(run_train, config_path, rounds)
+    if name == "predict":
+        return run_isolated(run_predict, config_path)
+    if name == "evaluate":
+        return run_isolated(run_evaluate, config_path)
+    return run_isolated(run_pipeline_stage, config_path, name)
+
+def main(config_path: str, base: Optional[int], scales: List[int], rounds: int, work_dir: str, out_path: Optional[str],
+         baseline_path: Optional[str], update_baseline: bool, tolerance: float, min_seconds: float,
+         exponent_tolerance: float, fail_on_regression: bool) -> None:
+    cfg = _load_yaml(config_path)
+    base = int(base or cfg["data_gen"]["n_interactions"])
+    reports_dir = cfg["paths"]["artifacts_reports"]
+    out_path = out_path or os.path.join(reports_dir, "bench_pipeline_scaling.json")
+    baseline_path = baseline_path or os.path.join(reports_dir, "bench_pipeline_baseline.json")
+
+    results: Dict[str, List[dict]] = {name: [] for name in STAGES}
+    for m in scales:
+        n = base * int(m)
+        scale_dir = os.path.join(work_dir, f"x{m}")
+        shutil.rmtree(scale_dir, ignore_errors=True)
+        scale_cfg = _scale_config(cfg, int(m), base, scale_dir)
+        print(f"— scale x{m}: {n:,} interactions")
+        for name in STAGES:
+            out = _run(name, scale_cfg, rounds)
+            r = out["result"]
+            row = {
+                "scale": int(m),
+                "n_interactions": n,
+                "rows": r["rows"],
+                "seconds": r["seconds"],
+                "wall_s": out["wall_s"],
+                "peak_rss_mb": out["peak_rss_mb"],
+                "rows_per_s": r["rows"] / r["seconds"] if r["seconds"] > 0 else None,
+            }
+            results[name].append(row)
+            print(f"  {name:>16} {row['seconds']:8.2f}s  rows={row['rows']:>10,}  peak_rss={row['peak_rss_mb']:7.0f}MB")
+        shutil.rmtree(scale_dir, ignore_errors=True)
+
+    exponents = {name: fit_exponent([r["n_interactions"] for r in rows], [r["seconds"] for r in rows])
+                 for name, rows in results.items()}
+    print("Scaling exponents (seconds ~ n^k): " + ", ".join(
+        f"{name}={k:.2f}" for name, k in exponents.items() if k is not None))
+
+    regressions: List[dict] = []
+    baseline_commit = None
+    if os.path.exists(baseline_path) and not update_baseline:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        baseline_commit = baseline.get("commit")
+        regressions = compare_to_baseline(results, exponents, baseline, tolerance, min_seconds, exponent_tolerance)
+        for r in regressions:
+            where = f" @ {r['n_interactions']:,}" if "n_interactions" in r else ""
+            print(f"⚠️ Regression: {r['stage']}{where} {r['metric']} {r['baseline']:.3f} -> {r['current']:.3f}")
+        if not regressions:
+            print(f"✅ No regressions vs baseline {baseline_commit}")
+
+    report = {
+        "benchmark": "pipeline_scaling",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "commit": git_commit(),
+        "base_interactions": base,
+        "scales": [int(m) for m in scales],
+        "train_rounds": rounds,
+        "n_users_per_interaction": int(cfg["data_gen"]["n_users"]) / float(cfg["data_gen"]["n_interactions"]),
+        "n_items": int(cfg["data_gen"]["n_items"]),
+        "results": results,
+        "exponents": exponents,
+        "baseline": {"path": baseline_path, "commit": baseline_commit, "tolerance": tolerance,
+                     "min_seconds": min_seconds, "exponent_tolerance": exponent_tolerance},
+        "regressions": regressions,
+    }
+    write_report(out_path, report)
+    if update_baseline or not os.path.exists(baseline_path):
+        write_report(baseline_path, report)
+    if regressions and fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", required=True)
+    ap.add_argument("--base", type=int, default=None, help="interactions at scale 1 (default: data_gen.n_interactions)")
+    ap.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    ap.add_argument("--rounds", type=int, default=50, help="boosting rounds of the train stage")
+    ap.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "pipeline_scaling"))
+    ap.add_argument("--out", default=None)
+    ap.add_argument("--baseline", default=None, help="baseline report (default: <reports>/bench_pipeline_baseline.json)")
+    ap.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown / RSS growth")
+    ap.add_argument("--min-seconds", type=float, default=0.05, help="ignore time changes of stages faster than this")
+    ap.add_argument("--exponent-tolerance", type=float, default=0.15)
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args()
+    main(args.config, args.base, args.scales, args.rounds, args.work_dir, args.out, args.baseline,
+         args.update_baseline, args.tolerance, args.min_seconds, args.exponent_tolerance, args.fail_on_regression)
@@ -0,0 +1,80 @@
+"""
+Throughput of make_ranking_dataset (negative sampling + columnar assembly + attribute joins)
+on synthetic interaction logs of increasing size; each scale runs in its own process.
+
+    python -m src.ranking.bench.ranking_dataset --scales 100000 1000000 5000000
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from src.ranking.bench.common import run_isolated, write_report, git_commit
+from src.ranking.data.negative_sampling import make_ranking_dataset
+
+def synthetic_tables(n_interactions: int, n_users: int, n_items: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    users = pd.DataFrame({
+        "user_id": [f"u_{i:06d}" for i in range(n_users)],
+        "age_bucket": rng.choice(["18-24", "25-34", "35-44", "45-54", "55+"], n_users),
+        "country": rng.choice(["US", "IN", "BR", "GB"], n_users),
+        "is_kids_profile": rng.integers(0, 2, n_users),
+    })
+    items = pd.DataFrame({
+        "item_id": [f"i_{i:06d}" for i in range(n_items)],
+        "genre": rng.choice(["Drama", "Comedy", "Action", "Doc", "Kids"], n_items),
+        "maturity": rng.choice(["G", "PG", "PG-13", "R"], n_items),
+        "release_year": rng.integers(1990, 2026, n_items),
+        "runtime_min": rng.integers(20, 160, n_items),
+    })
+    pop = rng.zipf(1.4, n_items).astype(float)
+    interactions = pd.DataFrame({
+        "user_id": users["user_id"].to_numpy()[rng.integers(0, n_users, n_interactions)],
+        "item_id": items["item_id"].to_numpy()[rng.choice(n_items, n_interactions, p=pop / pop.sum())],
+        "session_id": [f"s_{i:07d}" for i in rng.integers(0, max(1, n_interactions // 10), n_interactions)],
+        "timestamp": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 90 * 86400, n_interactions), unit="s"),
+        "device": rng.choice(["mobile", "tv", "web", "tablet"], n_interactions),
+        "label": rng.choice([0, 1, 2, 3], n_interactions, p=[0.85, 0.07, 0.05, 0.03]),
+        "watch_minutes": rng.integers(0, 60, n_interactions),
+    })
+    return interactions, users, items
+
+def _run_scale(n_interactions: int, n_users: int, n_items: int, negatives: int, strategy: str) -> dict:
+    interactions, users, items = synthetic_tables(n_interactions, n_users, n_items)
+    t0 = time.perf_counter()
+    ds = make_ranking_dataset(interactions, users, items, negatives, strategy, seed=42)
+    elapsed = time.perf_counter() - t0
+    return {"rows": int(len(ds)), "seconds": elapsed, "rows_per_s": len(ds) / elapsed}
+
+def main(scales, n_users: int, n_items: int, negatives: int, strategy: str, out_path: str) -> None:
+    results = []
+    for n in scales:
+        out = run_isolated(_run_scale, int(n), n_users, n_items, negatives, strategy)
+        r = {"n_interactions": int(n), **out["result"], "peak_rss_mb": out["peak_rss_mb"]}
+        results.append(r)
+        print(f"{n:>10} interactions -> {r['rows']:>10} rows in {r['seconds']:7.2f}s "
+              f"({r['rows_per_s']:,.0f} rows/s, peak_rss={r['peak_rss_mb']:.0f}MB)")
+
+    write_report(out_path, {
+        "benchmark": "ranking_dataset",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "commit": git_commit(),
+        "n_users": n_users,
+        "n_items": n_items,
+        "negatives_per_positive": negatives,
+        "strategy": strategy,
+        "results": results,
+    })
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scales", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    ap.add_argument("--n-users", type=int, default=50_000)
+    ap.add_argument("--n-items", type=int, default=20_000)
+    ap.add_argument("--negatives", type=int, default=4)
+    ap.add_argument("--strategy", default="popularity", choices=["popularity", "uniform"])
+    ap.add_argument("--out", default=os.path.join("artifacts", "reports", "bench_ranking_dataset.json"))
+    args = ap.parse_args()
+    main(args.scales, args.n_users, args.n_items, args.negatives, args.strategy, args.out)
@@ -0,0 +1,133 @@
+"""
+Co-occurrence retrieval vs ranking the full catalog, on a time holdout:
+the index, the online aggregates and each user's recent items come from the events before the
+cutoff; the items a user engages with after it (and has not engaged with before) are the targets.
+Reports recall@N and per-user latency for popularity only, retrieval only, retrieval + ranker
+and the ranker over the whole catalog.
+
+    python -m src.ranking.bench.retrieval --config configs/ranker.yaml
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+import yaml
+
+from src.ranking.bench.common import git_commit, write_report
+from src.ranking.data.interaction_store import read_interactions
+from src.ranking.features.online_store import OnlineFeatureStore
+from src.ranking.inference.rank import rank_candidates_batch
+from src.ranking.models.registry import RegistryPaths, get_registry
+from src.ranking.retrieval.cooccurrence import RetrievalConfig, build_cooccurrence_index, recent_items_by_user
+
+CONTEXT = {"device": "tv", "hour": 20, "day_of_week": 2, "session_id": "s_bench"}
+
+def _recall(ranked: List[str], truth: set, ks: List[int]) -> Dict[int, float]:
+    return {k: len(truth.intersection(ranked[:k])) / len(truth) for k in ks}
+
+def _summary(recalls: List[Dict[int, float]], lat_ms: List[float], ks: List[int]) -> dict:
+    return {
+        **{f"Recall@{k}": float(np.mean([r[k] for r in recalls])) for k in ks},
+        "latency_ms_p50": float(np.percentile(lat_ms, 50)),
+        "latency_ms_p95": float(np.percentile(lat_ms, 95)),
+    }
+
+def main(config_path: str, holdout_frac: float, n_users: int, ks: List[int]) -> None:
+    with open(config_path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    rcfg = RetrievalConfig.from_cfg(cfg)
+    raw_dir = cfg["paths"]["raw_dir"]
+
+    interactions = read_interactions(raw_dir, columns=["user_id", "item_id", "timestamp", "label", "watch_minutes"])
+    interactions = interactions.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    cutoff = interactions["timestamp"].iloc[int(len(interactions) * (1.0 - holdout_frac))]
+    past, future = interactions[interactions["timestamp"] < cutoff], interactions[interactions["timestamp"] >= cutoff]
+
+    t0 = time.perf_counter()
+    index = build_cooccurrence_index(past, rcfg)
+    build_s = time.perf_counter() - t0
+    recent = recent_items_by_user(past, rcfg.history_items, rcfg.min_label)
+
+    users = pd.read_csv(os.path.join(raw_dir, "users.csv")).drop_duplicates("user_id").set_index("user_id", drop=False)
+    items = pd.read_csv(os.path.join(raw_dir, "items.csv")).drop_duplicates("item_id")
+    item_rows = {str(r["item_id"]): r for r in items.to_dict(orient="records")}
+    fut_pos = future[future["label"] >= rcfg.min_label]
+    truth = {}
+    for u, g in fut_pos.groupby("user_id", sort=False)["item_id"]:
+        t = set(g.astype(str)) - set(recent.get(str(u), []))
+        if t and u in users.index:
+            truth[str(u)] = t
+    rng = np.random.default_rng(int(cfg["project"]["seed"]))
+    eval_users = sorted(truth)
+    if len(eval_users) > n_users:
+        eval_users = sorted(rng.choice(eval_users, size=n_users, replace=False).tolist())
+    ks = sorted(k for k in set(ks) | {rcfg.n_candidates} if k <= len(item_rows))
+
+    try:
+        model = get_registry().get(RegistryPaths(models_dir=cfg["paths"]["artifacts_models"]))
+    except FileNotFoundError:
+        model = None
+        print("⚠️ No trained model: reporting retrieval only")
+    store = OnlineFeatureStore(window_days=int(cfg["features"]["history_window_days"]))
+    store.ingest_frame(past)
+
+    res = {name: ([], []) for name in ("popularity", "retrieval", "retrieval_rank", "full_catalog_rank")}
+    for u in eval_users:
+        hist = recent.get(u, [])
+        user_row = users.loc[u].to_dict()
+
+        t0 = time.perf_counter()
+        ranked = index.retrieve([], max(ks), exclude=hist)
+        res["popularity"][1].append((time.perf_counter() - t0) * 1000.0)
+        res["popularity"][0].append(_recall(ranked, truth[u], ks))
+
+        t0 = time.perf_counter()
+        cands = index.retrieve(hist, rcfg.n_candidates, exclude=hist)
+        retrieval_ms = (time.perf_counter() - t0) * 1000.0
+        res["retrieval"][1].append(retrieval_ms)
+        res["retrieval"][0].append(_recall(cands, truth[u], ks))
+        if model is None:
+            continue
+
+        rows = [item_rows[i] for i in cands if i in item_rows]
+        t0 = time.perf_counter()
+        out = rank_candidates_batch([{"user_row": user_row, "item_rows": rows, "context": CONTEXT}], model=model, online_store=store)[0]
+        res["retrieval_rank"][1].append(retrieval_ms + (time.perf_counter() - t0) * 1000.0)
+        res["retrieval_rank"][0].append(_recall([r["item_id"] for r in out], truth[u], ks))
+
+        rows = [r for i, r in item_rows.items() if i not in hist]
+        t0 = time.perf_counter()
+        out = rank_candidates_batch([{"user_row": user_row, "item_rows": rows, "context": CONTEXT}], model=model, online_store=store)[0]
+        res["full_catalog_rank"][1].append((time.perf_counter() - t0) * 1000.0)
+        res["full_catalog_rank"][0].append(_recall([r["item_id"] for r in out], truth[u], ks))
+
+    results = {name: _summary(rec, lat, ks) for name, (rec, lat) in res.items() if rec}
+    for name, r in results.items():
+        recalls = " ".join(f"R@{k}={r[f'Recall@{k}']:.3f}" for k in ks)
+        print(f"{name:>18}: {recalls}  p50={r['latency_ms_p50']:.2f}ms p95={r['latency_ms_p95']:.2f}ms")
+
+    report = {
+        "benchmark": "retrieval",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "commit": git_commit(),
+        "cutoff": str(cutoff),
+        "n_eval_users": len(eval_users),
+        "n_catalog_items": len(item_rows),
+        "index": {"n_items": index.n_items, "nnz": int(index.neighbors.nnz), "build_s": build_s},
+        "retrieval_config": rcfg.__dict__,
+        "model_version": None if model is None else model.version,
+        "results": results,
+    }
+    write_report(os.path.join(cfg["paths"]["artifacts_reports"], "bench_retrieval.json"), report)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", required=True)
+    ap.add_argument("--holdout-frac", type=float, default=0.1)
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--ks", type=int, nargs="+", default=[10, 50, 100])
+    args = ap.parse_args()
+    main(args.config, args.holdout_frac, args.users, args.ks)
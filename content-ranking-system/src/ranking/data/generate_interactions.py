@@ -1,12 +1,39 @@
 import argparse
 import os
 import json
-from dataclasses import dataclass
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
 from datetime import datetime
+from typing import Dict, List
 import numpy as np
 import pandas as pd
 import yaml
 
+from src.ranking.data import interaction_store
+from src.ranking.data.interaction_store import raw_paths, reset_store, store_path, write_partitioned
+from src.ranking.data.stage_cache import code_fingerprint, file_fingerprint, stage_key
+
+AGE_BUCKETS = ["18-24", "25-34", "35-44", "45-54", "55+"]
+GENRES = ["Drama", "Comedy", "Action", "Thriller", "Romance", "SciFi", "Horror", "Doc", "Kids"]
+MATURITIES = ["G", "PG", "PG-13", "R"]
+DEVICES = ["mobile", "tv", "web", "tablet"]
+
+# Genre affinity by age bucket (simple synthetic signal); missing pairs are 1.0
+GENRE_AFFINITY = {
+    "18-24": {"Action": 1.15, "Comedy": 1.10, "SciFi": 1.10, "Drama": 1.00, "Kids": 0.60},
+    "25-34": {"Drama": 1.10, "Thriller": 1.10, "Action": 1.05, "Doc": 1.00, "Kids": 0.70},
+    "35-44": {"Drama": 1.10, "Doc": 1.10, "Romance": 1.05, "Action": 0.95, "Horror": 0.85},
+    "45-54": {"Drama": 1.10, "Doc": 1.15, "Thriller": 1.00, "Comedy": 0.95, "Action": 0.90},
+    "55+":   {"Doc": 1.20, "Drama": 1.05, "Comedy": 0.95, "Action": 0.85, "Horror": 0.70},
+}
+
+# Implicit signals: impression -> click/play -> watch_time bucket
+BASE_CLICK = 0.08
+BASE_PLAY = 0.05
+GENERATE_STAGE_FILE = "_generate_stage.json"
+
 @dataclass
 class Config:
     seed: int
@@ -17,34 +44,172 @@ class Config:
     n_sessions: int
     start_date: str
     end_date: str
+    shard_rows: int = 1_000_000
+    workers: int = 1
+    output_format: str = "parquet"
 
 def _load_config(path: str) -> Config:
     with open(path, "r", encoding="utf-8") as f:
         cfg = yaml.safe_load(f)
 
     raw_dir = cfg["paths"]["raw_dir"]
+    gen = cfg["data_gen"]
     return Config(
         seed=int(cfg["project"]["seed"]),
         raw_dir=raw_dir,
-        n_users=int(cfg["data_gen"]["n_users"]),
-        n_items=int(cfg["data_gen"]["n_items"]),
-        n_interactions=int(cfg["data_gen"]["n_interactions"]),
-        n_sessions=int(cfg["data_gen"]["n_sessions"]),
-        start_date=str(cfg["data_gen"]["start_date"]),
-        end_date=str(cfg["data_gen"]["end_date"]),
+        n_users=int(gen["n_users"]),
+        n_items=int(gen["n_items"]),
+        n_interactions=int(gen["n_interactions"]),
+        n_sessions=int(gen["n_sessions"]),
+        start_date=str(gen["start_date"]),
+        end_date=str(gen["end_date"]),
+        shard_rows=int(gen.get("shard_rows", 1_000_000)),
+        workers=int(gen.get("workers", 1)),
+        output_format=str(gen.get("output_format", "parquet")),
     )
 
 def _ensure_dir(p: str) -> None:
     os.makedirs(p, exist_ok=True)
 
-def main(config_path: str) -> None:
+def affinity_table() -> np.ndarray:
+    """(age bucket, genre) -> affinity multiplier, indexed by positions in AGE_BUCKETS / GENRES."""
+    table = np.ones((len(AGE_BUCKETS), len(GENRES)), dtype=np.float64)
+    for a, row in GENRE_AFFINITY.items():
+        for g, v in row.items():
+            table[AGE_BUCKETS.index(a), GENRES.index(g)] = v
+    return table
+
+def simulate_labels(
+    rng: np.random.Generator,
+    age: np.ndarray,
+    kids: np.ndarray,
+    genre: np.ndarray,
+    maturity: np.ndarray,
+    table: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Relevance label 0/1/2/3 and watch minutes per interaction, from integer codes
+    (age bucket, kids flag, genre, maturity) of the user/item pair.
+    """
+    aff = table[age, genre]
+    kids = kids.astype(bool)
+    aff = np.where(kids & (genre != GENRES.index("Kids")), aff * 0.75, aff)
+    mature = np.isin(maturity, [MATURITIES.index("PG-13"), MATURITIES.index("R")])
+    aff = np.where(kids & mature, aff * 0.55, aff)
+
+    n = len(aff)
+    clicked = rng.random(n) < np.minimum(0.5, BASE_CLICK * aff * 1.2)
+    played = rng.random(n) < np.minimum(0.4, BASE_PLAY * aff * np.where(clicked, 1.5, 0.9))
+
+    # click only: short glance; play: watch time correlated with affinity
+    watch = np.where(
+        played,
+        rng.exponential(scale=15 * aff),
+        np.where(clicked, rng.exponential(scale=2.0, size=n), 0.0),
+    ).astype(np.int64)
+    label = np.where(played, np.where(watch < 10, 2, 3), np.where(clicked, 1, 0)).astype(np.int64)
+    return label, watch
+
+@dataclass
+class ShardSpec:
+    index: int
+    n_rows: int
+    start_ts: int
+    end_ts: int  # inclusive
+    seed: np.random.SeedSequence
+    out_dir: str
+    output_format: str
+
+def _shard_specs(cfg: Config, start_ts: int, end_ts: int, out_dir: str) -> List[ShardSpec]:
+    """Contiguous time ranges with row counts proportional to their length, one child seed each."""
+    n_shards = max(1, -(-cfg.n_interactions // max(1, cfg.shard_rows)))
+    edges = np.linspace(start_ts, end_ts + 1, n_shards + 1).astype(np.int64)
+    counts = np.diff(np.linspace(0, cfg.n_interactions, n_shards + 1).round().astype(np.int64))
+    seeds = np.random.SeedSequence(cfg.seed).spawn(n_shards)
+    return [
+        ShardSpec(k, int(counts[k]), int(edges[k]), int(edges[k + 1]) - 1, seeds[k], out_dir, cfg.output_format)
+        for k in range(n_shards)
+    ]
+
+def _generate_shard(spec: ShardSpec, tables: Dict[str, np.ndarray]) -> dict:
+    """One time range of interactions, sorted by timestamp, written as a CSV part or into the date-partitioned store."""
+    rng = np.random.default_rng(spec.seed)
+    n = spec.n_rows
+    timestamps = np.sort(rng.integers(spec.start_ts, spec.end_ts + 1, size=n))
+    u = rng.integers(0, len(tables["user_ids"]), size=n)
+    it = rng.choice(len(tables["item_ids"]), size=n, p=tables["item_pop"])
+    sessions = rng.integers(0, len(tables["session_ids"]), size=n)
+    devices = rng.choice(len(DEVICES), size=n, p=[0.30, 0.45, 0.20, 0.05])
+    label, watch = simulate_labels(
+        rng, tables["user_age"][u], tables["user_kids"][u], tables["item_genre"][it], tables["item_maturity"][it], tables["affinity"]
+    )
+
+    df = pd.DataFrame({
+        "user_id": tables["user_ids"][u],
+        "item_id": tables["item_ids"][it],
+        "session_id": tables["session_ids"][sessions],
+        "timestamp": pd.to_datetime(timestamps, unit="s"),
+        "device": np.asarray(DEVICES)[devices],
+        "label": label,
+        "watch_minutes": watch,
+    })
+    if spec.output_format == "parquet":
+        path = spec.out_dir
+        write_partitioned(df, spec.out_dir, f"part-{spec.index:05d}")
+    else:
+        path = os.path.join(spec.out_dir, f"part-{spec.index:05d}.csv")
+        df.to_csv(path, index=False)
+    return {
+        "path": path,
+        "label_counts": {int(k): int(v) for k, v in zip(*np.unique(label, return_counts=True))},
+        "ts_min": int(timestamps[0]) if n else None,
+        "ts_max": int(timestamps[-1]) if n else None,
+    }
+
+def _concat_csv(parts: List[str], out_path: str) -> None:
+    """Byte-level concatenation of the shard CSVs (header kept from the first part only)."""
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as out:
+        for k, p in enumerate(parts):
+            with open(p, "rb") as f:
+                if k > 0:
+                    f.readline()
+                shutil.copyfileobj(f, out, length=16 * 1024 * 1024)
+    os.replace(tmp, out_path)
+
+def generate_key(cfg: Config) -> str:
+    """Stage key of the raw data: generator config (workers do not change the output) + code."""
+    config = {k: v for k, v in asdict(cfg).items() if k != "workers"}
+    return stage_key("generate", config, code_fingerprint([sys.modules[__name__], interaction_store]), [])
+
+def raw_data_key(raw_dir: str) -> str:
+    """
+    Cache key of the raw data: the generate stage key while the files are still the ones it wrote
+    (so regenerating with the same config keeps downstream stages cached), else their fingerprint.
+    """
+    files = file_fingerprint(raw_paths(raw_dir))
+    marker = os.path.join(raw_dir, GENERATE_STAGE_FILE)
+    if os.path.exists(marker):
+        with open(marker, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("files") == files:
+            return saved["key"]
+    return files
+
+def main(config_path: str, force: bool = False) -> None:
     cfg = _load_config(config_path)
+    if cfg.output_format not in ("csv", "parquet"):
+        raise ValueError(f"Unknown data_gen.output_format: {cfg.output_format}")
+    key = generate_key(cfg)
+    if not force and raw_data_key(cfg.raw_dir) == key:
+        print(f"✅ Raw data in {cfg.raw_dir} is up to date (generate stage {key}); use --force to regenerate")
+        return
     np.random.seed(cfg.seed)
     _ensure_dir(cfg.raw_dir)
 
     # Users
     user_ids = [f"u_{i:04d}" for i in range(cfg.n_users)]
-    age_bucket = np.random.choice(["18-24", "25-34", "35-44", "45-54", "55+"], size=cfg.n_users, p=[0.18, 0.34, 0.22, 0.16, 0.10])
+    age_bucket = np.random.choice(AGE_BUCKETS, size=cfg.n_users, p=[0.18, 0.34, 0.22, 0.16, 0.10])
     country = np.random.choice(["US", "IN", "BR", "GB", "CA", "DE", "JP"], size=cfg.n_users, p=[0.35, 0.18, 0.12, 0.10, 0.08, 0.08, 0.09])
     is_kids = np.random.binomial(1, 0.12, size=cfg.n_users)
 
@@ -57,9 +222,8 @@ def main(config_path: str) -> None:
 
     # Items
     item_ids = [f"i_{i:04d}" for i in range(cfg.n_items)]
-    genres = ["Drama", "Comedy", "Action", "Thriller", "Romance", "SciFi", "Horror", "Doc", "Kids"]
-    genre = np.random.choice(genres, size=cfg.n_items, p=[0.20, 0.18, 0.14, 0.12, 0.10, 0.08, 0.06, 0.06, 0.06])
-    maturity = np.random.choice(["G", "PG", "PG-13", "R"], size=cfg.n_items, p=[0.10, 0.25, 0.40, 0.25])
+    genre = np.random.choice(GENRES, size=cfg.n_items, p=[0.20, 0.18, 0.14, 0.12, 0.10, 0.08, 0.06, 0.06, 0.06])
+    maturity = np.random.choice(MATURITIES, size=cfg.n_items, p=[0.10, 0.25, 0.40, 0.25])
     release_year = np.random.randint(1990, 2026, size=cfg.n_items)
     runtime_min = np.random.randint(20, 160, size=cfg.n_items)
 
@@ -71,99 +235,71 @@ def main(config_path: str) -> None:
         "runtime_min": runtime_min
     })
 
-    # Sessions + timestamps
-    start = datetime.fromisoformat(cfg.start_date)
-    end = datetime.fromisoformat(cfg.end_date)
-    start_ts = int(start.timestamp())
-    end_ts = int(end.timestamp())
-    timestamps = np.random.randint(start_ts, end_ts + 1, size=cfg.n_interactions)
-    timestamps = pd.to_datetime(timestamps, unit="s")
-
-    session_ids = [f"s_{i:05d}" for i in range(cfg.n_sessions)]
-    interaction_sessions = np.random.choice(session_ids, size=cfg.n_interactions, replace=True)
-
     # Popularity skew (Zipf) to mimic blockbuster-heavy catalog traffic
     item_pop = np.random.zipf(a=1.4, size=cfg.n_items).astype(float)
     item_pop = item_pop / item_pop.sum()
-    chosen_items = np.random.choice(item_ids, size=cfg.n_interactions, p=item_pop)
-    chosen_users = np.random.choice(user_ids, size=cfg.n_interactions, replace=True)
-
-    # Implicit signals: impression -> click/play -> watch_time bucket
-    # We'll generate a "relevance label" 0/1/2/3 typical LTR grading.
-    base_click = 0.08
-    base_play = 0.05
-
-    # Genre affinity by age bucket (simple synthetic signal)
-    genre_affinity = {
-        "18-24": {"Action": 1.15, "Comedy": 1.10, "SciFi": 1.10, "Drama": 1.00, "Kids": 0.60},
-        "25-34": {"Drama": 1.10, "Thriller": 1.10, "Action": 1.05, "Doc": 1.00, "Kids": 0.70},
-        "35-44": {"Drama": 1.10, "Doc": 1.10, "Romance": 1.05, "Action": 0.95, "Horror": 0.85},
-        "45-54": {"Drama": 1.10, "Doc": 1.15, "Thriller": 1.00, "Comedy": 0.95, "Action": 0.90},
-        "55+":   {"Doc": 1.20, "Drama": 1.05, "Comedy": 0.95, "Action": 0.85, "Horror": 0.70},
-    }
-
-    users_idx = users.set_index("user_id")
-    items_idx = items.set_index("item_id")
-
-    labels = []
-    watch_mins = []
-    devices = np.random.choice(["mobile", "tv", "web", "tablet"], size=cfg.n_interactions, p=[0.30, 0.45, 0.20, 0.05])
-
-    for u, it in zip(chosen_users, chosen_items):
-        age = users_idx.loc[u, "age_bucket"]
-        g = items_idx.loc[it, "genre"]
-        kids = int(users_idx.loc[u, "is_kids_profile"])
-        mat = items_idx.loc[it, "maturity"]
-
-        aff = genre_affinity.get(age, {}).get(g, 1.0)
-        if kids == 1 and g != "Kids":
-            aff *= 0.75
-        if kids == 1 and mat in ["PG-13", "R"]:
-            aff *= 0.55
-
-        p_click = min(0.5, base_click * aff * 1.2)
-        clicked = np.random.rand() < p_click
-
-        p_play = min(0.4, base_play * aff * (1.5 if clicked else 0.9))
-        played = np.random.rand() < p_play
-
-        if not clicked and not played:
-            label = 0
-            w = 0
-        elif clicked and not played:
-            label = 1
-            w = int(np.random.exponential(scale=2))
-        elif played:
-            # watch time correlated with affinity
-            w = int(np.random.exponential(scale=15 * aff))
-            label = 2 if w < 10 else 3
-
-        labels.append(label)
-        watch_mins.append(w)
-
-    interactions = pd.DataFrame({
-        "user_id": chosen_users,
-        "item_id": chosen_items,
-        "session_id": interaction_sessions,
-        "timestamp": timestamps,
-        "device": devices,
-        "label": labels,
-        "watch_minutes": watch_mins
-    }).sort_values("timestamp").reset_index(drop=True)
 
     users.to_csv(os.path.join(cfg.raw_dir, "users.csv"), index=False)
     items.to_csv(os.path.join(cfg.raw_dir, "items.csv"), index=False)
-    interactions.to_csv(os.path.join(cfg.raw_dir, "interactions.csv"), index=False)
 
+    # Interactions: contiguous time-range shards, each with its own child seed, generated
+    # independently (process pool) with memory bounded by shard_rows
+    tables = {
+        "user_ids": np.asarray(user_ids, dtype=object),
+        "item_ids": np.asarray(item_ids, dtype=object),
+        "session_ids": np.asarray([f"s_{i:05d}" for i in range(cfg.n_sessions)], dtype=object),
+        "user_age": pd.Index(AGE_BUCKETS).get_indexer(age_bucket),
+        "user_kids": is_kids.astype(np.int8),
+        "item_genre": pd.Index(GENRES).get_indexer(genre),
+        "item_maturity": pd.Index(MATURITIES).get_indexer(maturity),
+        "item_pop": item_pop,
+        "affinity": affinity_table(),
+    }
+    start_ts = int(datetime.fromisoformat(cfg.start_date).timestamp())
+    end_ts = int(datetime.fromisoformat(cfg.end_date).timestamp())
+    csv_path = os.path.join(cfg.raw_dir, "interactions.csv")
+    if cfg.output_format == "parquet":
+        # date-partitioned store; readers prefer it, so drop any CSV from an earlier run
+        out_dir = store_path(cfg.raw_dir)
+        reset_store(out_dir)
+        if os.path.exists(csv_path):
+            os.remove(csv_path)
+    else:
+        out_dir = os.path.join(cfg.raw_dir, "interactions_parts")
+        reset_store(out_dir)
+        if os.path.isdir(store_path(cfg.raw_dir)):
+            shutil.rmtree(store_path(cfg.raw_dir))
+    specs = _shard_specs(cfg, start_ts, end_ts, out_dir)
+
+    if cfg.workers > 1 and len(specs) > 1:
+        with ProcessPoolExecutor(max_workers=min(cfg.workers, len(specs))) as ex:
+            shards = list(ex.map(_generate_shard, specs, [tables] * len(specs)))
+    else:
+        shards = [_generate_shard(s, tables) for s in specs]
+
+    if cfg.output_format == "csv":
+        # shards are consecutive time ranges, so the concatenation stays sorted by timestamp
+        _concat_csv([s["path"] for s in shards], csv_path)
+        shutil.rmtree(out_dir)
+
+    label_counts: Dict[int, int] = {}
+    for s in shards:
+        for k, v in s["label_counts"].items():
+            label_counts[k] = label_counts.get(k, 0) + v
+    ts = [t for s in shards for t in (s["ts_min"], s["ts_max"]) if t is not None]
     summary = {
         "n_users": int(cfg.n_users),
         "n_items": int(cfg.n_items),
         "n_interactions": int(cfg.n_interactions),
-        "label_counts": interactions["label"].value_counts().to_dict(),
-        "time_range": [str(interactions["timestamp"].min()), str(interactions["timestamp"].max())]
+        "n_shards": len(shards),
+        "output_format": cfg.output_format,
+        "label_counts": dict(sorted(label_counts.items())),
+        "time_range": [str(pd.to_datetime(min(ts), unit="s")), str(pd.to_datetime(max(ts), unit="s"))] if ts else [None, None]
     }
     with open(os.path.join(cfg.raw_dir, "data_summary.json"), "w", encoding="utf-8") as f:
         json.dump(summary, f, indent=2)
+    with open(os.path.join(cfg.raw_dir, GENERATE_STAGE_FILE), "w", encoding="utf-8") as f:
+        json.dump({"key": key, "files": file_fingerprint(raw_paths(cfg.raw_dir))}, f, indent=2)
 
     print("✅ Generated raw data in:", cfg.raw_dir)
     print(json.dumps(summary, indent=2))
@@ -171,5 +307,6 @@ def main(config_path: str) -> None:
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--config", required=True, help="Path to configs/ranker.yaml")
+    ap.add_argument("--force", action="store_true", help="regenerate even if the raw data is up to date")
     args = ap.parse_args()
-    main(args.config)
+    main(args.config, args.force)
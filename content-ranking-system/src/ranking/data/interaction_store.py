@@ -0,0 +1,158 @@
+from __future__ import annotations
+import glob
+import os
+import shutil
+from datetime import date
+from typing import Iterator, List, Optional, Tuple
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as pads
+import pyarrow.parquet as pq
+
+STORE_DIRNAME = "interactions_store"
+STRING_COLS = ["user_id", "item_id", "session_id", "device"]
+_PARTITIONING = pads.partitioning(pa.schema([("date", pa.date32())]), flavor="hive")
+
+def store_path(raw_dir: str) -> str:
+    return os.path.join(raw_dir, STORE_DIRNAME)
+
+def raw_paths(raw_dir: str) -> List[str]:
+    """Raw files the offline pipeline reads (their sizes/mtimes key the stage cache)."""
+    names = ["users.csv", "items.csv", "interactions.csv", STORE_DIRNAME]
+    return [os.path.join(raw_dir, n) for n in names if os.path.exists(os.path.join(raw_dir, n))]
+
+def _to_date(value) -> Optional[date]:
+    return None if value is None else pd.Timestamp(value).date()
+
+def reset_store(root: str) -> None:
+    if os.path.isdir(root):
+        shutil.rmtree(root)
+    os.makedirs(root, exist_ok=True)
+
+def write_partitioned(df: pd.DataFrame, root: str, part_name: str) -> List[str]:
+    """
+    Append df to the store as one file per event date: root/date=YYYY-MM-DD/<part_name>.parquet.
+    String columns are dictionary-encoded (stored once per row group, read back as strings).
+    """
+    ts = pd.to_datetime(df["timestamp"])
+    days = ts.dt.strftime("%Y-%m-%d")
+    written = []
+    for day, idx in df.groupby(days, sort=True).indices.items():
+        part = df.iloc[idx]
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        d = os.path.join(root, f"date={day}")
+        os.makedirs(d, exist_ok=True)
+        path = os.path.join(d, f"{part_name}.parquet")
+        pq.write_table(table, path, use_dictionary=[c for c in STRING_COLS if c in part.columns], compression="snappy")
+        written.append(path)
+    return written
+
+def partition_date(path: str) -> date:
+    """Event date of a part file, from its date=YYYY-MM-DD directory."""
+    return date.fromisoformat(os.path.basename(os.path.dirname(path))[len("date="):])
+
+def store_files(root: str) -> List[str]:
+    """Every part file of the store, in (date, name) order."""
+    return sorted(glob.glob(os.path.join(root, "date=*", "*.parquet")))
+
+def _to_frame(table: pa.Table) -> pd.DataFrame:
+    df = table.to_pandas()
+    for c in df.columns:
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype(str)
+    if "timestamp" in df.columns:
+        df = df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    return df
+
+def read_files(paths: List[str], columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Given part files of the store (e.g. the ones added since the last read), only `columns`."""
+    return _to_frame(pa.concat_tables([pq.read_table(p, columns=columns) for p in paths]))
+
+def store_dates(root: str) -> List[date]:
+    """Partition dates present in the store (from the directory names only)."""
+    out = []
+    for d in glob.glob(os.path.join(root, "date=*")):
+        out.append(date.fromisoformat(os.path.basename(d)[len("date="):]))
+    return sorted(out)
+
+def iter_partitions(
+    root: str,
+    columns: Optional[List[str]] = None,
+    start=None,
+    end=None,
+    days: int = 1,
+) -> Iterator[Tuple[List[date], pd.DataFrame]]:
+    """
+    Interactions with timestamp in [start, end) (same bounds as read_store), `days` date partitions
+    per read in date order: (partition dates, frame); one batch in memory at a time.
+    """
+    start_ts, end_ts = (pd.Timestamp(start) if start is not None else None), (pd.Timestamp(end) if end is not None else None)
+    by_day: dict = {}
+    for p in store_files(root):
+        by_day.setdefault(partition_date(p), []).append(p)
+    dates = [d for d in sorted(by_day)
+             if (start_ts is None or d >= start_ts.date()) and (end_ts is None or d <= end_ts.date())]
+    cols = None if columns is None else sorted(set(columns) | {"timestamp"})
+    for i in range(0, len(dates), max(1, int(days))):
+        batch = dates[i:i + max(1, int(days))]
+        df = read_files([p for d in batch for p in by_day[d]], columns=cols)
+        if start_ts is not None:
+            df = df[df["timestamp"] >= start_ts]
+        if end_ts is not None:
+            df = df[df["timestamp"] < end_ts]
+        if columns is not None:
+            df = df[list(columns)]
+        if len(df):
+            yield batch, df.reset_index(drop=True)
+
+def read_store(
+    root: str,
+    columns: Optional[List[str]] = None,
+    start=None,
+    end=None,
+) -> pd.DataFrame:
+    """
+    Interactions with timestamp in [start, end) (either bound optional), only `columns`.
+    Date partitions outside the range are never opened; the exact bounds are applied on
+    the timestamp column inside the boundary partitions.
+    """
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Missing interaction store: {root}")
+    dataset = pads.dataset(root, format="parquet", partitioning=_PARTITIONING)
+    expr = None
+    start_ts, end_ts = (pd.Timestamp(start) if start is not None else None), (pd.Timestamp(end) if end is not None else None)
+    if start_ts is not None:
+        expr = pads.field("date") >= pa.scalar(start_ts.date(), pa.date32())
+        expr &= pads.field("timestamp") >= pa.scalar(start_ts.to_pydatetime(), dataset.schema.field("timestamp").type)
+    if end_ts is not None:
+        e = (pads.field("date") <= pa.scalar(end_ts.date(), pa.date32())) & \
+            (pads.field("timestamp") < pa.scalar(end_ts.to_pydatetime(), dataset.schema.field("timestamp").type))
+        expr = e if expr is None else expr & e
+    cols = [c for c in (columns or dataset.schema.names) if c != "date"]
+    return _to_frame(dataset.to_table(columns=cols, filter=expr))
+
+def read_interactions(
+    raw_dir: str,
+    columns: Optional[List[str]] = None,
+    start=None,
+    end=None,
+) -> pd.DataFrame:
+    """
+    Raw interactions from the partitioned store if present, otherwise interactions.csv
+    (full scan, then the same column/date selection).
+    """
+    root = store_path(raw_dir)
+    if os.path.isdir(root) and store_dates(root):
+        return read_store(root, columns=columns, start=start, end=end)
+    csv_path = os.path.join(raw_dir, "interactions.csv")
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"No interaction store or interactions.csv in {raw_dir}")
+    usecols = None if columns is None else sorted(set(columns) | {"timestamp"})
+    df = pd.read_csv(csv_path, usecols=usecols, parse_dates=["timestamp"])
+    if start is not None:
+        df = df[df["timestamp"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["timestamp"] < pd.Timestamp(end)]
+    if columns is not None:
+        df = df[list(columns)]
+    return df.reset_index(drop=True)
@@ -9,40 +9,126 @@ def build_item_popularity(interactions: pd.DataFrame) -> pd.Series:
     pop = pop / pop.sum()
     return pop.sort_values(ascending=False)
 
-def sample_negatives_for_user(
-    user_history: set[str],
-    all_items: np.ndarray,
-    n: int,
-    rng: np.random.Generator,
-    strategy: str = "popularity",
-    item_pop: pd.Series | None = None,
-) -> list[str]:
-    if n <= 0:
-        return []
-
-    candidates = all_items
-    if strategy == "uniform":
-        negs = []
-        while len(negs) < n:
-            it = rng.choice(candidates)
-            if it not in user_history:
-                negs.append(str(it))
-        return negs
-
-    if strategy == "popularity":
-        if item_pop is None:
-            raise ValueError("item_pop must be provided for popularity sampling")
-        # sample with p ~ popularity, but avoid user_history
-        items = item_pop.index.to_numpy()
-        probs = item_pop.values
-        negs = []
-        while len(negs) < n:
-            it = rng.choice(items, p=probs)
-            if it not in user_history:
-                negs.append(str(it))
-        return negs
-
-    raise ValueError(f"Unknown sampling strategy: {strategy}")
+def build_alias_table(probs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Walker/Vose alias table: one uniform slot + one coin flip per draw, O(1) after an O(n) build.
+    Returns (accept probability per slot, alias index per slot).
+    """
+    p = np.asarray(probs, dtype=np.float64)
+    n = len(p)
+    scaled = p * n / p.sum()
+    accept = np.ones(n, dtype=np.float64)
+    alias = np.arange(n, dtype=np.int64)
+    small = [i for i in range(n) if scaled[i] < 1.0]
+    large = [i for i in range(n) if scaled[i] >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        accept[s] = scaled[s]
+        alias[s] = l
+        scaled[l] -= 1.0 - scaled[s]
+        (small if scaled[l] < 1.0 else large).append(l)
+    # leftovers are 1.0 up to rounding
+    return accept, alias
+
+class NegativeSampler:
+    """
+    Batch negative sampler over integer item codes (positions in `all_items`).
+    - uniform: every catalog item equally likely
+    - popularity: alias table over build_item_popularity (items without popularity mass are never drawn)
+    - User histories are one sorted int64 array of user_code * n_items + item_code; collisions are
+      found with searchsorted and only the rejected slots are redrawn
+    """
+
+    def __init__(
+        self,
+        all_items: np.ndarray,
+        strategy: str = "popularity",
+        item_pop: pd.Series | None = None,
+        max_rounds: int = 16,
+    ):
+        self.items = pd.Index(all_items)
+        self.n_items = len(self.items)
+        self.strategy = strategy
+        self.max_rounds = int(max_rounds)
+        self.history = np.zeros(0, dtype=np.int64)
+
+        if strategy == "uniform":
+            self._accept = self._alias = None
+            self.probs = np.full(self.n_items, 1.0 / max(1, self.n_items))
+        elif strategy == "popularity":
+            if item_pop is None:
+                raise ValueError("item_pop must be provided for popularity sampling")
+            probs = np.zeros(self.n_items, dtype=np.float64)
+            codes = self.items.get_indexer(item_pop.index)
+            known = codes >= 0
+            probs[codes[known]] = item_pop.to_numpy(dtype=np.float64)[known]
+            if probs.sum() <= 0:
+                raise ValueError("item_pop has no mass on catalog items")
+            self._accept, self._alias = build_alias_table(probs)
+            self.probs = probs / probs.sum()
+        else:
+            raise ValueError(f"Unknown sampling strategy: {strategy}")
+
+    def set_history(self, user_codes: np.ndarray, item_codes: np.ndarray) -> None:
+        keys = np.asarray(user_codes, dtype=np.int64) * self.n_items + np.asarray(item_codes, dtype=np.int64)
+        self.history = np.unique(keys[np.asarray(item_codes) >= 0])
+
+    def _draw(self, size: int, rng: np.random.Generator) -> np.ndarray:
+        slots = rng.integers(0, self.n_items, size=size)
+        if self._accept is None:
+            return slots
+        coin = rng.random(size)
+        return np.where(coin < self._accept[slots], slots, self._alias[slots])
+
+    def _seen(self, user_codes: np.ndarray, item_codes: np.ndarray) -> np.ndarray:
+        if len(self.history) == 0:
+            return np.zeros(len(item_codes), dtype=bool)
+        keys = user_codes * self.n_items + item_codes
+        pos = np.searchsorted(self.history, keys)
+        pos = np.minimum(pos, len(self.history) - 1)
+        return self.history[pos] == keys
+
+    def sample(self, user_codes: np.ndarray, n: int, rng: np.random.Generator) -> np.ndarray:
+        """Item codes of shape (len(user_codes), n), none of them in the corresponding user's history."""
+        users = np.repeat(np.asarray(user_codes, dtype=np.int64), n)
+        out = self._draw(len(users), rng)
+        todo = np.flatnonzero(self._seen(users, out))
+        for _ in range(self.max_rounds):
+            if len(todo) == 0:
+                break
+            out[todo] = self._draw(len(todo), rng)
+            todo = todo[self._seen(users[todo], out[todo])]
+        if len(todo):
+            # users whose history covers most of the mass: draw from the renormalized remainder
+            # directly (same distribution rejection sampling converges to)
+            out[todo] = self._draw_excluding(users[todo], rng)
+        return out.reshape(len(user_codes), n)
+
+    def _draw_excluding(self, users: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """
+        Exact draw per slot from probs with the slot's user history zeroed, without per-user copies:
+        binary search over item codes on cdf(j) minus the user's history mass up to j.
+        """
+        n = self.n_items
+        cdf = np.cumsum(self.probs)
+        hist_cum = np.r_[0.0, np.cumsum(self.probs[self.history % n])]
+        seg_lo = np.searchsorted(self.history, users * n)
+        seg_hi = np.searchsorted(self.history, (users + 1) * n)
+        remaining = cdf[-1] - (hist_cum[seg_hi] - hist_cum[seg_lo])
+        if (remaining <= 1e-12).any():
+            u = int(users[np.argmax(remaining <= 1e-12)])
+            raise ValueError(f"No negative candidates left outside the history of user code {u}")
+        v = rng.random(len(users)) * remaining
+
+        lo = np.zeros(len(users), dtype=np.int64)
+        hi = np.full(len(users), n - 1, dtype=np.int64)
+        while (lo < hi).any():
+            mid = (lo + hi) // 2
+            allowed = cdf[mid] - (hist_cum[np.searchsorted(self.history, users * n + mid, side="right")] - hist_cum[seg_lo])
+            right = allowed <= v
+            lo = np.where(right, mid + 1, lo)
+            hi = np.where(right, hi, mid)
+        return lo
 
 def make_ranking_dataset(
     interactions: pd.DataFrame,
@@ -51,59 +137,66 @@ def make_ranking_dataset(
     negatives_per_positive: int,
     strategy: str,
     seed: int,
+    item_pop: pd.Series | None = None,
+    history: pd.DataFrame | None = None,
 ) -> pd.DataFrame:
     """
     Convert implicit interactions into an LTR dataset:
     - Positives: observed (user, session, item) with label in {1,2,3}
     - Negatives: sampled items per positive (label=0)
     Grouping key for ranking: (user_id, session_id)
+    Duplicate user / item ids in the static tables keep their last row.
+    item_pop / history default to build_item_popularity(interactions) / interactions; pass them when
+    interactions is one chunk of a larger log (popularity over the whole log; history = the chunk plus
+    the window before it, whose items are excluded as negatives).
     """
     rng = np.random.default_rng(seed)
+    # a re-exported catalog can repeat an id; the last row wins (integer-position joins need unique keys)
+    users = users.drop_duplicates("user_id", keep="last")
+    items = items.drop_duplicates("item_id", keep="last")
 
     all_items = items["item_id"].to_numpy()
-    item_pop = build_item_popularity(interactions) if strategy == "popularity" else None
+    if strategy == "popularity" and item_pop is None:
+        item_pop = build_item_popularity(interactions)
+    history = interactions if history is None else history
 
     # Only keep events that indicate any engagement as positives
-    positives = interactions[interactions["label"] > 0].copy()
-
-    # Build user history (items seen/engaged)
-    user_hist = interactions.groupby("user_id")["item_id"].apply(lambda s: set(s.values)).to_dict()
-
-    rows = []
-    for r in positives.itertuples(index=False):
-        rows.append({
-            "user_id": r.user_id,
-            "session_id": r.session_id,
-            "timestamp": r.timestamp,
-            "device": r.device,
-            "item_id": r.item_id,
-            "label": int(r.label),
-            "watch_minutes": int(r.watch_minutes),
-            "is_negative": 0
-        })
-
-        negs = sample_negatives_for_user(
-            user_history=user_hist.get(r.user_id, set()),
-            all_items=all_items,
-            n=negatives_per_positive,
-            rng=rng,
-            strategy=strategy,
-            item_pop=item_pop,
-        )
-        for neg_it in negs:
-            rows.append({
-                "user_id": r.user_id,
-                "session_id": r.session_id,
-                "timestamp": r.timestamp,
-                "device": r.device,
-                "item_id": neg_it,
-                "label": 0,
-                "watch_minutes": 0,
-                "is_negative": 1
-            })
-
-    ds = pd.DataFrame(rows)
-    # Join user/item static info (feature base)
-    ds = ds.merge(users, on="user_id", how="left")
-    ds = ds.merge(items, on="item_id", how="left")
+    positives = interactions[interactions["label"] > 0]
+
+    # User history (items seen/engaged) as integer codes; all negatives drawn in one batch
+    sampler = NegativeSampler(all_items, strategy=strategy, item_pop=item_pop)
+    user_index = pd.Index(pd.unique(history["user_id"]))
+    sampler.set_history(user_index.get_indexer(history["user_id"]), sampler.items.get_indexer(history["item_id"]))
+    k = int(negatives_per_positive)
+    neg_codes = sampler.sample(user_index.get_indexer(positives["user_id"]), k, rng)
+    neg_items = all_items[neg_codes]
+
+    # Column-wise: each positive followed by its k negatives, as (n_pos, 1 + k) blocks flattened row-major
+    n_pos = len(positives)
+    rep = np.repeat(np.arange(n_pos), 1 + k)
+    is_neg = np.ones((n_pos, 1 + k), dtype=np.int64)
+    is_neg[:, 0] = 0
+    label = np.zeros((n_pos, 1 + k), dtype=np.int64)
+    label[:, 0] = positives["label"].to_numpy(dtype=np.int64)
+    watch = np.zeros((n_pos, 1 + k), dtype=np.int64)
+    watch[:, 0] = positives["watch_minutes"].to_numpy(dtype=np.int64)
+    item_id = np.empty((n_pos, 1 + k), dtype=object)
+    item_id[:, 0] = positives["item_id"].to_numpy(dtype=object)
+    item_id[:, 1:] = neg_items.astype(str)
+
+    cols = {c: positives[c].array.take(rep) for c in ["user_id", "session_id", "timestamp", "device"]}
+    cols.update({
+        "item_id": item_id.ravel(),
+        "label": label.ravel(),
+        "watch_minutes": watch.ravel(),
+        "is_negative": is_neg.ravel(),
+    })
+    ds = pd.DataFrame(cols)
+
+    # Join user/item static info (feature base) by integer position; unknown keys become NaN like a left merge
+    for key, table in [("user_id", users), ("item_id", items)]:
+        pos = pd.Index(table[key]).get_indexer(ds[key])
+        for c in table.columns:
+            if c != key:
+                ds[c] = table[c].array.take(pos, allow_fill=True)
     return ds
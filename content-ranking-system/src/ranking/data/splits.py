@@ -1,23 +1,99 @@
+from dataclasses import dataclass, fields
+from typing import Dict, List
 import pandas as pd
 import numpy as np
 
-def time_split(df: pd.DataFrame, train_frac: float, val_frac: float, test_frac: float):
+GROUP_COLS = ["user_id", "session_id"]
+
+def _check_fractions(train_frac: float, val_frac: float, test_frac: float) -> None:
     if abs(train_frac + val_frac + test_frac - 1.0) > 1e-6:
         raise ValueError("train/val/test fractions must sum to 1.0")
 
-    df = df.sort_values("timestamp").reset_index(drop=True)
+def group_codes(df: pd.DataFrame, group_cols: List[str] = GROUP_COLS) -> np.ndarray:
+    """Dense int64 code per row, numbered in sorted group-key order (missing keys are a group too)."""
+    return df.groupby(group_cols, sort=True, dropna=False).ngroup().to_numpy(dtype=np.int64)
+
+def run_offsets(keys: np.ndarray) -> np.ndarray:
+    """Start of every run of equal consecutive keys, plus len(keys); run lengths are np.diff of it."""
+    keys = np.asarray(keys)
+    if len(keys) == 0:
+        return np.zeros(1, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1], True]).astype(np.int64)
+
+@dataclass
+class Splits:
+    """
+    Train/val/test as index arrays over one shared frame.
+    - frame: every row once, ordered by (split, group key, timestamp): each split is one contiguous
+      block and each (user_id, session_id) group one run inside it
+    - train / val / test: ascending row positions of each split in frame
+    - group_offsets: start of every group run in frame plus len(frame), computed once from the sorted keys
+    Encode the frame once and slice it with rows(); group_sizes() always matches that row order.
+    """
+    frame: pd.DataFrame
+    train: np.ndarray
+    val: np.ndarray
+    test: np.ndarray
+    group_offsets: np.ndarray
+
+    def rows(self, name: str) -> slice:
+        idx = getattr(self, name)
+        return slice(int(idx[0]), int(idx[-1]) + 1) if len(idx) else slice(0, 0)
+
+    def take(self, name: str) -> pd.DataFrame:
+        return self.frame.iloc[self.rows(name)]
+
+    def group_sizes(self, name: str) -> np.ndarray:
+        """LightGBM group sizes of a split (group runs never cross split blocks)."""
+        r = self.rows(name)
+        if r.stop == r.start:
+            return np.zeros(0, dtype=np.int64)
+        go = self.group_offsets
+        return np.diff(go[(go >= r.start) & (go <= r.stop)])
+
+    def outputs(self) -> Dict[str, object]:
+        """Fields by name (a pipeline stage output; Splits(**outputs) restores it)."""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+def index_splits(df: pd.DataFrame, parts: List[np.ndarray], group_cols: List[str] = GROUP_COLS,
+                 order_col: str = "timestamp") -> Splits:
+    """
+    Reorder df once so that the row subsets `parts` (train, val, test; together every row once) become
+    consecutive blocks, sorted by group key inside a block and by order_col inside a group.
+    """
+    part = np.full(len(df), -1, dtype=np.int64)
+    for i, p in enumerate(parts):
+        part[p] = i
+    if (part < 0).any():
+        raise ValueError("split parts must cover every row")
+    codes = group_codes(df, group_cols)
+    keys = [codes, part]  # np.lexsort: last key is the primary one
+    if order_col in df.columns:
+        keys.insert(0, df[order_col].to_numpy())
+    order = np.lexsort(keys)
+
+    part, codes = part[order], codes[order]
+    bounds = np.r_[0, np.cumsum(np.bincount(part, minlength=len(parts)))]
+    n_codes = int(codes.max()) + 1 if len(codes) else 1
+    return Splits(
+        df.take(order).reset_index(drop=True),
+        *[np.arange(bounds[i], bounds[i + 1]) for i in range(len(parts))],
+        group_offsets=run_offsets(part * n_codes + codes),
+    )
+
+def time_split(df: pd.DataFrame, train_frac: float, val_frac: float, test_frac: float,
+               group_cols: List[str] = GROUP_COLS) -> Splits:
+    _check_fractions(train_frac, val_frac, test_frac)
+
+    by_time = np.argsort(df["timestamp"].to_numpy(), kind="stable")
     n = len(df)
     n_train = int(n * train_frac)
     n_val = int(n * val_frac)
+    return index_splits(df, [by_time[:n_train], by_time[n_train:n_train + n_val], by_time[n_train + n_val:]], group_cols)
 
-    train = df.iloc[:n_train].copy()
-    val = df.iloc[n_train:n_train + n_val].copy()
-    test = df.iloc[n_train + n_val:].copy()
-    return train, val, test
-
-def random_split(df: pd.DataFrame, train_frac: float, val_frac: float, test_frac: float, seed: int):
-    if abs(train_frac + val_frac + test_frac - 1.0) > 1e-6:
-        raise ValueError("train/val/test fractions must sum to 1.0")
+def random_split(df: pd.DataFrame, train_frac: float, val_frac: float, test_frac: float, seed: int,
+                 group_cols: List[str] = GROUP_COLS) -> Splits:
+    _check_fractions(train_frac, val_frac, test_frac)
 
     rng = np.random.default_rng(seed)
     idx = np.arange(len(df))
@@ -26,9 +102,4 @@ def random_split(df: pd.DataFrame, train_frac: float, val_frac: float, test_frac
     n = len(df)
     n_train = int(n * train_frac)
     n_val = int(n * val_frac)
-
-    train = df.iloc[idx[:n_train]].copy()
-    val = df.iloc[idx[n_train:n_train + n_val]].copy()
-    test = df.iloc[idx[n_train + n_val:]].copy()
-    return train, val, test
-
+    return index_splits(df, [idx[:n_train], idx[n_train:n_train + n_val], idx[n_train + n_val:]], group_cols)
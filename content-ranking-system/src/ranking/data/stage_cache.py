@@ -0,0 +1,208 @@
+from __future__ import annotations
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+
+STAGE_FILE = "_stage.json"
+EXTENSIONS = {"parquet": "parquet", "npy": "npy", "lgb": "bin"}
+
+def code_fingerprint(objs: Iterable[Any]) -> str:
+    """Hash of the source of the modules/functions a stage runs (its code version)."""
+    h = hashlib.sha256()
+    for obj in objs:
+        h.update(inspect.getsource(obj).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def file_fingerprint(paths: Iterable[str]) -> str:
+    """Hash of (relative path, size, mtime) of files and of every file under directories."""
+    h = hashlib.sha256()
+    for p in paths:
+        files = [p] if os.path.isfile(p) else sorted(
+            os.path.join(d, f) for d, _, fs in os.walk(p) for f in fs
+        )
+        for f in files:
+            st = os.stat(f)
+            h.update(f"{os.path.relpath(f, os.path.dirname(p))}:{st.st_size}:{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def stage_key(name: str, config: Any, code: str, inputs: Sequence[str]) -> str:
+    payload = json.dumps({"stage": name, "config": config, "code": code, "inputs": list(inputs)},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def _save_outputs(out: Dict[str, Any], d: str) -> Dict[str, str]:
+    kinds, values = {}, {}
+    for name, v in out.items():
+        if isinstance(v, pd.DataFrame):
+            v.to_parquet(os.path.join(d, f"{name}.parquet"))
+            kinds[name] = "parquet"
+        elif isinstance(v, np.ndarray):
+            np.save(os.path.join(d, f"{name}.npy"), v)
+            kinds[name] = "npy"
+        elif isinstance(v, lgb.Dataset):
+            v.save_binary(os.path.join(d, f"{name}.bin"))
+            kinds[name] = "lgb"
+        else:
+            values[name] = v
+            kinds[name] = "json"
+    with open(os.path.join(d, "values.json"), "w", encoding="utf-8") as f:
+        json.dump(values, f)
+    return kinds
+
+def _load_outputs(kinds: Dict[str, str], d: str) -> Dict[str, Any]:
+    with open(os.path.join(d, "values.json"), "r", encoding="utf-8") as f:
+        values = json.load(f)
+    out: Dict[str, Any] = {}
+    datasets: Dict[str, lgb.Dataset] = {}
+    for name, kind in kinds.items():
+        if kind == "parquet":
+            out[name] = pd.read_parquet(os.path.join(d, f"{name}.parquet"))
+        elif kind == "npy":
+            out[name] = np.load(os.path.join(d, f"{name}.npy"))
+        elif kind == "lgb":
+            # binaries carry their own bin mappers; the first one is the reference for the rest
+            ref = next(iter(datasets.values()), None)
+            datasets[name] = out[name] = lgb.Dataset(os.path.join(d, f"{name}.bin"), reference=ref)
+        else:
+            out[name] = values[name]
+    return out
+
+def _touch(path: str) -> None:
+    # last use of a key, for prune(); set explicitly (the filesystem clock can be coarse)
+    t = time.time_ns()
+    os.utime(path, ns=(t, t))
+
+class Stage:
+    """
+    One pipeline step: fn(*dep values) -> {name: DataFrame | ndarray | lgb.Dataset | JSON value}.
+    The key (inputs' keys + config + code) is known up front; the value is only computed or
+    loaded when something asks for it, so a cached downstream stage never touches its inputs.
+    """
+
+    def __init__(self, cache: "StageCache", name: str, fn: Callable[..., Dict[str, Any]],
+                 deps: Sequence["Stage"], config: Any, code: Iterable[Any], persist: bool, key: Optional[str]) -> None:
+        self.cache = cache
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.persist = persist
+        self.key = key or stage_key(name, config, code_fingerprint(code), [d.key for d in self.deps])
+        self.status = "skipped"  # not computed or loaded: nothing downstream needed it
+        self.seconds = 0.0
+        self._value: Optional[Dict[str, Any]] = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.cache.root, self.name, self.key)
+
+    @property
+    def value(self) -> Dict[str, Any]:
+        if self._value is None:
+            self._value = self.cache._materialize(self)
+        return self._value
+
+    def file(self, name: str) -> Optional[str]:
+        """Path of a persisted output file (None when not cached)."""
+        meta = os.path.join(self.path, STAGE_FILE)
+        if not os.path.exists(meta):
+            return None
+        with open(meta, "r", encoding="utf-8") as f:
+            kind = json.load(f)["outputs"][name]
+        if self.status == "skipped":
+            self.status = "hit"  # used straight from the cache directory
+        return os.path.join(self.path, f"{name}.{EXTENSIONS[kind]}")
+
+    def json_value(self, name: str) -> Any:
+        """A JSON output without loading the stage's frames (when cached)."""
+        values = os.path.join(self.path, "values.json")
+        if self._value is None and self.cache.enabled and self.persist and os.path.exists(os.path.join(self.path, STAGE_FILE)):
+            with open(values, "r", encoding="utf-8") as f:
+                return json.load(f)[name]
+        return self.value[name]
+
+    def release(self) -> None:
+        self._value = None
+
+class StageCache:
+    """
+    Content-addressed cache of stage outputs: root/<stage>/<key>/ with one file per output
+    and a _stage.json written last (a directory without it is an interrupted write).
+    Each stage keeps its `keep` most recently used keys (a hit counts as a use); older ones are
+    removed whenever the stage writes a new key. keep <= 0 keeps everything.
+    """
+
+    def __init__(self, root: str, enabled: bool = True, keep: int = 3) -> None:
+        self.root = root
+        self.enabled = enabled
+        self.keep = int(keep)
+        self.stages: List[Stage] = []
+
+    def stage(self, name: str, fn: Callable[..., Dict[str, Any]], deps: Sequence[Stage] = (),
+              config: Any = None, code: Iterable[Any] = (), persist: bool = True, key: Optional[str] = None) -> Stage:
+        s = Stage(self, name, fn, deps, config, code, persist, key)
+        self.stages.append(s)
+        return s
+
+    def _materialize(self, s: Stage) -> Dict[str, Any]:
+        meta_path = os.path.join(s.path, STAGE_FILE)
+        if self.enabled and s.persist and os.path.exists(meta_path):
+            t0 = time.perf_counter()
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            out = _load_outputs(meta["outputs"], s.path)
+            _touch(meta_path)
+            s.status, s.seconds = "hit", time.perf_counter() - t0
+            return out
+
+        inputs = [d.value for d in s.deps]
+        t0 = time.perf_counter()
+        out = s.fn(*inputs)
+        s.seconds = time.perf_counter() - t0
+        s.status = "miss" if (self.enabled and s.persist) else "uncached"
+        if s.status == "miss":
+            tmp = f"{s.path}.tmp.{os.getpid()}"
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            kinds = _save_outputs(out, tmp)
+            with open(os.path.join(tmp, STAGE_FILE), "w", encoding="utf-8") as f:
+                json.dump({"stage": s.name, "key": s.key, "created_at": datetime.utcnow().isoformat() + "Z",
+                           "compute_s": s.seconds, "outputs": kinds}, f, indent=2)
+            shutil.rmtree(s.path, ignore_errors=True)
+            os.replace(tmp, s.path)
+            _touch(meta_path)
+            self.prune(s.name)
+        return out
+
+    def prune(self, name: str) -> List[str]:
+        """Remove all but the `keep` most recently used keys of a stage; returns the removed keys."""
+        d = os.path.join(self.root, name)
+        if self.keep <= 0 or not os.path.isdir(d):
+            return []
+        used = []
+        for key in os.listdir(d):
+            meta = os.path.join(d, key, STAGE_FILE)
+            if os.path.exists(meta):  # in-progress writes (<key>.tmp.<pid>) have none yet
+                used.append((os.stat(meta).st_mtime_ns, key))
+        removed = [key for _, key in sorted(used, reverse=True)[self.keep:]]
+        for key in removed:
+            shutil.rmtree(os.path.join(d, key), ignore_errors=True)
+        return removed
+
+    def report(self) -> List[Dict[str, Any]]:
+        return [
+            {"stage": s.name, "key": s.key, "status": s.status, "seconds": round(s.seconds, 4),
+             "cached": os.path.exists(os.path.join(s.path, STAGE_FILE))}
+            for s in self.stages
+        ]
+
+    def print_report(self) -> None:
+        for r in self.report():
+            print(f"  {r['stage']:>16} {r['status']:>10} {r['seconds']:8.2f}s  {r['key']}")
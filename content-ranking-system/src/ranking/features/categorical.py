@@ -0,0 +1,154 @@
+from __future__ import annotations
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+
+MISSING_CODE = -1  # LightGBM treats negative categorical values as missing
+
+def hash_bucket(value: Any, buckets: int) -> int:
+    # crc32 instead of hash(): stable across processes / Python versions
+    return zlib.crc32(str(value).encode("utf-8")) % int(buckets)
+
+def fit_categorical_spec(
+    df: pd.DataFrame,
+    cat_cols: List[str],
+    max_categories: int = 1000,
+    high_cardinality: str = "hash",
+    hash_buckets: int = 1024,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Dictionary-encoding spec for native LightGBM categoricals, fitted on the training split.
+    - Columns with <= max_categories distinct values: {"type": "vocab", "values": [...]} (code = position)
+    - Higher-cardinality IDs: {"type": "hash", "buckets": N} or {"type": "drop"} per `high_cardinality`
+    """
+    uniques = {c: set(pd.unique(df[c].dropna().astype(str)).tolist()) for c in cat_cols}
+    return spec_from_uniques(uniques, max_categories, high_cardinality, hash_buckets)
+
+def spec_from_uniques(
+    uniques: Dict[str, set],
+    max_categories: int = 1000,
+    high_cardinality: str = "hash",
+    hash_buckets: int = 1024,
+) -> Dict[str, Dict[str, Any]]:
+    if high_cardinality not in ("hash", "drop"):
+        raise ValueError(f"Unknown high_cardinality strategy: {high_cardinality}")
+    spec: Dict[str, Dict[str, Any]] = {}
+    for c, values in uniques.items():
+        if len(values) <= int(max_categories):
+            spec[c] = {"type": "vocab", "values": sorted(values)}
+        elif high_cardinality == "hash":
+            spec[c] = {"type": "hash", "buckets": int(hash_buckets)}
+        else:
+            spec[c] = {"type": "drop"}
+    return spec
+
+def native_feature_cols(spec: Dict[str, Dict[str, Any]]) -> List[str]:
+    return [c for c, s in spec.items() if s["type"] != "drop"]
+
+def encode_column(values: pd.Series, col_spec: Dict[str, Any]) -> np.ndarray:
+    missing = values.isna().to_numpy()
+    if col_spec["type"] == "vocab":
+        codes = pd.Index(col_spec["values"]).get_indexer(values.astype(str))
+    else:
+        codes = np.fromiter((hash_bucket(v, col_spec["buckets"]) for v in values.astype(str)), dtype=np.int64, count=len(values))
+    codes = codes.astype(np.int32)
+    codes[missing] = MISSING_CODE
+    return codes  # unseen vocab values are already -1 from get_indexer
+
+def encode_native(df: pd.DataFrame, spec: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
+    """Replace categorical columns by int32 codes (dropped columns removed); other columns untouched."""
+    out = df.drop(columns=[c for c, s in spec.items() if s["type"] == "drop" and c in df.columns])
+    for c in native_feature_cols(spec):
+        out[c] = encode_column(df[c], spec[c])
+    return out
+
+class FrameEncoder:
+    """
+    Vectorized DataFrame -> float32 matrix with a fixed column layout, for chunked encoding.
+    - onehot: numeric columns, then "<col>_<value>" per sorted value and "<col>_nan" per categorical
+      (same layout as pd.get_dummies(..., dummy_na=True) on the full data)
+    - native: categorical columns replaced in place by their int32 codes (encode_native layout)
+    The layout is fixed up front (fit_chunks), so every chunk encodes to the same columns.
+    """
+
+    def __init__(self, columns: List[str], cat_cols: List[str], mode: str, spec: Dict[str, Dict[str, Any]]):
+        self.columns = list(columns)
+        self.cat_cols = [c for c in cat_cols if c in self.columns]
+        self.mode = mode
+        self.spec = spec
+        if mode == "onehot":
+            self.numeric_cols = [c for c in self.columns if c not in self.cat_cols]
+            self.features = list(self.numeric_cols)
+            self._offsets: Dict[str, int] = {}
+            for c in self.cat_cols:
+                self._offsets[c] = len(self.features)
+                self.features += [f"{c}_{v}" for v in spec[c]["values"]] + [f"{c}_nan"]
+        elif mode == "native":
+            self.features = [c for c in self.columns if not (c in spec and spec[c]["type"] == "drop")]
+        else:
+            raise ValueError(f"Unknown categorical_encoding: {mode}")
+        self._index = {f: j for j, f in enumerate(self.features)}
+
+    @classmethod
+    def fit_chunks(
+        cls,
+        chunks: Iterable[pd.DataFrame],
+        cat_cols: List[str],
+        feat_cfg: dict,
+        columns: Optional[List[str]] = None,
+    ) -> "FrameEncoder":
+        """
+        One pass over the (training) chunks to collect the categorical vocabularies.
+        `columns` fixes the feature column order; by default it is taken from the first chunk,
+        otherwise the chunks only need the categorical columns.
+        """
+        uniques: Optional[Dict[str, set]] = None
+        for df in chunks:
+            if columns is None:
+                columns = list(df.columns)
+            if uniques is None:
+                uniques = {c: set() for c in cat_cols if c in columns}
+            for c in uniques:
+                uniques[c].update(pd.unique(df[c].dropna().astype(str)).tolist())
+        if columns is None or uniques is None:
+            raise ValueError("No data to fit the encoder on")
+
+        mode = str(feat_cfg.get("categorical_encoding", "onehot"))
+        if mode == "native":
+            spec = spec_from_uniques(
+                uniques,
+                max_categories=int(feat_cfg.get("max_categories", 1000)),
+                high_cardinality=str(feat_cfg.get("high_cardinality", "hash")),
+                hash_buckets=int(feat_cfg.get("hash_buckets", 1024)),
+            )
+        else:
+            spec = {c: {"type": "vocab", "values": sorted(v)} for c, v in uniques.items()}
+        return cls(columns, cat_cols, mode, spec)
+
+    def meta(self) -> Dict[str, Any]:
+        if self.mode == "native":
+            return {
+                "categorical_encoding": "native",
+                "categorical_spec": self.spec,
+                "categorical_features": native_feature_cols(self.spec),
+            }
+        return {"categorical_encoding": "onehot"}
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        X = np.zeros((len(df), len(self.features)), dtype=np.float32)
+        if self.mode == "native":
+            for j, c in enumerate(self.features):
+                X[:, j] = encode_column(df[c], self.spec[c]) if c in self.spec else df[c].to_numpy(dtype=np.float32)
+            return X
+
+        for c in self.numeric_cols:
+            X[:, self._index[c]] = df[c].to_numpy(dtype=np.float32)
+        rows = np.arange(len(df))
+        for c in self.cat_cols:
+            values = self.spec[c]["values"]
+            codes = pd.Index(values).get_indexer(df[c].astype(str))
+            codes[df[c].isna().to_numpy()] = len(values)  # the "<col>_nan" column
+            hit = codes >= 0
+            X[rows[hit], self._offsets[c] + codes[hit]] = 1.0
+        return X
@@ -4,12 +4,13 @@ def add_item_aggregate_features(df: pd.DataFrame, interactions: pd.DataFrame, wi
     interactions = interactions.copy()
     interactions["timestamp"] = pd.to_datetime(interactions["timestamp"])
     max_ts = interactions["timestamp"].max()
-    cutoff = max_ts - pd.Timedelta(days=window_days)
+    # last `window_days` calendar days (day buckets, same as the online store)
+    cutoff = max_ts.normalize() - pd.Timedelta(days=window_days - 1)
     recent = interactions[interactions["timestamp"] >= cutoff]
 
     item_watch = recent.groupby("item_id")["watch_minutes"].sum().rename("i_watch_mins_30d")
-    item_plays = recent.groupby("item_id")["label"].apply(lambda s: (s >= 2).sum()).rename("i_plays_30d")
-    item_clicks = recent.groupby("item_id")["label"].apply(lambda s: (s >= 1).sum()).rename("i_clicks_30d")
+    item_plays = (recent["label"] >= 2).groupby(recent["item_id"]).sum().rename("i_plays_30d")
+    item_clicks = (recent["label"] >= 1).groupby(recent["item_id"]).sum().rename("i_clicks_30d")
 
     out = df.merge(item_watch, on="item_id", how="left") \
             .merge(item_plays, on="item_id", how="left") \
@@ -0,0 +1,435 @@
+from __future__ import annotations
+import io
+import os
+import queue
+import threading
+from collections import deque
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from src.ranking.data.interaction_store import partition_date, read_files, store_files
+from src.ranking.features.point_in_time import agg_feature_names
+
+DAY_S = 86400
+# raw interaction columns the store aggregates
+EVENT_COLUMNS = ["user_id", "item_id", "timestamp", "label", "watch_minutes"]
+# per-bucket sums: watch minutes, plays (label >= 2), clicks (label >= 1)
+_N_SUMS = 3
+
+def _to_day(ts: Any) -> int:
+    if isinstance(ts, (int, float, np.integer, np.floating)):
+        return int(ts) // DAY_S
+    return int(pd.Timestamp(ts).value // (DAY_S * 10**9))
+
+def _days(ts: pd.Series) -> np.ndarray:
+    return pd.to_datetime(ts).to_numpy().astype("datetime64[D]").astype(np.int64)
+
+class _RingAggregates:
+    """
+    Day-bucketed ring buffers for one entity type (users or items).
+    Slot day % window_days holds the sums of that day; an event for a newer day overwrites
+    the (by then out-of-window) bucket, so updates are O(1) and nothing is ever rescanned.
+    """
+
+    def __init__(self, window_days: int, capacity: int = 1024):
+        self.window_days = int(window_days)
+        self.index: Dict[str, int] = {}
+        self.days = np.full((capacity, self.window_days), -1, dtype=np.int64)
+        self.sums = np.zeros((capacity, self.window_days, _N_SUMS), dtype=np.float64)
+        self.versions = np.zeros(capacity, dtype=np.int64)
+
+    def _grow(self, need: int) -> None:
+        cap = self.days.shape[0]
+        if need <= cap:
+            return
+        new_cap = max(need, cap * 2)
+        days = np.full((new_cap, self.window_days), -1, dtype=np.int64)
+        sums = np.zeros((new_cap, self.window_days, _N_SUMS), dtype=np.float64)
+        versions = np.zeros(new_cap, dtype=np.int64)
+        days[:cap], sums[:cap], versions[:cap] = self.days, self.sums, self.versions
+        self.days, self.sums, self.versions = days, sums, versions
+
+    def codes(self, keys: Iterable[str], create: bool = False) -> np.ndarray:
+        if not create:
+            return np.fromiter((self.index.get(k, -1) for k in keys), dtype=np.int64)
+        out = []
+        for k in keys:
+            c = self.index.get(k)
+            if c is None:
+                c = len(self.index)
+                self.index[k] = c
+            out.append(c)
+        self._grow(len(self.index))
+        return np.asarray(out, dtype=np.int64)
+
+    def add(self, key: str, day: int, values: Tuple[float, float, float]) -> None:
+        e = int(self.codes([key], create=True)[0])
+        slot = day % self.window_days
+        d = self.days[e, slot]
+        if d == day:
+            self.sums[e, slot] += values
+        elif d < day:
+            self.days[e, slot] = day
+            self.sums[e, slot] = values
+        else:
+            return  # older than the bucket already there, i.e. outside the window
+        self.versions[e] += 1
+
+    def add_many(self, keys: np.ndarray, days: np.ndarray, values: np.ndarray) -> None:
+        """Bulk version of add() (same result as adding the events one by one, in any order)."""
+        if len(keys) == 0:
+            return
+        codes = self.codes(keys, create=True)
+        df = pd.DataFrame({"c": codes, "d": days, "w": values[:, 0], "p": values[:, 1], "k": values[:, 2]})
+        g = df.groupby(["c", "d"], sort=False).sum().reset_index()
+        g["slot"] = g["d"] % self.window_days
+        # only the newest day per (entity, slot) survives
+        g = g[g["d"] == g.groupby(["c", "slot"])["d"].transform("max")]
+
+        c = g["c"].to_numpy()
+        slot = g["slot"].to_numpy()
+        d = g["d"].to_numpy()
+        s = g[["w", "p", "k"]].to_numpy(dtype=np.float64)
+        cur = self.days[c, slot]
+
+        newer = d > cur
+        self.days[c[newer], slot[newer]] = d[newer]
+        self.sums[c[newer], slot[newer]] = s[newer]
+        same = d == cur
+        self.sums[c[same], slot[same]] += s[same]
+        touched = c[newer | same]
+        np.add.at(self.versions, touched, 1)
+
+    def totals(self, keys: List[str], now_day: int, window_days: Optional[int] = None) -> np.ndarray:
+        """Sums over the last window_days (<= ring size) calendar days up to now_day."""
+        window = self.window_days if window_days is None else int(window_days)
+        codes = self.codes(keys)
+        out = np.zeros((len(codes), _N_SUMS), dtype=np.float64)
+        known = codes >= 0
+        if known.any():
+            c = codes[known]
+            d = self.days[c]
+            in_window = (d > now_day - window) & (d <= now_day)
+            out[known] = (self.sums[c] * in_window[..., None]).sum(axis=1)
+        return out
+
+    def version(self, key: str) -> int:
+        c = self.index.get(key)
+        return 0 if c is None else int(self.versions[c])
+
+class OnlineFeatureStore:
+    """
+    In-process online store for the 30-day user/item aggregates used at training time.
+    - Fed event by event (ingest / queue consumer) or in bulk (ingest_frame / file tail)
+    - Values are as of the newest event day seen, over the last window_days calendar days,
+      which is exactly what add_user_aggregate_features / add_item_aggregate_features compute on the same log
+    - extra_windows adds "<prefix>_*_<W>d" columns (as add_point_in_time_aggregates names them);
+      the ring buffers are sized for the longest window
+    - Also keeps each user's last `recent_items` engaged items (label >= 1) for candidate retrieval
+    """
+
+    def __init__(self, window_days: int = 30, extra_windows: Iterable[int] = (), recent_items: int = 50):
+        self.recent_n = int(recent_items)
+        self.recent: Dict[str, deque] = {}
+        self.window_days = int(window_days)
+        self.extra_windows = sorted({int(w) for w in extra_windows} - {self.window_days})
+        self.ring_days = max([self.window_days, *self.extra_windows])
+        self.users = _RingAggregates(self.ring_days)
+        self.items = _RingAggregates(self.ring_days)
+        self.now_day = -1
+        self.events = 0
+        self.generation = 0  # bumped by reset(): per-key versions restart from 0
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.users = _RingAggregates(self.ring_days)
+            self.items = _RingAggregates(self.ring_days)
+            self.recent = {}
+            self.now_day = -1
+            self.events = 0
+            self.generation += 1
+
+    def _remember(self, user_id: str, item_ids: Iterable[str]) -> None:
+        dq = self.recent.get(user_id)
+        if dq is None:
+            dq = self.recent[user_id] = deque(maxlen=self.recent_n)
+        dq.extend(item_ids)
+
+    def ingest(self, event: Dict[str, Any]) -> None:
+        """event: user_id, item_id, timestamp, label, watch_minutes."""
+        day = _to_day(event["timestamp"])
+        label = int(event.get("label", 0))
+        values = (float(event.get("watch_minutes", 0)), float(label >= 2), float(label >= 1))
+        with self._lock:
+            self.users.add(str(event["user_id"]), day, values)
+            self.items.add(str(event["item_id"]), day, values)
+            if label >= 1:
+                self._remember(str(event["user_id"]), [str(event["item_id"])])
+            self.now_day = max(self.now_day, day)
+            self.events += 1
+
+    def ingest_frame(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        days = _days(df["timestamp"])
+        label = df["label"].to_numpy()
+        values = np.column_stack([
+            df["watch_minutes"].to_numpy(dtype=np.float64),
+            (label >= 2).astype(np.float64),
+            (label >= 1).astype(np.float64),
+        ])
+        pos = df.loc[label >= 1, ["user_id", "item_id", "timestamp"]].astype({"user_id": str, "item_id": str})
+        pos = pos.sort_values("timestamp", kind="stable").groupby("user_id", sort=False).tail(self.recent_n)
+        recent = pos.groupby("user_id", sort=False)["item_id"].agg(list)
+        with self._lock:
+            self.users.add_many(df["user_id"].astype(str).to_numpy(), days, values)
+            self.items.add_many(df["item_id"].astype(str).to_numpy(), days, values)
+            for user_id, item_ids in recent.items():
+                self._remember(user_id, item_ids)
+            self.now_day = max(self.now_day, int(days.max()))
+            self.events += len(df)
+
+    @staticmethod
+    def _as_features(prefix: str, sums: np.ndarray) -> List[Dict[str, float]]:
+        return [
+            {
+                f"{prefix}_watch_mins_30d": float(w),
+                f"{prefix}_plays_30d": float(p),
+                f"{prefix}_clicks_30d": float(k),
+                f"{prefix}_play_rate_30d": float(p / (k + 1.0)),
+            }
+            for w, p, k in sums
+        ]
+
+    def _features(self, prefix: str, rings: _RingAggregates, keys: List[str]) -> List[Dict[str, float]]:
+        with self._lock:
+            out = self._as_features(prefix, rings.totals(keys, self.now_day))
+            for w in self.extra_windows:
+                names = agg_feature_names(prefix, w)
+                for row, (wm, p, k) in zip(out, rings.totals(keys, self.now_day, w)):
+                    row.update(zip(names, (float(wm), float(p), float(k), float(p / (k + 1.0)))))
+        return out
+
+    def user_features(self, user_ids: List[str]) -> List[Dict[str, float]]:
+        return self._features("u", self.users, list(user_ids))
+
+    def item_features(self, item_ids: List[str]) -> List[Dict[str, float]]:
+        return self._features("i", self.items, list(item_ids))
+
+    def recent_items(self, user_id: str) -> List[str]:
+        """The user's last engaged items, oldest first."""
+        with self._lock:
+            return list(self.recent.get(user_id, ()))
+
+    def user_version(self, user_id: str) -> int:
+        return self.users.version(user_id)
+
+    def enrich(self, user_row: dict, item_rows: List[dict]) -> Tuple[dict, List[dict]]:
+        """Copies of the catalog rows with the current aggregates filled in."""
+        uf = self.user_features([user_row.get("user_id")])[0]
+        ifs = self.item_features([it.get("item_id") for it in item_rows])
+        return {**user_row, **uf}, [{**it, **f} for it, f in zip(item_rows, ifs)]
+
+# bytes compared at each end of the consumed prefix to notice an in-place rewrite
+FINGERPRINT_BYTES = 4096
+
+def _fingerprint(f, offset: int) -> bytes:
+    """First and last (up to) FINGERPRINT_BYTES of the first `offset` bytes of an open binary file."""
+    n = min(offset, FINGERPRINT_BYTES)
+    f.seek(0)
+    head = f.read(n)
+    f.seek(offset - n)
+    return head + f.read(n)
+
+class InteractionTailer:
+    """
+    Follows an append-only interactions CSV and feeds complete new lines to the store.
+    If the file was rewritten (or removed) by a new offline run the store is rebuilt from the start.
+    A rewrite is a new file (device, inode), a file shorter than what was read, or consumed bytes
+    that changed (start and end of the read prefix), so a rewrite to a larger size is caught too.
+    If another feed reset the store, the file is replayed from the start.
+    """
+
+    def __init__(self, path: str, store: OnlineFeatureStore):
+        self.path = path
+        self.store = store
+        self._offset = 0
+        self._header: Optional[str] = None
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._fingerprint = b""
+        self._generation = store.generation
+
+    def _rewritten(self, f, st: os.stat_result) -> bool:
+        if not self._offset:
+            return False
+        return ((st.st_dev, st.st_ino) != self._file_id or st.st_size < self._offset
+                or _fingerprint(f, self._offset) != self._fingerprint)
+
+    def _restart(self, reset: bool) -> None:
+        if reset:
+            self.store.reset()
+        self._offset, self._header = 0, None
+        self._generation = self.store.generation
+
+    def poll(self) -> int:
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            if self._offset:
+                self._restart(reset=True)
+            return 0
+        with f:
+            st = os.fstat(f.fileno())
+            if self.store.generation != self._generation:
+                self._restart(reset=False)
+            elif self._rewritten(f, st):
+                self._restart(reset=True)
+            size = st.st_size
+            if size == self._offset:
+                return 0
+
+            f.seek(self._offset)
+            chunk = f.read(size - self._offset)
+            end = chunk.rfind(b"\n")
+            if end < 0:
+                return 0  # partial line, wait for the writer
+            chunk = chunk[:end + 1]
+            text = chunk.decode("utf-8")
+            header = self._header
+            if header is None:
+                header, _, text = text.partition("\n")
+            if text.strip():
+                df = pd.read_csv(io.StringIO(header + "\n" + text))
+            else:
+                df = None
+            self._offset += len(chunk)
+            self._header = header
+            self._file_id = (st.st_dev, st.st_ino)
+            self._fingerprint = _fingerprint(f, self._offset)
+        if df is None:
+            return 0
+        self.store.ingest_frame(df)
+        return len(df)
+
+class StoreTailer:
+    """
+    Follows the date-partitioned interaction store (data/interaction_store.py) like InteractionTailer
+    follows the CSV: each poll ingests the part files not read before (new dates or new shards).
+    - The first poll skips partitions older than the store's aggregate window
+    - A read file that changed or disappeared means a new offline run: the store is rebuilt
+    - A file that cannot be read yet (still being written) is retried on the next poll
+    """
+
+    def __init__(self, root: str, store: OnlineFeatureStore, columns: List[str] = EVENT_COLUMNS):
+        self.root = root
+        self.store = store
+        self.columns = list(columns)
+        self._seen: Dict[str, Tuple[int, int]] = {}
+        self._generation = store.generation
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def poll(self) -> int:
+        files = {p: self._signature(p) for p in store_files(self.root)}
+        if self.store.generation != self._generation:
+            self._seen = {}  # another feed reset the store: replay the window
+        elif any(files.get(p) != sig for p, sig in self._seen.items()):
+            self.store.reset()
+            self._seen = {}
+        self._generation = self.store.generation
+        new = [p for p, sig in files.items() if sig is not None and p not in self._seen]
+        if not new:
+            return 0
+        if not self._seen:
+            start = max(partition_date(p) for p in new) - timedelta(days=self.store.ring_days - 1)
+            self._seen.update((p, files[p]) for p in new if partition_date(p) < start)
+            new = [p for p in new if partition_date(p) >= start]
+
+        frames = []
+        for p in new:
+            try:
+                df = read_files([p], columns=self.columns)
+            except Exception:  # no footer yet: the writer is still on it
+                continue
+            if self._signature(p) == files[p]:  # else rewritten while reading; next poll sees it
+                frames.append(df)
+                self._seen[p] = files[p]
+        if not frames:
+            return 0
+        df = pd.concat(frames, ignore_index=True).sort_values("timestamp", kind="stable")
+        self.store.ingest_frame(df)
+        return len(df)
+
+def consume_queue(q: "queue.Queue", store: OnlineFeatureStore, stop: threading.Event, timeout_s: float = 0.5) -> None:
+    """Drain event dicts from an in-process queue into the store until `stop` is set."""
+    while not stop.is_set():
+        try:
+            event = q.get(timeout=timeout_s)
+        except queue.Empty:
+            continue
+        store.ingest(event)
+
+class OnlineStoreFeeder:
+    """
+    Background thread polling the raw interaction files and/or draining an in-process event queue.
+    - path: the interactions CSV, tailed by InteractionTailer
+    - store_dir: the date-partitioned interaction store, followed by StoreTailer
+    The generator writes one or the other; both feeds replay their source when the other one resets
+    the store.
+    """
+
+    def __init__(
+        self,
+        store: OnlineFeatureStore,
+        path: Optional[str] = None,
+        poll_interval_s: float = 5.0,
+        store_dir: Optional[str] = None,
+    ):
+        self.store = store
+        self.tailers: List[Any] = []
+        if path:
+            self.tailers.append(InteractionTailer(path, store))
+        if store_dir:
+            self.tailers.append(StoreTailer(store_dir, store))
+        self.queue: "queue.Queue" = queue.Queue()
+        self.poll_interval_s = float(poll_interval_s)
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def poll(self) -> int:
+        n = 0
+        for tailer in self.tailers:
+            try:
+                n += tailer.poll()
+            except Exception:  # a malformed append must not kill the feeder; retry on the next poll
+                pass
+        return n
+
+    def start(self) -> None:
+        if self.tailers:
+            self.poll()  # bootstrap synchronously so the first request sees real aggregates
+            t = threading.Thread(target=self._tail_loop, name="online-store-tail", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=consume_queue, args=(self.queue, self.store, self._stop), name="online-store-queue", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def _tail_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval_s):
+            self.poll()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=self.poll_interval_s + 1.0)
+        self._threads = []
@@ -10,13 +10,14 @@ def add_user_aggregate_features(df: pd.DataFrame, interactions: pd.DataFrame, wi
 
     # Rolling window cutoff relative to each row timestamp
     # For simplicity (and speed), we compute global last-window aggregates.
+    # The window is the last `window_days` calendar days (day buckets, same as the online store).
     max_ts = interactions["timestamp"].max()
-    cutoff = max_ts - pd.Timedelta(days=window_days)
+    cutoff = max_ts.normalize() - pd.Timedelta(days=window_days - 1)
     recent = interactions[interactions["timestamp"] >= cutoff]
 
     user_watch = recent.groupby("user_id")["watch_minutes"].sum().rename("u_watch_mins_30d")
-    user_plays = recent.groupby("user_id")["label"].apply(lambda s: (s >= 2).sum()).rename("u_plays_30d")
-    user_clicks = recent.groupby("user_id")["label"].apply(lambda s: (s >= 1).sum()).rename("u_clicks_30d")
+    user_plays = (recent["label"] >= 2).groupby(recent["user_id"]).sum().rename("u_plays_30d")
+    user_clicks = (recent["label"] >= 1).groupby(recent["user_id"]).sum().rename("u_clicks_30d")
 
     out = df.merge(user_watch, on="user_id", how="left") \
             .merge(user_plays, on="user_id", how="left") \
@@ -0,0 +1,188 @@
+from __future__ import annotations
+import hashlib
+import os
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional
+import numpy as np
+import lightgbm as lgb
+
+# missing_type codes (LightGBM MissingType)
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+_MISSING = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+ZERO_THRESHOLD = 1e-35  # LightGBM kZeroThreshold
+
+def model_digest(model_str: str) -> str:
+    return hashlib.sha256(model_str.encode("utf-8")).hexdigest()[:16]
+
+@dataclass
+class CompiledForest:
+    """
+    All trees of a booster flattened into contiguous arrays (one row per split node):
+    - split_feature / threshold / default_left / missing_type / is_cat per node
+    - left / right child: node index, or ~leaf_index (negative) for leaves
+    - roots: first node of every tree (~leaf for single-leaf trees)
+    - cat_bitsets: one boolean row per categorical split (category value -> goes left)
+    predict() moves every (row, tree) pair one level per step with array ops, following
+    LightGBM's decision rules (missing types, default direction, categorical sets).
+    """
+    split_feature: np.ndarray
+    threshold: np.ndarray
+    default_left: np.ndarray
+    missing_type: np.ndarray
+    is_cat: np.ndarray
+    cat_index: np.ndarray
+    left: np.ndarray
+    right: np.ndarray
+    leaf_value: np.ndarray
+    roots: np.ndarray
+    cat_bitsets: np.ndarray
+    max_depth: int
+    n_features: int
+    digest: str = ""
+
+    def __post_init__(self) -> None:
+        # Runtime layout: nodes 0..N-1 followed by one self-looping entry per leaf, so every
+        # (row, tree) pair takes exactly max_depth steps without masking finished trees.
+        n_nodes, n_leaves = len(self.left), len(self.leaf_value)
+        pad = lambda a, v: np.concatenate([a, np.full(n_leaves, v, dtype=a.dtype)])
+        unify = lambda c: np.where(c >= 0, c, n_nodes + ~c).astype(np.int64)
+        self._feature = pad(self.split_feature.astype(np.int64), 0)
+        self._threshold = pad(self.threshold, np.inf)
+        self._default_left = pad(self.default_left, False)
+        self._missing_type = pad(self.missing_type, MISSING_NONE)
+        self._is_cat = pad(self.is_cat, False)
+        self._cat_index = pad(self.cat_index, 0)
+        leaves = np.arange(n_nodes, n_nodes + n_leaves, dtype=np.int64)
+        children = np.empty(2 * (n_nodes + n_leaves), dtype=np.int64)  # [2*i] right, [2*i + 1] left
+        children[0::2] = np.concatenate([unify(self.right), leaves])
+        children[1::2] = np.concatenate([unify(self.left), leaves])
+        self._children = children
+        self._roots = unify(self.roots)
+        self._values = pad(np.zeros(n_nodes), 0.0)
+        self._values[n_nodes:] = self.leaf_value
+        self._exact = bool((self.missing_type == MISSING_ZERO).any() or self.is_cat.any())
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Raw scores (sum of leaf values), same as Booster.predict for the compiled iterations."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected a (n, {self.n_features}) matrix, got {X.shape}")
+        n = X.shape[0]
+        if n == 0 or self.n_trees == 0:
+            return np.zeros(n)
+        flat = X.ravel()
+        offset = (np.arange(n, dtype=np.int64) * self.n_features)[:, None]
+        node = np.broadcast_to(self._roots, (n, self.n_trees)).copy()
+        if self._exact or np.isnan(flat).any():
+            step = self._step_exact
+        else:
+            # no NaN input, no zero-as-missing or categorical splits: a plain threshold test
+            step = lambda x, nd: x <= self._threshold[nd]
+        for _ in range(self.max_depth):
+            go_left = step(flat[offset + self._feature[node]], node)
+            node = self._children[2 * node + go_left]
+        return self._values[node].sum(axis=1)
+
+    def _step_exact(self, x: np.ndarray, nd: np.ndarray) -> np.ndarray:
+        """LightGBM's decision rule: missing types, default direction, categorical sets."""
+        mt = self._missing_type[nd]
+        nan = np.isnan(x)
+        # NaN counts as 0.0 unless the split has a NaN missing direction
+        x = np.where(nan & (mt != MISSING_NAN), 0.0, x)
+        missing = ((mt == MISSING_ZERO) & (np.abs(x) <= ZERO_THRESHOLD)) | ((mt == MISSING_NAN) & nan)
+        go_left = np.where(missing, self._default_left[nd], x <= self._threshold[nd])
+        cat = self._is_cat[nd]
+        if cat.any():
+            width = self.cat_bitsets.shape[1]
+            v = np.where(nan | (x < 0) | (x >= width), -1, x).astype(np.int64)
+            in_set = (v >= 0) & self.cat_bitsets[self._cat_index[nd], np.clip(v, 0, width - 1)]
+            go_left = np.where(cat, in_set, go_left)
+        return go_left
+
+    def save(self, path: str) -> None:
+        tmp = f"{path}.tmp.{os.getpid()}.npz"
+        np.savez(tmp, **{f.name: np.asarray(getattr(self, f.name)) for f in fields(self)})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledForest":
+        with np.load(path) as z:
+            fields = {k: z[k] for k in z.files}
+        for k in ("max_depth", "n_features"):
+            fields[k] = int(fields[k])
+        fields["digest"] = str(fields["digest"])
+        return cls(**fields)
+
+def compile_booster(booster: lgb.Booster, num_iteration: Optional[int] = None, digest: Optional[str] = None) -> CompiledForest:
+    """
+    Flatten the first num_iteration trees (all if None/<=0) of a single-output booster.
+    digest identifies the source model (default: hash of its model string).
+    Linear trees and multi-output models are not supported.
+    """
+    dump = booster.dump_model(num_iteration=num_iteration if num_iteration and num_iteration > 0 else None)
+    if int(dump.get("num_tree_per_iteration", 1)) != 1:
+        raise ValueError("Only single-output boosters can be compiled")
+
+    cols: Dict[str, List[Any]] = {k: [] for k in (
+        "split_feature", "threshold", "default_left", "missing_type", "is_cat", "cat_index", "left", "right",
+    )}
+    leaf_value: List[float] = []
+    cat_sets: List[List[int]] = []
+    roots: List[int] = []
+    max_depth = 0
+
+    def visit(t: Dict[str, Any], depth: int) -> int:
+        nonlocal max_depth
+        if "leaf_coeff" in t:
+            raise ValueError("Linear trees are not supported")
+        if "leaf_value" in t or "split_index" not in t:
+            leaf_value.append(float(t.get("leaf_value", 0.0)))
+            return ~(len(leaf_value) - 1)
+        max_depth = max(max_depth, depth + 1)
+        i = len(cols["left"])
+        for v in cols.values():
+            v.append(0)
+        cols["split_feature"][i] = int(t["split_feature"])
+        cols["default_left"][i] = bool(t["default_left"])
+        cols["missing_type"][i] = _MISSING[t["missing_type"]]
+        if t["decision_type"] == "==":
+            cols["is_cat"][i] = True
+            cols["cat_index"][i] = len(cat_sets)
+            cat_sets.append([int(c) for c in str(t["threshold"]).split("||")])
+            cols["threshold"][i] = 0.0
+        elif t["decision_type"] == "<=":
+            cols["is_cat"][i] = False
+            cols["threshold"][i] = float(t["threshold"])
+        else:
+            raise ValueError(f"Unsupported decision_type: {t['decision_type']}")
+        cols["left"][i] = visit(t["left_child"], depth + 1)
+        cols["right"][i] = visit(t["right_child"], depth + 1)
+        return i
+
+    for tree in dump["tree_info"]:
+        roots.append(visit(tree["tree_structure"], 0))
+
+    width = max((max(s) for s in cat_sets), default=-1) + 1
+    bitsets = np.zeros((len(cat_sets), width), dtype=bool)
+    for r, s in enumerate(cat_sets):
+        bitsets[r, s] = True
+    return CompiledForest(
+        split_feature=np.asarray(cols["split_feature"], dtype=np.int32),
+        threshold=np.asarray(cols["threshold"], dtype=np.float64),
+        default_left=np.asarray(cols["default_left"], dtype=bool),
+        missing_type=np.asarray(cols["missing_type"], dtype=np.int8),
+        is_cat=np.asarray(cols["is_cat"], dtype=bool),
+        cat_index=np.asarray(cols["cat_index"], dtype=np.int32),
+        left=np.asarray(cols["left"], dtype=np.int32),
+        right=np.asarray(cols["right"], dtype=np.int32),
+        leaf_value=np.asarray(leaf_value, dtype=np.float64),
+        roots=np.asarray(roots, dtype=np.int32),
+        cat_bitsets=bitsets,
+        max_depth=max_depth,
+        n_features=int(dump["max_feature_idx"]) + 1,
+        digest=digest if digest is not None else model_digest(booster.model_to_string()),
+    )
@@ -0,0 +1,250 @@
+from __future__ import annotations
+import hashlib
+import json
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+from src.ranking.features.categorical import MISSING_CODE, hash_bucket
+
+# Columns one-hot encoded at training time (pd.get_dummies(..., dummy_na=True) -> "<col>_<value>", "<col>_nan")
+CAT_COLS = ["user_id", "session_id", "item_id", "age_bucket", "country", "genre", "maturity", "device"]
+USER_CAT_COLS = ["user_id", "age_bucket", "country"]
+ITEM_CAT_COLS = ["item_id", "genre", "maturity"]
+
+# Request-time columns; they win over any same-named key in the user/item rows
+CONTEXT_COLS = ["device", "hour", "day_of_week", "is_prime_time", "is_weekend"]
+DERIVED_COLS = ["item_age", "is_kids_content", "kids_mismatch"]
+
+USER_AGG_COLS = ["u_watch_mins_30d", "u_plays_30d", "u_clicks_30d", "u_play_rate_30d"]
+ITEM_AGG_COLS = ["i_watch_mins_30d", "i_plays_30d", "i_clicks_30d", "i_play_rate_30d"]
+# any trailing-window item aggregate ("i_plays_7d", ...): dynamic, so never part of the cached item block
+ITEM_AGG_RE = re.compile(r"^i_(watch_mins|plays|clicks|play_rate)_\d+d$")
+
+_OVERRIDDEN = set(CONTEXT_COLS) | set(DERIVED_COLS)
+
+def _is_item_agg(col: str) -> bool:
+    return col.startswith("i_") and ITEM_AGG_RE.match(col) is not None
+
+def _is_missing(v: Any) -> bool:
+    return v is None or (isinstance(v, float) and v != v)
+
+@dataclass(frozen=True)
+class _ItemBlock:
+    cols: np.ndarray  # int64 column indices
+    vals: np.ndarray  # float32 values
+    release_year: int
+    is_kids: bool
+
+class FeatureEncoder:
+    """
+    Compiled replacement for get_dummies + reindex on the online path.
+    - Built once from model_meta["features"]: every (column, value) maps straight to a column index
+    - transform() writes user, item and context values into a preallocated float32 matrix
+    - The static item-side block is computed once per item and cached, so per-request cost
+      scales with the number of candidates, not with the vocabulary size
+    Output is identical to pd.get_dummies(rows, columns=cat_cols, dummy_na=True).reindex(feature_cols, fill_value=0),
+    or, for models trained with native categoricals (categorical_spec), to encode_native() on the same rows.
+    """
+
+    def __init__(
+        self,
+        feature_cols: List[str],
+        cat_cols: List[str] = CAT_COLS,
+        item_cache_size: int = 200_000,
+        categorical_spec: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
+        self.feature_cols = list(feature_cols)
+        self.n_features = len(self.feature_cols)
+        self.cat_cols = list(cat_cols)
+        self.item_cache_size = int(item_cache_size)
+        self.native = categorical_spec is not None
+        # encoders with equal layouts write a request into the same matrix
+        h = hashlib.blake2b(digest_size=16)
+        h.update(json.dumps([self.feature_cols, self.cat_cols, categorical_spec], sort_keys=True, default=str).encode("utf-8"))
+        self.layout = h.hexdigest()
+
+        self.numeric_index: Dict[str, int] = {}
+        self.cat_index: Dict[str, Dict[str, int]] = {c: {} for c in self.cat_cols}
+        self.cat_nan_index: Dict[str, int] = {}
+
+        # longest prefix first so e.g. "item_id_" is not shadowed by a shorter categorical prefix
+        prefixes = sorted(((c + "_", c) for c in self.cat_cols), key=lambda p: -len(p[0]))
+        for j, name in enumerate(self.feature_cols):
+            for prefix, col in prefixes:
+                if name.startswith(prefix):
+                    value = name[len(prefix):]
+                    if value == "nan":
+                        self.cat_nan_index[col] = j
+                    else:
+                        self.cat_index[col][value] = j
+                    break
+            else:
+                self.numeric_index[name] = j
+
+        # native categoricals: column -> (feature index, value -> code or None, hash buckets)
+        self.native_index: Dict[str, tuple] = {}
+        for c, spec in (categorical_spec or {}).items():
+            j = self.numeric_index.pop(c, None)
+            if spec["type"] == "drop" or j is None:
+                continue
+            if spec["type"] == "vocab":
+                self.native_index[c] = (j, {v: i for i, v in enumerate(spec["values"])}, 0)
+            else:
+                self.native_index[c] = (j, None, int(spec["buckets"]))
+
+        # item aggregates the model uses (every trained window); written per request, not cached
+        self.item_agg_cols = [c for c in self.numeric_index if c in ITEM_AGG_COLS or ITEM_AGG_RE.match(c)]
+
+        self._item_cache: Dict[tuple, _ItemBlock] = {}
+        self._cache_lock = threading.Lock()
+
+    @classmethod
+    def from_meta(cls, meta: Dict[str, Any], cat_cols: List[str] = CAT_COLS) -> "FeatureEncoder":
+        spec = meta.get("categorical_spec") if meta.get("categorical_encoding") == "native" else None
+        return cls(meta["features"], cat_cols=cat_cols, categorical_spec=spec)
+
+    def _cat_value(self, col: str, value: Any) -> Optional[tuple[int, float]]:
+        """(column index, value) to write for a categorical, or None if it contributes nothing."""
+        if self.native:
+            entry = self.native_index.get(col)
+            if entry is None:
+                return None
+            j, mapping, buckets = entry
+            if _is_missing(value):
+                return j, MISSING_CODE
+            if mapping is not None:
+                return j, mapping.get(str(value), MISSING_CODE)
+            return j, hash_bucket(value, buckets)
+        j = self.cat_nan_index.get(col) if _is_missing(value) else self.cat_index[col].get(str(value))
+        return None if j is None else (j, 1.0)
+
+    def _sparse(self, part: Dict[str, Any], cat_side: List[str], skip=()) -> tuple[list[int], list[float]]:
+        cols, vals = [], []
+        for k, v in part.items():
+            if k in _OVERRIDDEN or k in skip:
+                continue
+            if k in self.cat_index:
+                jv = self._cat_value(k, v)
+                if jv is not None:
+                    cols.append(jv[0])
+                    vals.append(jv[1])
+            else:
+                j = self.numeric_index.get(k)
+                if j is not None:
+                    vals.append(np.nan if v is None else float(v))
+                    cols.append(j)
+        for c in cat_side:
+            jv = None if c in part else self._cat_value(c, None)
+            if jv is not None:
+                cols.append(jv[0])
+                vals.append(jv[1])
+        return cols, vals
+
+    def item_block(self, item_row: Dict[str, Any]) -> _ItemBlock:
+        try:
+            key = tuple((k, v) for k, v in item_row.items() if not _is_item_agg(k))
+            block = self._item_cache.get(key)
+        except TypeError:  # unhashable values: just don't cache
+            key, block = None, None
+        if block is not None:
+            return block
+
+        cols, vals = self._sparse(item_row, ITEM_CAT_COLS, skip=self.item_agg_cols)
+        block = _ItemBlock(
+            cols=np.asarray(cols, dtype=np.int64),
+            vals=np.asarray(vals, dtype=np.float32),
+            release_year=int(item_row.get("release_year", 2020)),
+            is_kids=item_row.get("genre") == "Kids",
+        )
+        if key is not None:
+            with self._cache_lock:
+                if len(self._item_cache) >= self.item_cache_size:
+                    self._item_cache.clear()
+                self._item_cache[key] = block
+        return block
+
+    def _set(self, X: np.ndarray, col: str, value) -> None:
+        j = self.numeric_index.get(col)
+        if j is not None:
+            X[:, j] = value
+
+    def transform(
+        self,
+        user_row: Dict[str, Any],
+        item_rows: List[Dict[str, Any]],
+        context: Dict[str, Any],
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Feature matrix (len(item_rows), n_features) for one user's candidates.
+        `out` may be a preallocated float32 view to fill in place (e.g. a slice of a batch matrix).
+        """
+        n = len(item_rows)
+        if out is None:
+            X = np.zeros((n, self.n_features), dtype=np.float32)
+        else:
+            X = out
+            X[:] = 0.0
+
+        # user side (same for every row)
+        cols, vals = self._sparse(user_row, USER_CAT_COLS)
+        if cols:
+            X[:, cols] = np.asarray(vals, dtype=np.float32)
+
+        # item side: cached static blocks scattered in one shot, then dynamic aggregates
+        blocks = [self.item_block(it) for it in item_rows]
+        if n:
+            lens = np.fromiter((b.cols.size for b in blocks), dtype=np.int64, count=n)
+            if lens.sum():
+                rows = np.repeat(np.arange(n), lens)
+                X[rows, np.concatenate([b.cols for b in blocks])] = np.concatenate([b.vals for b in blocks])
+        for c in self.item_agg_cols:
+            j = self.numeric_index[c]
+            for i, it in enumerate(item_rows):
+                if c in it:
+                    X[i, j] = it[c]
+
+        # request context
+        hour = int(context.get("hour", 20))
+        dow = int(context.get("day_of_week", 2))
+        if "device" in self.cat_index:
+            jv = self._cat_value("device", context.get("device", "tv"))
+            if jv is not None:
+                X[:, jv[0]] = jv[1]
+        self._set(X, "hour", hour)
+        self._set(X, "day_of_week", dow)
+        self._set(X, "is_prime_time", 1 if 19 <= hour <= 23 else 0)
+        self._set(X, "is_weekend", 1 if dow in [5, 6] else 0)
+        if "session_id" not in user_row and "session_id" in self.cat_index:
+            jv = self._cat_value("session_id", context.get("session_id", "s_online"))
+            if jv is not None:
+                X[:, jv[0]] = jv[1]
+
+        # derived cross features
+        if n:
+            release = np.fromiter((b.release_year for b in blocks), dtype=np.float32, count=n)
+            kids_content = np.fromiter((b.is_kids for b in blocks), dtype=bool, count=n)
+            self._set(X, "item_age", float(int(context.get("current_year", 2026))) - release)
+            self._set(X, "is_kids_content", kids_content.astype(np.float32))
+            kids_profile = int(user_row.get("is_kids_profile", 0)) == 1
+            self._set(X, "kids_mismatch", (kids_profile & ~kids_content).astype(np.float32))
+        return X
+
+_ENCODERS: Dict[str, FeatureEncoder] = {}
+_ENCODERS_LOCK = threading.Lock()
+
+def get_encoder(version: str, meta: Dict[str, Any]) -> FeatureEncoder:
+    """Encoder for a served model version, compiled on first use."""
+    enc = _ENCODERS.get(version)
+    if enc is None:
+        with _ENCODERS_LOCK:
+            enc = _ENCODERS.get(version)
+            if enc is None:
+                if len(_ENCODERS) >= 4:
+                    _ENCODERS.clear()
+                enc = FeatureEncoder.from_meta(meta)
+                _ENCODERS[version] = enc
+    return enc
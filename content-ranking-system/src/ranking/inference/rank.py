@@ -1,63 +1,142 @@
 from __future__ import annotations
 import os
-import pandas as pd
 import numpy as np
 
-from src.ranking.models.registry import load_model, RegistryPaths
+from src.ranking.features.online_store import OnlineFeatureStore
+from src.ranking.inference.encoder import get_encoder
+from src.ranking.models.registry import get_registry, LoadedModel, RegistryPaths
+from src.ranking.monitoring.metrics import BATCH_SIZE, CANDIDATES, stage
 
-def _one_hot_from_meta(df: pd.DataFrame, feature_cols: list[str], cat_cols: list[str]) -> pd.DataFrame:
-    x = pd.get_dummies(df, columns=cat_cols, dummy_na=True)
-    x = x.reindex(columns=feature_cols, fill_value=0)
-    return x
+SCORERS = ("booster", "compiled")
+
+_ONLINE_FEATURES, _ENCODE, _PREDICT, _SORT = (stage(s) for s in ("online_features", "encode", "predict", "sort"))
+
+def score_matrix(model: LoadedModel, X: np.ndarray, scorer: str = "booster") -> np.ndarray:
+    """
+    Raw ranking scores for an encoded feature matrix:
+    - "booster": LightGBM predict at the served best_iteration
+    - "compiled": the model's flattened forest evaluated with NumPy (same scores)
+    """
+    if scorer == "booster":
+        return model.booster.predict(X, num_iteration=model.meta.get("best_iteration", None))
+    if scorer == "compiled":
+        if model.compiled is None:
+            raise ValueError(f"Model {model.version} has no compiled forest")
+        return model.compiled.predict(X)
+    raise ValueError(f"Unknown scorer: {scorer} (expected one of {SCORERS})")
+
+def _ranked_records(user_row: dict, item_rows: list[dict], scores: np.ndarray) -> list[dict]:
+    # stable sort so ties keep request order (single and batch calls rank identically)
+    order = np.argsort(-scores, kind="stable")
+    user_id = user_row.get("user_id")
+    return [
+        {"user_id": user_id, "item_id": item_rows[i].get("item_id"), "score": float(scores[i])}
+        for i in order
+    ]
 
 def rank_candidates(
     user_row: dict,
     item_rows: list[dict],
     context: dict,
     models_dir: str = "artifacts/models",
+    model: LoadedModel | None = None,
+    online_store: OnlineFeatureStore | None = None,
+    scorer: str = "booster",
 ) -> list[dict]:
     """
     Online ranking:
-    - Build feature rows for each candidate item
-    - One-hot to match training columns (from model_meta)
-    - Score with LightGBM
+    - Fill the 30-day user/item aggregates from the online store (if given)
+    - Encode user/item/context values straight into the training feature layout (compiled from model_meta)
+    - Score with LightGBM (cached booster from the process-wide registry unless `model` is given),
+      or with its compiled forest when scorer="compiled"
+    - Sort candidates by score
+    """
+    if model is None:
+        model = get_registry().get(RegistryPaths(models_dir=models_dir))
+    meta = model.meta
+
+    CANDIDATES.observe(len(item_rows))
+    # Without a store, missing aggregates stay 0.0 placeholders
+    if online_store is not None:
+        with _ONLINE_FEATURES.time():
+            user_row, item_rows = online_store.enrich(user_row, item_rows)
+    with _ENCODE.time():
+        X = get_encoder(model.version, meta).transform(user_row, item_rows, context)
+
+    with _PREDICT.time():
+        scores = score_matrix(model, X, scorer)
+    with _SORT.time():
+        return _ranked_records(user_row, item_rows, scores)
+
+def _layout(model: LoadedModel) -> str:
+    # from the version's cached encoder: no per-batch hashing of long feature lists, no shared counters
+    return get_encoder(model.version, model.meta).layout
+
+def encode_requests(requests: list[dict], encoder) -> tuple[np.ndarray, np.ndarray]:
+    """One feature matrix for all candidates of (already enriched) requests, plus the row bounds of each request."""
+    bounds = np.cumsum([0] + [len(r["item_rows"]) for r in requests])
+    X = np.zeros((int(bounds[-1]), encoder.n_features), dtype=np.float32)
+    for r, s, e in zip(requests, bounds[:-1], bounds[1:]):
+        encoder.transform(r["user_row"], r["item_rows"], r["context"], out=X[s:e])
+    return X, bounds
+
+def rank_candidates_batch(
+    requests: list[dict],
+    models_dir: str = "artifacts/models",
+    model: LoadedModel | None = None,
+    online_store: OnlineFeatureStore | None = None,
+    scorer: str = "booster",
+    models: list[LoadedModel] | None = None,
+    shadow_model: LoadedModel | None = None,
+    shadow=None,
+) -> list[list[dict]]:
     """
-    model, meta = load_model(RegistryPaths(models_dir=models_dir))
-    feature_cols = meta["features"]
-
-    # Build dataframe for candidates
-    rows = []
-    for it in item_rows:
-        row = {}
-        row.update(user_row)
-        row.update(it)
-        row.update({
-            "device": context.get("device", "tv"),
-            "hour": int(context.get("hour", 20)),
-            "day_of_week": int(context.get("day_of_week", 2)),
-            "is_prime_time": int(1 if 19 <= int(context.get("hour", 20)) <= 23 else 0),
-            "is_weekend": int(1 if int(context.get("day_of_week", 2)) in [5, 6] else 0),
-        })
-        # derived
-        row["item_age"] = int(context.get("current_year", 2026)) - int(row.get("release_year", 2020))
-        row["is_kids_content"] = int(1 if row.get("genre") == "Kids" else 0)
-        row["kids_mismatch"] = int(1 if int(row.get("is_kids_profile", 0)) == 1 and row.get("genre") != "Kids" else 0)
-
-        # placeholders for offline aggregates if not available online
-        for c in ["u_watch_mins_30d", "u_plays_30d", "u_clicks_30d", "u_play_rate_30d",
-                  "i_watch_mins_30d", "i_plays_30d", "i_clicks_30d", "i_play_rate_30d"]:
-            row.setdefault(c, 0.0)
-        # group keys required by encoding schema if included
-        row.setdefault("session_id", context.get("session_id", "s_online"))
-        rows.append(row)
-
-    df = pd.DataFrame(rows)
-
-    cat_cols = ["user_id", "session_id", "item_id", "age_bucket", "country", "genre", "maturity", "device"]
-    X = _one_hot_from_meta(df, feature_cols=feature_cols, cat_cols=cat_cols)
-
-    scores = model.predict(X, num_iteration=meta.get("best_iteration", None))
-    df["score"] = scores
-
-    out = df[["user_id", "item_id", "score"]].sort_values("score", ascending=False)
-    return out.to_dict(orient="records")
+    Rank many slates with one model call.
+    - requests: [{"user_row": ..., "item_rows": [...], "context": {...}}, ...]
+    - One feature matrix for all candidates, one predict, scores split back per request
+    - models: a model per request (A/B arms); requests whose models share a feature layout share one
+      matrix, and each model predicts its own contiguous rows of it
+    - shadow_model + shadow (a ShadowScorer): the shadow model's scores are computed from the same matrix
+      after the primary ones, on the scorer's thread
+    Each result equals rank_candidates() on the same request with its model.
+    """
+    if models is None:
+        if model is None:
+            model = get_registry().get(RegistryPaths(models_dir=models_dir))
+        models = [model] * len(requests)
+    BATCH_SIZE.observe(len(requests))
+    for r in requests:
+        CANDIDATES.observe(len(r["item_rows"]))
+    if online_store is not None:
+        with _ONLINE_FEATURES.time():
+            enriched = []
+            for r in requests:
+                user_row, item_rows = online_store.enrich(r["user_row"], r["item_rows"])
+                enriched.append({**r, "user_row": user_row, "item_rows": item_rows})
+        requests = enriched
+
+    # layout -> model version -> request indices; encoded in that order so each model's rows are one slice
+    groups: dict[str, dict[str, list[int]]] = {}
+    for i, m in enumerate(models):
+        groups.setdefault(_layout(m), {}).setdefault(m.version, []).append(i)
+
+    scores: list[np.ndarray | None] = [None] * len(requests)
+    for layout, by_model in groups.items():
+        order = [i for idxs in by_model.values() for i in idxs]
+        first = models[order[0]]
+        with _ENCODE.time():
+            X, bounds = encode_requests([requests[i] for i in order], get_encoder(first.version, first.meta))
+        pos = 0
+        with _PREDICT.time():
+            for idxs in by_model.values():
+                s, e = int(bounds[pos]), int(bounds[pos + len(idxs)])
+                out = score_matrix(models[idxs[0]], X[s:e], scorer) if e > s else np.zeros(0)
+                for k, i in enumerate(idxs):
+                    scores[i] = out[bounds[pos + k] - s:bounds[pos + k + 1] - s]
+                pos += len(idxs)
+        if shadow is not None and shadow_model is not None:
+            shadow.submit(shadow_model, [requests[i] for i in order], [scores[i] for i in order],
+                          [models[i].version for i in order], X if _layout(shadow_model) == layout else None)
+
+    with _SORT.time():
+        return [_ranked_records(r["user_row"], r["item_rows"], sc) for r, sc in zip(requests, scores)]
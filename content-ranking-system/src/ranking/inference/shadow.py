@@ -0,0 +1,120 @@
+from __future__ import annotations
+import json
+import os
+import queue
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+from scipy.stats import rankdata
+
+from src.ranking.inference.encoder import get_encoder
+from src.ranking.inference.rank import encode_requests, score_matrix
+from src.ranking.models.registry import LoadedModel
+from src.ranking.monitoring.metrics import SHADOW_REQUESTS, stage
+
+def rank_correlation(a: np.ndarray, b: np.ndarray) -> Optional[float]:
+    """Spearman correlation of two score vectors (average ranks for ties); None if either is constant."""
+    if len(a) < 2:
+        return None
+    ra, rb = rankdata(a), rankdata(b)
+    if ra.std() == 0 or rb.std() == 0:
+        return None
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+def compare_scores(primary: np.ndarray, shadow: np.ndarray, top_k: int = 10) -> dict:
+    """Per-request agreement between the served and the shadow ranking."""
+    delta = np.abs(shadow - primary)
+    k = min(top_k, len(primary))
+    top_p = set(np.argsort(-primary, kind="stable")[:k].tolist())
+    top_s = set(np.argsort(-shadow, kind="stable")[:k].tolist())
+    return {
+        "n": int(len(primary)),
+        "spearman": rank_correlation(primary, shadow),
+        "mean_abs_delta": float(delta.mean()) if len(delta) else 0.0,
+        "max_abs_delta": float(delta.max()) if len(delta) else 0.0,
+        f"top{top_k}_overlap": len(top_p & top_s) / k if k else None,
+        "same_top1": bool(k and np.argmax(primary) == np.argmax(shadow)),
+    }
+
+class ShadowScorer:
+    """
+    Scores a shadow model on requests the served models already answered, on its own thread.
+    - submit() only enqueues: the response path never waits, and a full queue drops the job (counted)
+    - The primary feature matrix is reused when the shadow model has the same feature layout, else the
+      (already enriched) requests are encoded again for the shadow model
+    - One JSON line per request to `path`: user, served / shadow versions and compare_scores()
+    """
+
+    def __init__(self, path: str, scorer: str = "booster", max_queue: int = 64, top_k: int = 10):
+        self.path = path
+        self.scorer = scorer
+        self.top_k = int(top_k)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._thread: Optional[threading.Thread] = None
+        self.scored = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="shadow-scorer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    def submit(self, model: LoadedModel, requests: List[dict], primary_scores: List[np.ndarray],
+               primary_versions: List[str], X: Optional[np.ndarray] = None) -> None:
+        try:
+            self._queue.put_nowait((model, requests, primary_scores, primary_versions, X, time.time()))
+        except queue.Full:
+            self.dropped += 1
+            SHADOW_REQUESTS.labels("dropped").inc(len(requests))
+
+    def score(self, model: LoadedModel, requests: List[dict], primary_scores: List[np.ndarray],
+              primary_versions: List[str], X: Optional[np.ndarray] = None, ts: Optional[float] = None) -> List[dict]:
+        """The comparison records of one submitted job."""
+        with stage("shadow_predict").time():
+            if X is None:
+                X, bounds = encode_requests(requests, get_encoder(model.version, model.meta))
+            else:
+                bounds = np.cumsum([0] + [len(r["item_rows"]) for r in requests])
+            shadow_scores = score_matrix(model, X, self.scorer) if len(X) else np.zeros(0)
+        ts = time.time() if ts is None else ts
+        return [
+            {
+                "ts": ts,
+                "user_id": r["user_row"].get("user_id"),
+                "served_version": version,
+                "shadow_version": model.version,
+                **compare_scores(np.asarray(p, dtype=np.float64), shadow_scores[s:e], self.top_k),
+            }
+            for r, p, version, s, e in zip(requests, primary_scores, primary_versions, bounds[:-1], bounds[1:])
+        ]
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                records = self.score(*job)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(rec) + "\n" for rec in records)
+                self.scored += len(records)
+                SHADOW_REQUESTS.labels("scored").inc(len(records))
+            except Exception:  # a broken shadow model must not take the scorer thread down
+                self.errors += 1
+                SHADOW_REQUESTS.labels("error").inc(len(job[1]))
+
+    def stats(self) -> dict:
+        return {"path": self.path, "queue_depth": self._queue.qsize(), "scored": self.scored,
+                "dropped": self.dropped, "errors": self.errors}
@@ -0,0 +1,179 @@
+from __future__ import annotations
+import numbers
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import lightgbm as lgb
+
+from src.ranking.features.categorical import FrameEncoder
+
+GROUP_COLS = ["user_id", "session_id"]
+
+class SplitWriter:
+    """
+    Appends chunks of one split to a parquet file for streaming training: each chunk sorted by
+    (user_id, session_id) so its ranking groups are contiguous (time order kept inside a group).
+    Chunks are buffered into row groups of chunk_rows and cast to `schema` (default: the first chunk's).
+    """
+
+    def __init__(self, path: str, chunk_rows: int, schema: Optional[pa.Schema] = None):
+        self.path = path
+        self.chunk_rows = int(chunk_rows)
+        self.schema = schema
+        self.rows = 0
+        self._pending: List[pa.Table] = []
+        self._writer: Optional[pq.ParquetWriter] = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        df = df.sort_values(GROUP_COLS, kind="stable")
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        if self._writer is None:
+            self.schema = table.schema
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._pending.append(table)
+        self.rows += len(df)
+        if sum(t.num_rows for t in self._pending) >= self.chunk_rows:
+            self._flush()
+
+    def _flush(self) -> None:
+        table = pa.concat_tables(self._pending)
+        self._pending = []
+        self._writer.write_table(table, row_group_size=self.chunk_rows)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            if self._pending:
+                self._flush()
+            self._writer.close()
+
+def write_split_parquet(df: pd.DataFrame, path: str, chunk_rows: int) -> None:
+    """Persist a whole split for streaming training (one SplitWriter chunk)."""
+    writer = SplitWriter(path, chunk_rows)
+    writer.write(df)
+    writer.close()
+
+def iter_row_groups(path: str, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    pf = pq.ParquetFile(path)
+    for g in range(pf.num_row_groups):
+        yield pf.read_row_group(g, columns=columns).to_pandas()
+
+def group_sizes_streaming(path: str) -> np.ndarray:
+    """Run lengths of consecutive (user_id, session_id) keys, carried across row-group boundaries."""
+    sizes: List[int] = []
+    last = None
+    for df in iter_row_groups(path, columns=GROUP_COLS):
+        if df.empty:
+            continue
+        keys = df["user_id"].astype(str) + "\x1f" + df["session_id"].astype(str)
+        k = keys.to_numpy()
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        runs = np.diff(np.r_[starts, len(k)])
+        if last is not None and k[0] == last:
+            sizes[-1] += int(runs[0])
+            runs = runs[1:]
+        sizes.extend(int(r) for r in runs)
+        last = k[-1]
+    return np.asarray(sizes, dtype=np.int64)
+
+class ParquetChunkSequence(lgb.Sequence):
+    """
+    lgb.Sequence over one processed split: each row group is read and encoded on demand
+    (one decoded chunk cached), so the raw frame never has to be fully in memory.
+    Batch size follows the row-group size, so LightGBM's range reads decode each chunk once.
+    """
+
+    def __init__(self, path: str, encoder: FrameEncoder):
+        self.path = path
+        self.encoder = encoder
+        self._pf = pq.ParquetFile(path)
+        sizes = [self._pf.metadata.row_group(g).num_rows for g in range(self._pf.num_row_groups)]
+        self._offsets = np.r_[0, np.cumsum(sizes)].astype(np.int64)
+        self.batch_size = int(max(sizes)) if sizes else 4096
+        self._cached: Tuple[int, Optional[np.ndarray]] = (-1, None)
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    def _chunk(self, g: int) -> np.ndarray:
+        if self._cached[0] != g:
+            df = self._pf.read_row_group(g, columns=self.encoder.columns).to_pandas()
+            self._cached = (g, self.encoder.transform(df))
+        return self._cached[1]
+
+    def _locate(self, i: int) -> Tuple[int, int]:
+        g = int(np.searchsorted(self._offsets, i, side="right") - 1)
+        return g, i - int(self._offsets[g])
+
+    def __getitem__(self, idx):
+        if isinstance(idx, numbers.Integral):
+            i = int(idx) + (len(self) if idx < 0 else 0)
+            g, r = self._locate(i)
+            return self._chunk(g)[r].astype(np.float64)  # LightGBM's bin sampling wants double rows
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step != 1:
+                return np.stack([self[i] for i in range(start, stop, step)])
+            parts = []
+            i = start
+            while i < stop:
+                g, r = self._locate(i)
+                take = min(stop, int(self._offsets[g + 1])) - i
+                parts.append(self._chunk(g)[r:r + take])
+                i += take
+            if not parts:
+                return np.zeros((0, len(self.encoder.features)), dtype=np.float32)
+            return np.ascontiguousarray(np.concatenate(parts) if len(parts) > 1 else parts[0])
+        if isinstance(idx, list):
+            return np.stack([self[i] for i in idx])
+        raise TypeError(f"Sequence index must be integer, slice or list, got {type(idx).__name__}")
+
+    def iter_chunks(self) -> Iterator[np.ndarray]:
+        for g in range(self._pf.num_row_groups):
+            yield self._chunk(g)
+
+def read_labels(path: str, target: str = "label") -> np.ndarray:
+    return np.concatenate([df[target].to_numpy(dtype=np.int32) for df in iter_row_groups(path, columns=[target])])
+
+def predict_streaming(booster: lgb.Booster, seq: ParquetChunkSequence, num_iteration: Optional[int] = None) -> np.ndarray:
+    return np.concatenate([booster.predict(X, num_iteration=num_iteration) for X in seq.iter_chunks()])
+
+def build_streaming_datasets(
+    train_path: str,
+    val_path: str,
+    feature_cols: List[str],
+    cat_cols: List[str],
+    feat_cfg: dict,
+    params: Optional[dict] = None,
+) -> Tuple[lgb.Dataset, lgb.Dataset, FrameEncoder]:
+    """
+    Out-of-core LightGBM Datasets from processed splits written by SplitWriter.
+    - Pass 1 (categorical + column names only) fixes the encoded layout
+    - Each row group is then read, encoded and pushed into the Dataset; only labels and
+      group sizes (a few bytes per row) are held for the whole split
+    - params are Dataset params, e.g. bin_construct_sample_cnt: the rows LightGBM samples
+      (as dense doubles) to find the bins
+    """
+    fit_cols = [c for c in cat_cols if c in feature_cols]
+    encoder = FrameEncoder.fit_chunks(iter_row_groups(train_path, columns=fit_cols), cat_cols, feat_cfg, columns=feature_cols)
+
+    categorical_feature = encoder.meta().get("categorical_features", "auto")
+    train_set = lgb.Dataset(
+        [ParquetChunkSequence(train_path, encoder)],
+        label=read_labels(train_path),
+        group=group_sizes_streaming(train_path),
+        feature_name=encoder.features,
+        categorical_feature=categorical_feature,
+        params=params,
+    )
+    val_set = lgb.Dataset(
+        [ParquetChunkSequence(val_path, encoder)],
+        label=read_labels(val_path),
+        group=group_sizes_streaming(val_path),
+        reference=train_set,
+        feature_name=encoder.features,
+        categorical_feature=categorical_feature,
+        params=params,
+    )
+    return train_set, val_set, encoder
@@ -1,4 +1,5 @@
 from __future__ import annotations
+from typing import Sequence
 import numpy as np
 import pandas as pd
 
@@ -32,22 +33,62 @@ def map_at_k(rels: np.ndarray, k: int, positive_threshold: int = 1) -> float:
     binary = (rels >= positive_threshold).astype(int)
     return average_precision_at_k(binary, k)
 
-def evaluate_ranking(df: pd.DataFrame, score_col: str, k: int = 10) -> dict:
+def group_ranking_metrics(
+    df: pd.DataFrame,
+    score_col: str,
+    ks: Sequence[int],
+    group_cols: Sequence[str] = ("user_id", "session_id"),
+    positive_threshold: int = 1,
+) -> dict:
+    """
+    NDCG@k, MAP@k and Recall@k for every k in one pass, averaged over (user_id, session_id) groups.
+    - One lexsort by (group, -score); ties keep input row order
+    - Gains, discounts and ideal DCGs via rank-within-group arrays and bincount segment sums
+    - Per group identical to ndcg_at_k / map_at_k on the score-sorted labels; Recall@k is
+      hits in the top k over all positives of the group (0 for groups without positives)
+    """
+    gid = df.groupby(list(group_cols), sort=False).ngroup().to_numpy()
+    keep = gid >= 0  # groupby drops NaN keys
+    gid = gid[keep]
+    rel = df["label"].to_numpy(dtype=np.int64)[keep]
+    score = df[score_col].to_numpy(dtype=np.float64)[keep]
+    n_groups = int(gid.max()) + 1 if len(gid) else 0
+    if n_groups == 0:
+        return {**{f"{m}@{k}": 0.0 for k in ks for m in ("NDCG", "MAP", "Recall")}, "num_groups": 0}
+
+    order = np.lexsort((-score, gid))
+    g = gid[order]
+    r = rel[order]
+    starts = np.r_[0, np.cumsum(np.bincount(gid, minlength=n_groups))[:-1]]
+    rank = np.arange(len(g)) - starts[g]  # 0-based position inside the group
+    discount = 1.0 / np.log2(rank + 2.0)
+    gains = (2.0 ** r - 1.0) * discount
+    ideal_rel = rel[np.lexsort((-rel, gid))]
+    ideal_gains = (2.0 ** ideal_rel - 1.0) * discount  # same group layout, so the same ranks apply
+
+    hit = (r >= positive_threshold).astype(np.float64)
+    cum_hits = np.cumsum(hit)
+    cum_hits -= np.r_[0.0, cum_hits][starts][g]  # running hits restarted at each group
+    precision_at_hit = hit * cum_hits / (rank + 1.0)
+    n_pos = np.bincount(g, weights=hit, minlength=n_groups)
+
+    out = {}
+    for k in ks:
+        top = rank < int(k)
+        dcg = np.bincount(g, weights=gains * top, minlength=n_groups)
+        idcg = np.bincount(g, weights=ideal_gains * top, minlength=n_groups)
+        hits = np.bincount(g, weights=hit * top, minlength=n_groups)
+        ap = np.bincount(g, weights=precision_at_hit * top, minlength=n_groups)
+        out[f"NDCG@{k}"] = float(np.mean(np.divide(dcg, idcg, out=np.zeros(n_groups), where=idcg > 0)))
+        out[f"MAP@{k}"] = float(np.mean(np.divide(ap, hits, out=np.zeros(n_groups), where=hits > 0)))
+        out[f"Recall@{k}"] = float(np.mean(np.divide(hits, n_pos, out=np.zeros(n_groups), where=n_pos > 0)))
+    out["num_groups"] = n_groups
+    return out
+
+def evaluate_ranking(df: pd.DataFrame, score_col: str, k: int | Sequence[int] = 10) -> dict:
     """
     df must include: user_id, session_id, label, score_col
+    k may be a single cutoff or a list of cutoffs (all computed in one pass).
     """
-    group_cols = ["user_id", "session_id"]
-    ndcgs = []
-    maps = []
-
-    for _, g in df.groupby(group_cols):
-        g = g.sort_values(score_col, ascending=False)
-        rels = g["label"].to_numpy(dtype=int)
-        ndcgs.append(ndcg_at_k(rels, k))
-        maps.append(map_at_k(rels, k, positive_threshold=1))
-
-    return {
-        f"NDCG@{k}": float(np.mean(ndcgs)) if ndcgs else 0.0,
-        f"MAP@{k}": float(np.mean(maps)) if maps else 0.0,
-        "num_groups": int(df.groupby(group_cols).ngroups),
-    }
+    ks = [int(k)] if np.isscalar(k) else [int(x) for x in k]
+    return group_ranking_metrics(df, score_col, ks)
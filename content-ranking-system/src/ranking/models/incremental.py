@@ -0,0 +1,130 @@
+"""
+Warm-start retraining: continue boosting the served LambdaRank model on the interactions that
+arrived after its data_end, and register the result as a new version with lineage to its parent.
+
+    python -m src.ranking.models.incremental --config configs/ranker.yaml
+"""
+import argparse
+import os
+import json
+from datetime import datetime
+import pandas as pd
+import lightgbm as lgb
+
+from src.ranking.data.interaction_store import read_interactions
+from src.ranking.data.splits import time_split
+from src.ranking.features.categorical import encode_native
+from src.ranking.models.evaluate import evaluate_ranking
+from src.ranking.models.registry import RegistryPaths, load_model, load_reference_dataset, register_version
+from src.ranking.models.train_ltr import (
+    CAT_COLS, _build_params, _load_yaml, _one_hot_encode, build_ranking_frame, history_days,
+)
+
+DROP_COLS = ["label", "timestamp", "watch_minutes"]
+
+def encode_like(df: pd.DataFrame, meta: dict) -> pd.DataFrame:
+    """Encode new rows into the exact feature layout of an existing model (from its meta)."""
+    x = df.drop(columns=[c for c in DROP_COLS if c in df.columns])
+    if meta.get("categorical_encoding") == "native":
+        x = encode_native(x, meta["categorical_spec"])
+    else:
+        x = _one_hot_encode(x, [c for c in CAT_COLS if c in x.columns])
+    return x.reindex(columns=meta["features"], fill_value=0)
+
+def main(config_path: str) -> None:
+    cfg = _load_yaml(config_path)
+    seed = int(cfg["project"]["seed"])
+    inc_cfg = cfg.get("incremental", {})
+    raw_dir = cfg["paths"]["raw_dir"]
+    reports_dir = cfg["paths"]["artifacts_reports"]
+    paths = RegistryPaths(models_dir=cfg["paths"]["artifacts_models"])
+
+    parent, parent_meta = load_model(paths)
+    parent_id = parent_meta.get("version_id")
+    if parent_id is None or parent_meta.get("data_end") in (None, "NaT"):
+        raise ValueError(f"Model in {paths.models_dir} has no version_id/data_end; retrain it with train_ltr first")
+    reference = load_reference_dataset(paths, parent_id)
+
+    # New events after the parent's data_end, plus the aggregate window before them
+    data_end = pd.Timestamp(parent_meta["data_end"])
+    until = inc_cfg.get("until")
+    interactions = read_interactions(raw_dir, start=data_end - pd.Timedelta(days=history_days(cfg)), end=until)
+    events = interactions[interactions["timestamp"] > data_end]
+    if events.empty:
+        print(f"✅ No interactions after {data_end}; {parent_id} stays current")
+        return
+
+    users = pd.read_csv(os.path.join(raw_dir, "users.csv"))
+    items = pd.read_csv(os.path.join(raw_dir, "items.csv"))
+    ds = build_ranking_frame(events, interactions, users, items, cfg, seed)
+
+    # Early stopping on the newest slice of the new window
+    val_frac = float(inc_cfg.get("val_frac", 0.2))
+    sp = time_split(ds, 1.0 - val_frac, val_frac, 0.0)
+    train_df, val_df = sp.take("train"), sp.take("val")
+    if train_df.empty or val_df.empty:
+        raise ValueError(f"Too few new rows ({len(ds)}) for an incremental train/validation split")
+    X = encode_like(sp.frame, parent_meta)
+    X_train, X_val = X.iloc[sp.rows("train")], X.iloc[sp.rows("val")]
+    y_train = train_df["label"].astype(int).to_numpy()
+    y_val = val_df["label"].astype(int).to_numpy()
+
+    # Bins come from the parent's reference Dataset, not from the new window
+    categorical_feature = parent_meta.get("categorical_features", "auto")
+    train_set = lgb.Dataset(X_train, label=y_train, group=sp.group_sizes("train"), reference=reference,
+                            categorical_feature=categorical_feature, free_raw_data=False)
+    val_set = lgb.Dataset(X_val, label=y_val, group=sp.group_sizes("val"), reference=reference,
+                          categorical_feature=categorical_feature, free_raw_data=False)
+
+    booster = lgb.train(
+        params=_build_params(cfg["model"]),
+        train_set=train_set,
+        num_boost_round=int(inc_cfg.get("num_boost_round", 100)),
+        valid_sets=[val_set],
+        valid_names=["val"],
+        init_model=parent,
+        callbacks=[lgb.early_stopping(int(inc_cfg.get("early_stopping_rounds", cfg["training"]["early_stopping_rounds"])), verbose=False)],
+    )
+
+    val_eval_df = val_df[["user_id", "session_id", "item_id", "label"]].copy()
+    val_eval_df["score"] = booster.predict(X_val, num_iteration=booster.best_iteration)
+    k = int(cfg["features"]["eval_k"])
+    ks = sorted({k, *[int(x) for x in cfg["features"].get("eval_ks", [])]})
+    val_eval_parent = val_eval_df.assign(score=parent.predict(X_val, num_iteration=parent_meta.get("best_iteration")))
+    metrics = {
+        "val": evaluate_ranking(val_eval_df, score_col="score", k=ks),
+        "val_parent": evaluate_ranking(val_eval_parent, score_col="score", k=ks),
+        "k": k,
+        "best_iteration": int(booster.best_iteration),
+        "parent_iterations": int(parent.current_iteration()),
+    }
+    with open(os.path.join(reports_dir, "metrics_incremental.json"), "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
+    print("📈 Metrics:", json.dumps(metrics, indent=2))
+
+    meta = {
+        **{k_: v for k_, v in parent_meta.items() if k_ not in ("version_id", "metrics")},
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "best_iteration": int(booster.best_iteration),
+        "train_rows": int(len(train_df)),
+        "val_rows": int(len(val_df)),
+        "test_rows": 0,
+        "metrics": metrics,
+        "training_mode": "incremental",
+        "data_start": str(events["timestamp"].min()),
+        "data_end": str(events["timestamp"].max()),
+        "parent_version": parent_id,
+        "lineage": [*parent_meta.get("lineage", []), parent_id],
+    }
+    version_id = register_version(
+        booster, meta, paths,
+        reference_path=paths.version(parent_id).reference_path,
+        promote=bool(inc_cfg.get("promote", True)),
+    )
+    print(f"✅ Registered {version_id} (parent {parent_id}, +{booster.current_iteration() - parent.current_iteration()} trees)")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", required=True)
+    args = ap.parse_args()
+    main(args.config)
@@ -1,31 +1,186 @@
 import os
 import json
+import hashlib
+import shutil
+import tempfile
+import threading
+import time
 from dataclasses import dataclass
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 import lightgbm as lgb
 
+from src.ranking.inference.compiled_forest import CompiledForest, compile_booster, model_digest
+from src.ranking.monitoring.metrics import stage
+
+MODEL_FILE = "ltr_model.txt"
+META_FILE = "model_meta.json"
+REFERENCE_FILE = "reference_dataset.bin"
+COMPILED_FILE = "ltr_model_compiled.npz"
+VERSIONS_DIR = "versions"
+RELEASES_DIR = "releases"
+ROUTING_FILE = "routing.json"
+# one-line pointer to the directory (relative to models_dir) holding the served artifacts
+CURRENT_FILE = "CURRENT"
+KEEP_RELEASES = 2
+# attempts of a first (synchronous) load racing a save before the error reaches the request
+FIRST_LOAD_ATTEMPTS = 5
+
 @dataclass
 class RegistryPaths:
     models_dir: str
 
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.models_dir, MODEL_FILE)
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.models_dir, META_FILE)
+
+    @property
+    def reference_path(self) -> str:
+        return os.path.join(self.models_dir, REFERENCE_FILE)
+
+    @property
+    def compiled_path(self) -> str:
+        return os.path.join(self.models_dir, COMPILED_FILE)
+
+    @property
+    def routing_path(self) -> str:
+        return os.path.join(self.models_dir, ROUTING_FILE)
+
+    @property
+    def current_path(self) -> str:
+        return os.path.join(self.models_dir, CURRENT_FILE)
+
+    def version(self, version_id: str) -> "RegistryPaths":
+        return RegistryPaths(models_dir=os.path.join(self.models_dir, VERSIONS_DIR, version_id))
+
+    def current(self) -> Optional[str]:
+        """The CURRENT pointer (a directory relative to models_dir), None for a flat layout."""
+        try:
+            with open(self.current_path, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def resolve(self) -> "RegistryPaths":
+        """
+        Paths of the artifacts being served: the directory CURRENT points to, or models_dir itself
+        (version directories, models saved before the pointer existed). Read all files of one load
+        through one resolve() so they come from the same save.
+        """
+        return self.at(self.current())
+
+    def at(self, target: Optional[str]) -> "RegistryPaths":
+        """Paths of models_dir/target (models_dir itself for None)."""
+        return self if target is None else RegistryPaths(models_dir=os.path.join(self.models_dir, target))
+
 def ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
-def save_model(model: lgb.Booster, meta: Dict[str, Any], paths: RegistryPaths) -> None:
+def _atomic_write_text(path: str, text: str) -> None:
+    # write-then-rename so readers never see a half-written artifact
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def export_compiled(model: lgb.Booster, meta: Dict[str, Any], paths: RegistryPaths, model_str: Optional[str] = None) -> CompiledForest:
+    """
+    Flatten the served iterations (meta best_iteration) into contiguous arrays next to the model.
+    The digest of the model text ties the export to the model file it was built from.
+    """
+    model_str = model_str if model_str is not None else model.model_to_string()
+    compiled = compile_booster(model, num_iteration=meta.get("best_iteration"), digest=model_digest(model_str))
+    compiled.save(paths.compiled_path)
+    return compiled
+
+def _write_artifacts(model: lgb.Booster, meta: Dict[str, Any], paths: RegistryPaths, text: str) -> None:
+    # a fresh directory nobody reads until a pointer names it
     ensure_dir(paths.models_dir)
-    model_path = os.path.join(paths.models_dir, "ltr_model.txt")
-    meta_path = os.path.join(paths.models_dir, "model_meta.json")
+    export_compiled(model, meta, paths, model_str=text)
+    _atomic_write_text(paths.model_path, text)
+    _atomic_write_text(paths.meta_path, json.dumps(meta, indent=2))
+
+def _prune_releases(paths: RegistryPaths, keep: int = KEEP_RELEASES) -> None:
+    # the previous release stays for loads that resolved CURRENT just before the swap
+    root = os.path.join(paths.models_dir, RELEASES_DIR)
+    current = os.path.normpath(paths.current() or "")
+    releases = sorted(d for d in os.listdir(root) if os.path.normpath(os.path.join(RELEASES_DIR, d)) != current)
+    for d in releases[:max(0, len(releases) - (keep - 1))]:
+        shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+
+def set_current(paths: RegistryPaths, target: str) -> None:
+    """Serve the artifacts in models_dir/target: one atomic rename of the CURRENT pointer."""
+    if not os.path.exists(os.path.join(paths.models_dir, target, MODEL_FILE)):
+        raise FileNotFoundError(f"No model to promote in {os.path.join(paths.models_dir, target)}")
+    _atomic_write_text(paths.current_path, target + "\n")
+
+def save_model(model: lgb.Booster, meta: Dict[str, Any], paths: RegistryPaths) -> None:
+    """
+    Write model, meta and compiled forest into a new releases/<id>/ directory, then point CURRENT at it.
+    Readers resolve CURRENT once per load, so they see either the old or the new set, never a mix.
+    """
+    text = model.model_to_string()
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:8]
+    root = os.path.join(paths.models_dir, RELEASES_DIR)
+    ensure_dir(root)
+    now = time.time()
+    # names sort by save time; mkdtemp keeps two saves in the same microsecond apart
+    prefix = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}.{int(now * 1e6) % 10**6:06d}-{digest}-"
+    release = os.path.join(RELEASES_DIR, os.path.basename(tempfile.mkdtemp(prefix=prefix, dir=root)))
+    rpaths = RegistryPaths(models_dir=os.path.join(paths.models_dir, release))
+    _write_artifacts(model, meta, rpaths, text)
+    set_current(paths, release)
+    _prune_releases(paths)
+
+    print(f"✅ Saved model: {rpaths.model_path}")
+    print(f"✅ Saved meta:  {rpaths.meta_path}")
+    print(f"✅ Saved compiled forest: {rpaths.compiled_path}")
+    print(f"✅ Serving: {paths.current_path} -> {release}")
 
-    model.save_model(model_path)
-    with open(meta_path, "w", encoding="utf-8") as f:
-        json.dump(meta, f, indent=2)
+def register_version(
+    model: lgb.Booster,
+    meta: Dict[str, Any],
+    paths: RegistryPaths,
+    reference: Optional[lgb.Dataset] = None,
+    reference_path: Optional[str] = None,
+    promote: bool = True,
+) -> str:
+    """
+    Store the model as versions/<version_id>/ (model, meta with version_id, reference Dataset binary)
+    and, if promote, make it the served model by pointing models_dir/CURRENT at that directory.
+    reference: constructed Dataset whose bin mappers later incremental runs reuse;
+    reference_path: an existing binary to carry over instead (e.g. the parent's).
+    """
+    text = model.model_to_string()
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:8]
+    version_id = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{digest}"
+    meta = {**meta, "version_id": version_id}
+    vpaths = paths.version(version_id)
+    ensure_dir(vpaths.models_dir)
+    if reference is not None:
+        reference.save_binary(vpaths.reference_path)
+    elif reference_path is not None:
+        shutil.copyfile(reference_path, vpaths.reference_path)
+    _write_artifacts(model, meta, vpaths, text)
+    print(f"✅ Registered version: {vpaths.models_dir}")
+    if promote:
+        set_current(paths, os.path.join(VERSIONS_DIR, version_id))
+        print(f"✅ Serving: {paths.current_path} -> {version_id}")
+    return version_id
 
-    print(f"✅ Saved model: {model_path}")
-    print(f"✅ Saved meta:  {meta_path}")
+def load_reference_dataset(paths: RegistryPaths, version_id: str) -> lgb.Dataset:
+    path = paths.version(version_id).reference_path
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Missing reference Dataset for version {version_id} at {path}")
+    return lgb.Dataset(path)
 
 def load_model(paths: RegistryPaths) -> tuple[lgb.Booster, Dict[str, Any]]:
-    model_path = os.path.join(paths.models_dir, "ltr_model.txt")
-    meta_path = os.path.join(paths.models_dir, "model_meta.json")
+    paths = paths.resolve()
+    model_path = paths.model_path
+    meta_path = paths.meta_path
 
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"Missing model at {model_path}")
@@ -36,3 +191,276 @@ def load_model(paths: RegistryPaths) -> tuple[lgb.Booster, Dict[str, Any]]:
     with open(meta_path, "r", encoding="utf-8") as f:
         meta = json.load(f)
     return model, meta
+
+def artifact_signature(paths: RegistryPaths) -> Optional[tuple]:
+    """Cheap change detector: CURRENT plus (mtime_ns, size) of the model and meta files, None if either is missing."""
+    return _signature(paths.current(), paths)
+
+def _signature(target: Optional[str], paths: RegistryPaths) -> Optional[tuple]:
+    resolved = paths.at(target)
+    try:
+        sm = os.stat(resolved.model_path)
+        st = os.stat(resolved.meta_path)
+    except FileNotFoundError:
+        return None
+    return (target, sm.st_mtime_ns, sm.st_size, st.st_mtime_ns, st.st_size)
+
+def artifact_version(paths: RegistryPaths) -> str:
+    """Content hash of the model + meta files; identifies the version being served."""
+    paths = paths.resolve()
+    h = hashlib.sha256()
+    for p in (paths.model_path, paths.meta_path):
+        with open(p, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()[:12]
+
+class ArtifactsChanged(RuntimeError):
+    pass
+
+@dataclass(frozen=True)
+class LoadedModel:
+    booster: lgb.Booster
+    meta: Dict[str, Any]
+    version: str
+    signature: tuple
+    loaded_at: float
+    compiled: Optional[CompiledForest] = None
+
+def load_compiled(model: lgb.Booster, meta: Dict[str, Any], paths: RegistryPaths) -> CompiledForest:
+    """The exported forest if it was built from the model file on disk, else compiled from the booster."""
+    paths = paths.resolve()
+    with open(paths.model_path, "r", encoding="utf-8") as f:
+        digest = model_digest(f.read())
+    if os.path.exists(paths.compiled_path):
+        compiled = CompiledForest.load(paths.compiled_path)
+        if compiled.digest == digest:
+            return compiled
+    return compile_booster(model, num_iteration=meta.get("best_iteration"), digest=digest)
+
+def _load_first(paths: RegistryPaths, attempts: int = FIRST_LOAD_ATTEMPTS) -> LoadedModel:
+    """
+    _load_versioned for a request with nothing to fall back on: a load that raced a save (changed
+    signature, or a pruned release directory) is retried a few times.
+    """
+    for attempt in range(attempts - 1):
+        try:
+            return _load_versioned(paths)
+        except (ArtifactsChanged, FileNotFoundError, lgb.basic.LightGBMError):
+            if artifact_signature(paths) is None:
+                raise  # no model at all, not a race
+            time.sleep(0.01 * (attempt + 1))
+    return _load_versioned(paths)
+
+def _load_versioned(paths: RegistryPaths) -> LoadedModel:
+    target = paths.current()
+    resolved = paths.at(target)  # every file below comes from this one directory
+    sig = _signature(target, paths)
+    with stage("model_load").time():
+        model, meta = load_model(resolved)
+        compiled = load_compiled(model, meta, resolved)
+    version = artifact_version(resolved)
+    # a pointer swap during the load is fine (this directory is still one consistent save and the
+    # next check sees the new pointer); files rewritten in place (a flat layout) are not
+    if _signature(target, paths) != sig:
+        raise ArtifactsChanged(f"Model artifacts in {resolved.models_dir} changed during load")
+    return LoadedModel(booster=model, meta=meta, version=version, signature=sig, loaded_at=time.time(), compiled=compiled)
+
+@dataclass(frozen=True)
+class Routing:
+    """
+    Traffic split over registered versions, read from models_dir/routing.json:
+      {"arms": [{"name": "control", "weight": 90},
+                {"name": "candidate", "version": "<version_id>", "weight": 10}],
+       "shadow": "<version_id>", "salt": "exp-1"}
+    - An arm without "version" serves the promoted model in models_dir
+    - Users are assigned by a hash of salt + user_id, so a user stays in one arm until the weights or salt change
+    - shadow: a version scored on every request off the response path, never returned
+    """
+    arms: Tuple[Tuple[str, Optional[str], float], ...]
+    shadow: Optional[str] = None
+    salt: str = ""
+    signature: Optional[tuple] = None
+
+    def arm(self, user_id: Any) -> Tuple[str, Optional[str]]:
+        """(arm name, version_id) for a user."""
+        h = hashlib.blake2b(f"{self.salt}:{user_id}".encode("utf-8"), digest_size=8).digest()
+        point = int.from_bytes(h, "big") / 2**64 * sum(w for _, _, w in self.arms)
+        for name, version_id, weight in self.arms:
+            if point < weight:
+                return name, version_id
+            point -= weight
+        name, version_id, _ = self.arms[-1]
+        return name, version_id
+
+    def versions(self) -> List[Optional[str]]:
+        return [v for _, v, _ in self.arms] + ([self.shadow] if self.shadow else [])
+
+def load_routing(paths: RegistryPaths) -> Optional[Routing]:
+    """routing.json parsed and checked against versions/, or None if there is no routing file."""
+    try:
+        sig = os.stat(paths.routing_path)
+    except FileNotFoundError:
+        return None
+    with open(paths.routing_path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    arms = tuple(
+        (str(a.get("name", a.get("version") or "default")), a.get("version"), float(a.get("weight", 1.0)))
+        for a in cfg.get("arms", [])
+    )
+    if not arms:
+        raise ValueError(f"{paths.routing_path}: routing needs at least one arm")
+    if any(w < 0 for _, _, w in arms) or sum(w for _, _, w in arms) <= 0:
+        raise ValueError(f"{paths.routing_path}: arm weights must be >= 0 with a positive sum")
+    routing = Routing(arms=arms, shadow=cfg.get("shadow"), salt=str(cfg.get("salt", "")),
+                      signature=(sig.st_mtime_ns, sig.st_size))
+    for version_id in routing.versions():
+        if version_id is not None and not os.path.exists(paths.version(version_id).model_path):
+            raise FileNotFoundError(f"{paths.routing_path}: unknown model version {version_id}")
+    return routing
+
+class _Slot:
+    def __init__(self, current: LoadedModel):
+        self.current = current
+        self.last_check = time.monotonic()
+        self.loading = False
+        self.last_error: Optional[str] = None
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded rankers, one per models_dir.
+    - First request loads synchronously; later requests get the cached booster + meta
+    - Every check_interval_s the artifact mtime/size is compared; a change triggers a
+      background load and an atomic swap of the served LoadedModel
+    - Callers hold on to the LoadedModel they got, so in-flight requests finish on the old model
+    """
+
+    def __init__(self, check_interval_s: float = 2.0):
+        self.check_interval_s = float(check_interval_s)
+        self._slots: Dict[str, _Slot] = {}
+        self._lock = threading.Lock()
+        # models_dir -> [routing, last check, last error]
+        self._routing: Dict[str, list] = {}
+
+    def get(self, paths: RegistryPaths) -> LoadedModel:
+        key = os.path.abspath(paths.models_dir)
+        slot = self._slots.get(key)
+        if slot is None:
+            with self._lock:
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = _Slot(_load_first(paths))
+                    self._slots[key] = slot
+            return slot.current
+
+        now = time.monotonic()
+        if not slot.loading and now - slot.last_check >= self.check_interval_s:
+            self._maybe_refresh(paths, slot, now)
+        return slot.current
+
+    def _maybe_refresh(self, paths: RegistryPaths, slot: _Slot, now: float) -> None:
+        with self._lock:
+            if slot.loading:
+                return
+            slot.last_check = now
+            sig = artifact_signature(paths)
+            if sig is None or sig == slot.current.signature:
+                return
+            slot.loading = True
+        threading.Thread(target=self._refresh, args=(paths, slot), name="model-reload", daemon=True).start()
+
+    def _refresh(self, paths: RegistryPaths, slot: _Slot) -> None:
+        try:
+            loaded = _load_versioned(paths)
+            if loaded.version == slot.current.version:
+                # touched but identical content: keep the booster, remember the new signature
+                loaded = LoadedModel(slot.current.booster, slot.current.meta, slot.current.version, loaded.signature,
+                                     slot.current.loaded_at, slot.current.compiled)
+            slot.current = loaded
+            slot.last_error = None
+        except Exception as e:  # keep serving the previous model
+            slot.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            slot.loading = False
+
+    def get_version(self, paths: RegistryPaths, version_id: Optional[str] = None) -> LoadedModel:
+        """A registered version from versions/<version_id> (cached like the served model), or the served model."""
+        return self.get(paths if version_id is None else paths.version(version_id))
+
+    def routing(self, paths: RegistryPaths) -> Optional[Routing]:
+        """
+        The current routing.json (None: everything goes to the served model), re-read every check_interval_s
+        when the file changes. A routing file that fails to parse or names a missing version is logged in
+        status() and the previous routing stays in effect.
+        """
+        key = os.path.abspath(paths.models_dir)
+        entry = self._routing.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry[1] < self.check_interval_s:
+            return entry[0]
+        with self._lock:
+            entry = self._routing.setdefault(key, [None, -float("inf"), None])
+            if now - entry[1] < self.check_interval_s:
+                return entry[0]
+            entry[1] = now
+            try:
+                st = os.stat(paths.routing_path)
+                if entry[0] is not None and entry[0].signature == (st.st_mtime_ns, st.st_size):
+                    return entry[0]
+            except FileNotFoundError:
+                entry[0], entry[2] = None, None
+                return None
+            try:
+                entry[0], entry[2] = load_routing(paths), None
+            except (OSError, ValueError) as e:
+                entry[2] = f"{type(e).__name__}: {e}"
+            return entry[0]
+
+    def route(self, paths: RegistryPaths, user_id: Any, routing: Optional[Routing] = None) -> Tuple[str, LoadedModel]:
+        """(arm name, model) serving this user; pass `routing` to resolve a whole batch against one snapshot."""
+        routing = routing if routing is not None else self.routing(paths)
+        if routing is None:
+            return "default", self.get(paths)
+        name, version_id = routing.arm(user_id)
+        return name, self.get_version(paths, version_id)
+
+    def shadow(self, paths: RegistryPaths, routing: Optional[Routing] = None) -> Optional[LoadedModel]:
+        routing = routing if routing is not None else self.routing(paths)
+        if routing is None or routing.shadow is None:
+            return None
+        return self.get_version(paths, routing.shadow)
+
+    def warm(self, paths: RegistryPaths) -> None:
+        """Load the served model and every version the routing uses."""
+        self.get(paths)
+        routing = self.routing(paths)
+        for version_id in routing.versions() if routing is not None else []:
+            self.get_version(paths, version_id)
+
+    def serving_version(self, paths: RegistryPaths) -> Optional[str]:
+        slot = self._slots.get(os.path.abspath(paths.models_dir))
+        return None if slot is None else slot.current.version
+
+    def status(self) -> Dict[str, Any]:
+        out = {
+            models_dir: {
+                "version": slot.current.version,
+                "loaded_at": slot.current.loaded_at,
+                "reloading": slot.loading,
+                "last_error": slot.last_error,
+            }
+            for models_dir, slot in self._slots.items()
+        }
+        for models_dir, (routing, _, error) in self._routing.items():
+            if routing is not None or error is not None:
+                out.setdefault(models_dir, {})["routing"] = {
+                    "arms": [{"name": n, "version": v, "weight": w} for n, v, w in routing.arms] if routing else [],
+                    "shadow": routing.shadow if routing else None,
+                    "last_error": error,
+                }
+        return out
+
+_REGISTRY = ModelRegistry(check_interval_s=float(os.environ.get("RANKING_MODEL_CHECK_S", "2")))
+
+def get_registry() -> ModelRegistry:
+    return _REGISTRY
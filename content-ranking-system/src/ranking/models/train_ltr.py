@@ -1,19 +1,43 @@
 import argparse
 import os
 import json
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Tuple
 import numpy as np
 import pandas as pd
 import yaml
+import pyarrow as pa
+import pyarrow.parquet as pq
 import lightgbm as lgb
 
+from src.ranking.data import interaction_store, negative_sampling, splits
+from src.ranking.data.generate_interactions import raw_data_key
+from src.ranking.data.interaction_store import iter_partitions, read_interactions, read_store
 from src.ranking.data.negative_sampling import make_ranking_dataset
-from src.ranking.data.splits import time_split, random_split
+from src.ranking.data.splits import Splits, _check_fractions, group_codes, run_offsets, time_split, random_split
+from src.ranking.data.stage_cache import StageCache, code_fingerprint, stage_key
+from src.ranking.features import categorical, context_features, item_features, point_in_time, user_features
 from src.ranking.features.user_features import add_user_aggregate_features
 from src.ranking.features.item_features import add_item_aggregate_features
 from src.ranking.features.context_features import add_context_features
+from src.ranking.features.point_in_time import add_point_in_time_aggregates
+from src.ranking.features.categorical import fit_categorical_spec, encode_native, native_feature_cols
+from src.ranking.models.chunked_dataset import (
+    ParquetChunkSequence, SplitWriter, build_streaming_datasets, predict_streaming, read_labels,
+)
 from src.ranking.models.evaluate import evaluate_ranking
-from src.ranking.models.registry import save_model, RegistryPaths
+from src.ranking.models.registry import register_version, RegistryPaths
+
+# rows kept in the per-version reference Dataset (only its bin mappers matter)
+REFERENCE_ROWS = 1000
+CAT_COLS = ["user_id", "session_id", "item_id", "age_bucket", "country", "genre", "maturity", "device"]
+GROUP_COLS = ["user_id", "session_id"]
+DROP_COLS = ["timestamp", "watch_minutes"]  # label leakage-ish & not always available online
+ENCODING_KEYS = ("categorical_encoding", "max_categories", "high_cardinality", "hash_buckets")
+# Dataset-level params only; without pre-filtering the bins do not depend on min_data_in_leaf
+DATASET_PARAMS = {"feature_pre_filter": False, "verbosity": -1}
 
 def _ensure_dir(p: str) -> None:
     os.makedirs(p, exist_ok=True)
@@ -25,118 +49,433 @@ def _load_yaml(path: str) -> dict:
 def _one_hot_encode(df: pd.DataFrame, cat_cols: list[str]) -> pd.DataFrame:
     return pd.get_dummies(df, columns=cat_cols, dummy_na=True)
 
-def _build_group_sizes(df: pd.DataFrame) -> np.ndarray:
-    # group sizes for LightGBM ranker (must align with row order)
-    grouped = df.groupby(["user_id", "session_id"], sort=False).size().to_numpy()
-    return grouped.astype(int)
-
-def main(config_path: str) -> None:
-    cfg = _load_yaml(config_path)
-    seed = int(cfg["project"]["seed"])
-    np.random.seed(seed)
-
-    raw_dir = cfg["paths"]["raw_dir"]
-    processed_dir = cfg["paths"]["processed_dir"]
-    models_dir = cfg["paths"]["artifacts_models"]
-    reports_dir = cfg["paths"]["artifacts_reports"]
-
-    _ensure_dir(processed_dir)
-    _ensure_dir(models_dir)
-    _ensure_dir(reports_dir)
-
-    # Load raw
-    users = pd.read_csv(os.path.join(raw_dir, "users.csv"))
-    items = pd.read_csv(os.path.join(raw_dir, "items.csv"))
-    interactions = pd.read_csv(os.path.join(raw_dir, "interactions.csv"), parse_dates=["timestamp"])
+def _encode_frame(
+    df: pd.DataFrame,
+    train_rows: slice,
+    cat_cols: list[str],
+    feat_cfg: dict,
+) -> tuple[pd.DataFrame, dict]:
+    """
+    Encode categorical columns for LightGBM once over all splits; fit on df.iloc[train_rows].
+    - onehot (default): get_dummies over the whole frame with each column's train vocabulary, i.e. the
+      train layout with val/test aligned to it (values unseen in train encode as all zeros)
+    - native: int32 dictionary codes fitted on train, passed as categorical_feature;
+      IDs above max_categories distinct values are hashed into buckets or dropped
+    Returns X (same rows as df; slice it per split) and the encoding fields stored in model_meta.
+    """
+    mode = str(feat_cfg.get("categorical_encoding", "onehot"))
+    if mode == "onehot":
+        # For simplicity: one-hot everything including IDs (works for demo; production would use embeddings or hashing)
+        # Vocabulary = values seen in train, so val/test values outside it encode as all zeros
+        train = df.iloc[train_rows]
+        missing = {c: df[c].isna().to_numpy() for c in cat_cols}
+        vocab = {c: sorted(train[c].dropna().unique()) for c in cat_cols}
+        df = df.assign(**{c: pd.Categorical(df[c].where(df[c].isin(vocab[c])), categories=vocab[c]) for c in cat_cols})
+        X = _one_hot_encode(df, cat_cols)
+        # NaN indicators from the raw values (an out-of-vocabulary value is not missing)
+        for c in cat_cols:
+            X[f"{c}_nan"] = missing[c]
+        return X, {"categorical_encoding": "onehot"}
+
+    if mode == "native":
+        spec = fit_categorical_spec(
+            df.iloc[train_rows],
+            cat_cols,
+            max_categories=int(feat_cfg.get("max_categories", 1000)),
+            high_cardinality=str(feat_cfg.get("high_cardinality", "hash")),
+            hash_buckets=int(feat_cfg.get("hash_buckets", 1024)),
+        )
+        enc_meta = {
+            "categorical_encoding": "native",
+            "categorical_spec": spec,
+            "categorical_features": native_feature_cols(spec),
+        }
+        return encode_native(df, spec), enc_meta
+
+    raise ValueError(f"Unknown categorical_encoding: {mode}")
+
+def _build_params(model_cfg: dict) -> dict:
+    return {
+        "objective": model_cfg["objective"],
+        "metric": model_cfg["metric"],
+        "boosting_type": model_cfg["boosting_type"],
+        "num_leaves": int(model_cfg["num_leaves"]),
+        "learning_rate": float(model_cfg["learning_rate"]),
+        "min_data_in_leaf": int(model_cfg["min_data_in_leaf"]),
+        "feature_fraction": float(model_cfg["feature_fraction"]),
+        "bagging_fraction": float(model_cfg["bagging_fraction"]),
+        "bagging_freq": int(model_cfg["bagging_freq"]),
+        "lambda_l1": float(model_cfg["lambda_l1"]),
+        "lambda_l2": float(model_cfg["lambda_l2"]),
+        "seed": int(model_cfg["random_state"]),
+        "verbosity": -1,
+    }
 
-    # Build ranking dataset (neg sampling)
-    ds = make_ranking_dataset(
-        interactions=interactions,
+def _build_group_sizes(df: pd.DataFrame) -> np.ndarray:
+    # group sizes for LightGBM ranker: run lengths of the group keys in row order
+    if df.empty:
+        return np.zeros(0, dtype=int)
+    codes = group_codes(df, GROUP_COLS)
+    sizes = np.diff(run_offsets(codes))
+    if len(sizes) != int(codes.max()) + 1:
+        raise ValueError("(user_id, session_id) groups are not contiguous; sort the rows by group first")
+    return sizes.astype(int)
+
+def history_days(cfg: dict) -> int:
+    """Longest aggregate window, i.e. how much history before a training range has to be read."""
+    return max([int(cfg["features"]["history_window_days"]), *cfg["features"].get("aggregate_windows_days", [])])
+
+def reference_dataset(X_sample, y_sample, train_set: lgb.Dataset) -> lgb.Dataset:
+    """
+    Small Dataset binned with train_set's bin mappers; saved with each version so later
+    incremental runs bin new data exactly like the original training data.
+    """
+    ref = lgb.Dataset(X_sample, label=y_sample, reference=train_set)
+    ref.construct()
+    return ref
+
+def sample_rows(
+    events: pd.DataFrame,
+    users: pd.DataFrame,
+    items: pd.DataFrame,
+    cfg: dict,
+    seed: int,
+    item_pop: Optional[pd.Series] = None,
+    history: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """Ranking rows for `events`: positives + sampled negatives joined with user/item attributes."""
+    return make_ranking_dataset(
+        interactions=events,
         users=users,
         items=items,
         negatives_per_positive=int(cfg["negative_sampling"]["negatives_per_positive"]),
         strategy=str(cfg["negative_sampling"]["sampling_strategy"]),
         seed=seed,
+        item_pop=item_pop,
+        history=history,
     )
 
-    # Feature engineering (offline feature-store style)
-    ds = add_user_aggregate_features(ds, interactions, window_days=int(cfg["features"]["history_window_days"]))
-    ds = add_item_aggregate_features(ds, interactions, window_days=int(cfg["features"]["history_window_days"]))
-    ds = add_context_features(ds)
-
+def _aggregates(rows: pd.DataFrame, interactions: pd.DataFrame, feat_cfg: dict, entity: str) -> pd.DataFrame:
+    window = int(feat_cfg["history_window_days"])
+    if bool(feat_cfg.get("point_in_time", False)):
+        # each row only sees events strictly before its own timestamp
+        windows = feat_cfg.get("aggregate_windows_days", [window])
+        return add_point_in_time_aggregates(rows, interactions, windows_days=windows, entities=(entity,))
+    if entity == "user_id":
+        return add_user_aggregate_features(rows, interactions, window_days=window)
+    return add_item_aggregate_features(rows, interactions, window_days=window)
+
+def add_cross_features(ds: pd.DataFrame) -> pd.DataFrame:
     # Additional cross features (cheap but effective)
+    ds = ds.copy()
     ds["item_age"] = datetime.now().year - ds["release_year"].astype(int)
     ds["is_kids_content"] = (ds["genre"] == "Kids").astype(int)
     ds["kids_mismatch"] = ((ds["is_kids_profile"].astype(int) == 1) & (ds["genre"] != "Kids")).astype(int)
+    return ds
+
+def build_ranking_frame(
+    events: pd.DataFrame,
+    interactions: pd.DataFrame,
+    users: pd.DataFrame,
+    items: pd.DataFrame,
+    cfg: dict,
+    seed: int,
+) -> pd.DataFrame:
+    """
+    Ranking rows for `events` (positives + sampled negatives) with aggregate, context and cross features.
+    `interactions` is the history the aggregates are computed from (events plus the window before them).
+    """
+    ds = sample_rows(events, users, items, cfg, seed)
+    # Feature engineering (offline feature-store style)
+    ds = _aggregates(ds, interactions, cfg["features"], "user_id")
+    ds = _aggregates(ds, interactions, cfg["features"], "item_id")
+    return add_cross_features(add_context_features(ds))
 
-    # Split
+def split_frame(ds: pd.DataFrame, cfg: dict, seed: int) -> Splits:
     split_cfg = cfg["splits"]
+    fracs = float(split_cfg["train_frac"]), float(split_cfg["val_frac"]), float(split_cfg["test_frac"])
     if split_cfg["strategy"] == "time":
-        train_df, val_df, test_df = time_split(ds, float(split_cfg["train_frac"]), float(split_cfg["val_frac"]), float(split_cfg["test_frac"]))
-    else:
-        train_df, val_df, test_df = random_split(ds, float(split_cfg["train_frac"]), float(split_cfg["val_frac"]), float(split_cfg["test_frac"]), seed=seed)
+        return time_split(ds, *fracs)
+    return random_split(ds, *fracs, seed=seed)
+
+def _new_columns(out: pd.DataFrame, base: pd.DataFrame) -> pd.DataFrame:
+    return out[[c for c in out.columns if c not in base.columns]].reset_index(drop=True)
+
+def _load_stage(cfg: dict) -> dict:
+    # Optional training range [data_start, data_end); aggregates also read the history window before it
+    raw_dir = cfg["paths"]["raw_dir"]
+    data_start, data_end = cfg["training"].get("data_start"), cfg["training"].get("data_end")
+    read_start = None if data_start is None else pd.Timestamp(data_start) - pd.Timedelta(days=history_days(cfg))
+    interactions = read_interactions(raw_dir, start=read_start, end=data_end)
+    events = interactions if data_start is None else interactions[interactions["timestamp"] >= pd.Timestamp(data_start)]
+    return {
+        "users": pd.read_csv(os.path.join(raw_dir, "users.csv")),
+        "items": pd.read_csv(os.path.join(raw_dir, "items.csv")),
+        "interactions": interactions,
+        "events": events,
+    }
+
+def _sample_stage(cfg: dict, seed: int, raw: dict) -> dict:
+    events = raw["events"]
+    return {
+        "rows": sample_rows(events, raw["users"], raw["items"], cfg, seed).reset_index(drop=True),
+        "data_start": str(events["timestamp"].min()),
+        "data_end": str(events["timestamp"].max()),
+    }
+
+def _aggregate_stage(feat_cfg: dict, entity: str, raw: dict, smp: dict) -> dict:
+    return {"cols": _new_columns(_aggregates(smp["rows"], raw["interactions"], feat_cfg, entity), smp["rows"])}
+
+def _context_stage(smp: dict) -> dict:
+    return {"cols": _new_columns(add_cross_features(add_context_features(smp["rows"])), smp["rows"])}
+
+def _split_stage(cfg: dict, seed: int, smp: dict, user: dict, item: dict, context: dict) -> dict:
+    # same column order as build_ranking_frame
+    ds = pd.concat([smp["rows"], user["cols"], item["cols"], context["cols"]], axis=1)
+    ds["timestamp"] = pd.to_datetime(ds["timestamp"])
+    return split_frame(ds, cfg, seed).outputs()
+
+def _encode_stage(feat_cfg: dict, sp: dict) -> dict:
+    # one encoding of the shared frame; the splits are row slices of it
+    sp = Splits(**sp)
+    X, enc_meta = _encode_frame(sp.frame.drop(columns=["label"] + DROP_COLS), sp.rows("train"), CAT_COLS, feat_cfg)
+    y = sp.frame["label"].astype(int).to_numpy()
+    return {
+        "X_train": X.iloc[sp.rows("train")], "X_val": X.iloc[sp.rows("val")], "X_test": X.iloc[sp.rows("test")],
+        "enc_meta": enc_meta,
+        "y_train": y[sp.rows("train")],
+        "y_val": y[sp.rows("val")],
+        "train_group": sp.group_sizes("train"),
+        "val_group": sp.group_sizes("val"),
+    }
+
+def _dataset_stage(enc: dict) -> dict:
+    # bins must not depend on the model: section, so no feature pre-filtering by min_data_in_leaf
+    categorical_feature = enc["enc_meta"].get("categorical_features", "auto")
+    train_set = lgb.Dataset(enc["X_train"], label=enc["y_train"], group=enc["train_group"],
+                            categorical_feature=categorical_feature, params=DATASET_PARAMS)
+    val_set = lgb.Dataset(enc["X_val"], label=enc["y_val"], group=enc["val_group"], reference=train_set,
+                          categorical_feature=categorical_feature, params=DATASET_PARAMS)
+    return {"train": train_set.construct(), "val": val_set.construct()}
+
+def build_pipeline(cfg: dict, seed: int, cache: StageCache) -> dict:
+    """
+    The offline pipeline as cached stages: load -> sample -> user/item/context features -> split
+    -> encode -> dataset. Each stage is keyed on its inputs' keys, its config subsection and the
+    source of the code it runs; nothing is computed until a value is asked for.
+    """
+    feat_cfg = cfg["features"]
+    range_cfg = {k: cfg["training"].get(k) for k in ("data_start", "data_end")}
+    agg_cfg = {k: feat_cfg[k] for k in ("history_window_days", "point_in_time", "aggregate_windows_days") if k in feat_cfg}
+    agg_code = [_aggregate_stage, _aggregates, _new_columns, point_in_time]
+
+    load = cache.stage(
+        "load", partial(_load_stage, cfg), persist=False,
+        key=stage_key("load", {**range_cfg, "history_days": history_days(cfg)},
+                      code_fingerprint([_load_stage, interaction_store]), [raw_data_key(cfg["paths"]["raw_dir"])]),
+    )
+    sample = cache.stage("sample", partial(_sample_stage, cfg, seed), [load],
+                         {"negative_sampling": cfg["negative_sampling"], "seed": seed},
+                         [_sample_stage, sample_rows, negative_sampling])
+    user = cache.stage("user_features", partial(_aggregate_stage, agg_cfg, "user_id"), [load, sample], agg_cfg,
+                       [*agg_code, user_features])
+    item = cache.stage("item_features", partial(_aggregate_stage, agg_cfg, "item_id"), [load, sample], agg_cfg,
+                       [*agg_code, item_features])
+    # item_age depends on the current year
+    context = cache.stage("context_features", _context_stage, [sample], {"year": datetime.now().year},
+                          [_context_stage, add_cross_features, _new_columns, context_features])
+    split = cache.stage("split", partial(_split_stage, cfg, seed), [sample, user, item, context],
+                        {"splits": cfg["splits"], "seed": seed}, [_split_stage, split_frame, splits])
+    encoding = {k: feat_cfg[k] for k in ENCODING_KEYS if k in feat_cfg}
+    encode = cache.stage("encode", partial(_encode_stage, encoding), [split], encoding,
+                         [_encode_stage, _encode_frame, _one_hot_encode, categorical])
+    dataset = cache.stage("dataset", _dataset_stage, [encode], DATASET_PARAMS, [_dataset_stage])
+    return {s.name: s for s in (load, sample, user, item, context, split, encode, dataset)}
+
+def _time_cuts(root: str, positives: Dict[tuple, int], fracs: Tuple[float, float, float], start, end) -> List[pd.Timestamp]:
+    """
+    Time-split boundaries over the positives of [start, end), given their count per batch of
+    partitions (first date, last date): rows before cuts[0] are train, before cuts[1] val, the rest
+    test. Only the batch holding each cut is read again.
+    """
+    _check_fractions(*fracs)
+    n = sum(positives.values())
+    n_train, n_val = int(n * fracs[0]), int(n * fracs[1])
+    cuts = []
+    for target in (n_train, n_train + n_val):
+        cut, seen = pd.Timestamp.max, 0
+        for (first, last), count in sorted(positives.items()):
+            if seen + count > target:
+                lo, hi = pd.Timestamp(first), pd.Timestamp(last) + pd.Timedelta(days=1)
+                lo, hi = (lo if start is None else max(lo, start)), (hi if end is None else min(hi, end))
+                df = read_store(root, ["timestamp", "label"], start=lo, end=hi)
+                cut = pd.Timestamp(np.sort(df.loc[df["label"] > 0, "timestamp"].to_numpy())[target - seen])
+                break
+            seen += count
+        cuts.append(cut)
+    return cuts
+
+def _chunks(root: str, start, end, chunk_days: int, window_days: int) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    (events, history) for every chunk_days date partitions of [start, end); history is the chunk
+    plus at least window_days of interactions before it, so one chunk + window is in memory at a time.
+    """
+    window = []  # (last date, frame)
+    if start is not None:
+        window.append((start.date() - timedelta(days=1), read_store(root, start=start - pd.Timedelta(days=window_days), end=start)))
+    for dates, events in iter_partitions(root, start=start, end=end, days=chunk_days):
+        yield events, pd.concat([f for _, f in window] + [events], ignore_index=True)
+        window = [(d, f) for d, f in window + [(dates[-1], events)] if d > dates[-1] - timedelta(days=window_days)]
+
+def write_streaming_splits(cfg: dict, seed: int, split_paths: List[Tuple[str, str]], chunk_rows: int) -> dict:
+    """
+    Processed train/val/test parquet straight from the interaction store, a few date partitions at a
+    time (the in-memory stages never run):
+    - Pass 1 (timestamp / item_id / label only): item popularity for negative sampling and positive
+      counts for the time-split boundaries
+    - Pass 2: every training.chunk_days partitions are negative-sampled and featurised with the history
+      window before them (point-in-time aggregates are exact), then appended to the split files
+    Memory follows chunk_days + history_days of interactions, not the length of the log.
+    Differences from the in-memory splits:
+    - negatives exclude the user's items from the chunk and its history window only
+    - a (user_id, session_id) group spanning two chunks becomes two ranking queries
+    - time split: rows at a boundary timestamp go to the later split; random split: drawn per row
+    Returns the rows written per split and the event time range.
+    """
+    raw_dir = cfg["paths"]["raw_dir"]
+    root = interaction_store.store_path(raw_dir)
+    if not interaction_store.store_dates(root):
+        raise FileNotFoundError(f"training.streaming reads the partitioned interaction store; none in {raw_dir}")
+    feat_cfg = cfg["features"]
+    data_start, data_end = cfg["training"].get("data_start"), cfg["training"].get("data_end")
+    start = None if data_start is None else pd.Timestamp(data_start)
+    end = None if data_end is None else pd.Timestamp(data_end)
+
+    chunk_days = int(cfg["training"].get("chunk_days", 7))
+    pop, positives, ts_range = None, {}, []
+    for dates, df in iter_partitions(root, ["timestamp", "item_id", "label"], start, end, days=chunk_days):
+        w = df["label"].clip(lower=0).astype(float).groupby(df["item_id"]).sum()
+        pop = w if pop is None else pop.add(w, fill_value=0.0)
+        positives[(dates[0], dates[-1])] = int((df["label"] > 0).sum())
+        ts_range = [ts_range[0] if ts_range else df["timestamp"].iloc[0], df["timestamp"].iloc[-1]]
+    if pop is None:
+        raise ValueError("No interactions in the training range")
+    item_pop = (pop / pop.sum()).sort_values(ascending=False)
+
+    split_cfg = cfg["splits"]
+    fracs = float(split_cfg["train_frac"]), float(split_cfg["val_frac"]), float(split_cfg["test_frac"])
+    cuts = _time_cuts(root, positives, fracs, start, end) if split_cfg["strategy"] == "time" else None
+    point_in_time_aggs = bool(feat_cfg.get("point_in_time", False))
+    entity_aggs = {}
+    if not point_in_time_aggs:
+        # global last-window aggregates are one value per user / item: computed once from the last
+        # history_window_days of the range, merged into every chunk (absent entities are 0 like offline)
+        cutoff = ts_range[1].normalize() - pd.Timedelta(days=int(feat_cfg["history_window_days"]) - 1)
+        tail = read_interactions(raw_dir, start=cutoff, end=end)
+        entity_aggs = {e: _aggregates(pd.DataFrame({e: pd.unique(tail[e])}), tail, feat_cfg, e) for e in ("user_id", "item_id")}
+        del tail
+
+    users = pd.read_csv(os.path.join(raw_dir, "users.csv"))
+    items = pd.read_csv(os.path.join(raw_dir, "items.csv"))
+    writers = []
+    try:
+        for i, (events, history) in enumerate(_chunks(root, start, end, chunk_days, history_days(cfg))):
+            ds = sample_rows(events, users, items, cfg, seed + i, item_pop=item_pop, history=history)
+            for e in ("user_id", "item_id"):
+                if point_in_time_aggs:
+                    ds = _aggregates(ds, history, feat_cfg, e)
+                else:
+                    ds = ds.merge(entity_aggs[e], on=e, how="left")
+                    ds[list(entity_aggs[e].columns[1:])] = ds[list(entity_aggs[e].columns[1:])].fillna(0.0)
+            ds = add_cross_features(add_context_features(ds))
+            ts = pd.to_datetime(ds["timestamp"])
+            ds["timestamp"] = ts
+            if cuts is not None:
+                part = (ts >= cuts[0]).to_numpy(dtype=int) + (ts >= cuts[1]).to_numpy(dtype=int)
+            else:
+                u = np.random.default_rng((seed, i)).random(len(ds))
+                part = (u >= fracs[0]).astype(int) + (u >= fracs[0] + fracs[1]).astype(int)
+            if not writers:
+                # the first whole chunk fixes the schema (its val/test parts may still be empty)
+                schema = pa.Schema.from_pandas(ds, preserve_index=False)
+                writers = [(name, SplitWriter(path, chunk_rows, schema)) for name, path in split_paths]
+            for j, (_, writer) in enumerate(writers):
+                writer.write(ds[part == j])
+            del events, history, ds
+    finally:
+        for _, writer in writers:
+            writer.close()
+    return {
+        "rows": {name: writer.rows for name, writer in writers},
+        "data_start": str(ts_range[0]),
+        "data_end": str(ts_range[1]),
+    }
+
+def main(config_path: str, use_cache: bool = True) -> None:
+    cfg = _load_yaml(config_path)
+    seed = int(cfg["project"]["seed"])
+    np.random.seed(seed)
+
+    processed_dir = cfg["paths"]["processed_dir"]
+    models_dir = cfg["paths"]["artifacts_models"]
+    reports_dir = cfg["paths"]["artifacts_reports"]
+
+    _ensure_dir(processed_dir)
+    _ensure_dir(models_dir)
+    _ensure_dir(reports_dir)
+
+    # Stage outputs are cached under data/cache/<stage>/<key>; only changed stages recompute
+    cache_dir = cfg["paths"].get("cache_dir", os.path.join(os.path.dirname(processed_dir.rstrip("/")) or ".", "cache"))
+    cache = StageCache(cache_dir, enabled=use_cache and bool(cfg.get("pipeline", {}).get("cache", True)),
+                       keep=int(cfg.get("pipeline", {}).get("cache_keep", 3)))
+    stages = build_pipeline(cfg, seed, cache)
 
     # Persist processed
     train_path = os.path.join(processed_dir, "train.parquet")
     val_path = os.path.join(processed_dir, "val.parquet")
     test_path = os.path.join(processed_dir, "test.parquet")
-    train_df.to_parquet(train_path, index=False)
-    val_df.to_parquet(val_path, index=False)
-    test_df.to_parquet(test_path, index=False)
+    # Streaming mode: splits written chunk by chunk straight from the interaction store (the cached
+    # in-memory stages never run), LightGBM Datasets built row group by row group from the parquet files
+    streaming = bool(cfg["training"].get("streaming", False))
+    split_paths = [("train", train_path), ("val", val_path), ("test", test_path)]
+    if streaming:
+        written = write_streaming_splits(cfg, seed, split_paths, int(cfg["training"].get("chunk_rows", 100_000)))
+        n_train, n_val, n_test = (written["rows"][n] for n, _ in split_paths)
+        data_range = (written["data_start"], written["data_end"])
+    else:
+        data_range = (stages["sample"].json_value("data_start"), stages["sample"].json_value("data_end"))
+        sp = Splits(**stages["split"].value)
+        for name, path in split_paths:
+            sp.take(name).to_parquet(path, index=False)
     print("✅ Saved processed splits to data/processed")
 
     # Prepare model inputs
     target = "label"
-    group_cols = ["user_id", "session_id"]
-
-    drop_cols = ["timestamp", "watch_minutes"]  # label leakage-ish & not always available online
-    feature_df_train = train_df.drop(columns=[target] + drop_cols)
-    feature_df_val = val_df.drop(columns=[target] + drop_cols)
-    feature_df_test = test_df.drop(columns=[target] + drop_cols)
-
-    # Categorical columns
-    cat_cols = ["user_id", "session_id", "item_id", "age_bucket", "country", "genre", "maturity", "device"]
-    # We keep group keys in dataframes for grouping, but remove IDs from features after we compute group sizes.
-    # For simplicity: one-hot everything including IDs (works for demo; production would use embeddings or hashing)
-    X_train = _one_hot_encode(feature_df_train, cat_cols)
-    X_val = _one_hot_encode(feature_df_val, cat_cols)
-    X_test = _one_hot_encode(feature_df_test, cat_cols)
-
-    # Align columns across splits
-    X_val = X_val.reindex(columns=X_train.columns, fill_value=0)
-    X_test = X_test.reindex(columns=X_train.columns, fill_value=0)
-
-    y_train = train_df[target].astype(int).to_numpy()
-    y_val = val_df[target].astype(int).to_numpy()
-
-    # Group sizes (must follow the order of rows)
-    train_group = _build_group_sizes(train_df[group_cols])
-    val_group = _build_group_sizes(val_df[group_cols])
-
-    # LightGBM ranker
     model_cfg = cfg["model"]
-    train_set = lgb.Dataset(X_train, label=y_train, group=train_group, free_raw_data=False)
-    val_set = lgb.Dataset(X_val, label=y_val, group=val_group, reference=train_set, free_raw_data=False)
+    if streaming:
+        feature_cols = [c for c in pq.read_schema(train_path).names if c not in [target] + DROP_COLS]
+        # LightGBM's bin sample is held as dense doubles; its default cap is 200000 rows
+        ds_params = {"bin_construct_sample_cnt": int(cfg["training"].get("bin_sample_rows", 200_000))}
+        train_set, val_set, encoder = build_streaming_datasets(train_path, val_path, feature_cols, CAT_COLS,
+                                                               cfg["features"], params=ds_params)
+        features, enc_meta = encoder.features, encoder.meta()
+    else:
+        enc = stages["encode"].value
+        X_train, X_val, X_test, enc_meta = enc["X_train"], enc["X_val"], enc["X_test"], enc["enc_meta"]
+        features = list(X_train.columns)
+        y_train = enc["y_train"]
+        n_train, n_val, n_test = len(X_train), len(X_val), len(X_test)
 
-    params = {
-        "objective": model_cfg["objective"],
-        "metric": model_cfg["metric"],
-        "boosting_type": model_cfg["boosting_type"],
-        "num_leaves": int(model_cfg["num_leaves"]),
-        "learning_rate": float(model_cfg["learning_rate"]),
-        "min_data_in_leaf": int(model_cfg["min_data_in_leaf"]),
-        "feature_fraction": float(model_cfg["feature_fraction"]),
-        "bagging_fraction": float(model_cfg["bagging_fraction"]),
-        "bagging_freq": int(model_cfg["bagging_freq"]),
-        "lambda_l1": float(model_cfg["lambda_l1"]),
-        "lambda_l2": float(model_cfg["lambda_l2"]),
-        "seed": int(model_cfg["random_state"]),
-        "verbosity": -1,
-    }
+        # LightGBM ranker on the binned Datasets (cached separately from the model: section)
+        datasets = stages["dataset"].value
+        train_set, val_set = datasets["train"], datasets["val"]
+
+    params = _build_params(model_cfg)
 
     num_boost_round = int(model_cfg["n_estimators"])
     early_stopping_rounds = int(cfg["training"]["early_stopping_rounds"])
 
+    t0 = time.perf_counter()
     booster = lgb.train(
         params=params,
         train_set=train_set,
@@ -145,20 +484,36 @@ def main(config_path: str) -> None:
         valid_names=["val"],
         callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False)],
     )
+    train_s = time.perf_counter() - t0
 
     # Evaluate on val/test using our metrics
-    val_scores = booster.predict(X_val, num_iteration=booster.best_iteration)
-    test_scores = booster.predict(X_test, num_iteration=booster.best_iteration)
+    eval_cols = ["user_id", "session_id", "item_id", "label"]
+    n_ref = min(REFERENCE_ROWS, n_train)
+    if streaming:
+        ref_seq = ParquetChunkSequence(train_path, encoder)
+        # named columns so the reference's categorical_feature names resolve
+        ref_X = pd.DataFrame(ref_seq[0:n_ref], columns=features)
+        ref_set = reference_dataset(ref_X, read_labels(train_path)[:n_ref], train_set)
+        del train_set, val_set
+        val_eval_df = pd.read_parquet(val_path, columns=eval_cols)
+        val_eval_df["score"] = predict_streaming(booster, ParquetChunkSequence(val_path, encoder), booster.best_iteration)
+        test_eval_df = pd.read_parquet(test_path, columns=eval_cols)
+        test_eval_df["score"] = predict_streaming(booster, ParquetChunkSequence(test_path, encoder), booster.best_iteration)
+    else:
+        ref_set = reference_dataset(X_train.iloc[:n_ref], y_train[:n_ref], train_set)
+        val_scores = booster.predict(X_val, num_iteration=booster.best_iteration)
+        test_scores = booster.predict(X_test, num_iteration=booster.best_iteration)
 
-    val_eval_df = val_df[["user_id", "session_id", "item_id", "label"]].copy()
-    val_eval_df["score"] = val_scores
+        val_eval_df = pd.read_parquet(val_path, columns=eval_cols)
+        val_eval_df["score"] = val_scores
 
-    test_eval_df = test_df[["user_id", "session_id", "item_id", "label"]].copy()
-    test_eval_df["score"] = test_scores
+        test_eval_df = pd.read_parquet(test_path, columns=eval_cols)
+        test_eval_df["score"] = test_scores
 
     k = int(cfg["features"]["eval_k"])
-    val_metrics = evaluate_ranking(val_eval_df, score_col="score", k=k)
-    test_metrics = evaluate_ranking(test_eval_df, score_col="score", k=k)
+    ks = sorted({k, *[int(x) for x in cfg["features"].get("eval_ks", [])]})
+    val_metrics = evaluate_ranking(val_eval_df, score_col="score", k=ks)
+    test_metrics = evaluate_ranking(test_eval_df, score_col="score", k=ks)
 
     metrics = {"val": val_metrics, "test": test_metrics, "k": k, "best_iteration": int(booster.best_iteration)}
     with open(os.path.join(reports_dir, "metrics.json"), "w", encoding="utf-8") as f:
@@ -170,18 +525,38 @@ def main(config_path: str) -> None:
         "model_type": "LightGBM LambdaRank",
         "created_at": datetime.utcnow().isoformat() + "Z",
         "best_iteration": int(booster.best_iteration),
-        "train_rows": int(len(train_df)),
-        "val_rows": int(len(val_df)),
-        "test_rows": int(len(test_df)),
-        "features": list(X_train.columns),
+        "train_rows": int(n_train),
+        "val_rows": int(n_val),
+        "test_rows": int(n_test),
+        "features": features,
+        **enc_meta,
         "label_definition": "0=no-engagement negative, 1=click, 2=short-play, 3=long-play",
         "metrics": metrics,
+        "training_mode": "full",
+        "data_start": str(data_range[0]),
+        "data_end": str(data_range[1]),
+        "parent_version": None,
+        "lineage": [],
     }
 
-    save_model(booster, meta, RegistryPaths(models_dir=models_dir))
+    register_version(booster, meta, RegistryPaths(models_dir=models_dir), reference=ref_set)
+
+    report = {
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "cache_dir": cache_dir,
+        "cache_enabled": cache.enabled,
+        "stages": cache.report(),
+        "train_s": train_s,
+    }
+    with open(os.path.join(reports_dir, "pipeline_stages.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print("⏱️ Pipeline stages:")
+    cache.print_report()
+    print(f"  {'train':>16} {'':>10} {train_s:8.2f}s")
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--config", required=True)
+    ap.add_argument("--no-cache", action="store_true", help="recompute every stage and do not write the stage cache")
     args = ap.parse_args()
-    main(args.config)
+    main(args.config, use_cache=not args.no_cache)
@@ -0,0 +1,269 @@
+"""
+Parallel hyperparameter search for the LambdaRank model.
+
+The processed train/val splits written by train_ltr are encoded and binned once and saved as
+LightGBM binary Datasets; every trial loads those binaries instead of re-running the feature
+pipeline or re-binning. Trials run in a process pool with `tuning.threads_per_trial` LightGBM
+threads each, and a median rule stops trials that fall behind the others early.
+
+    python -m src.ranking.models.tune --config configs/ranker.yaml
+"""
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+
+from src.ranking.models.train_ltr import _build_group_sizes, _build_params, _encode_frame, _load_yaml
+
+CAT_COLS = ["user_id", "session_id", "item_id", "age_bucket", "country", "genre", "maturity", "device"]
+DROP_COLS = ["label", "timestamp", "watch_minutes"]
+TRAIN_BIN = "train.bin"
+VAL_BIN = "val.bin"
+MANIFEST = "manifest.json"
+
+# list -> choice; {low, high[, log][, int]} -> uniform (log-uniform) range
+DEFAULT_SPACE: Dict[str, Any] = {
+    "num_leaves": [15, 31, 63, 127],
+    "learning_rate": {"low": 0.01, "high": 0.2, "log": True},
+    "min_data_in_leaf": {"low": 5, "high": 100, "log": True, "int": True},
+    "feature_fraction": {"low": 0.5, "high": 1.0},
+    "bagging_fraction": {"low": 0.5, "high": 1.0},
+    "lambda_l2": {"low": 1e-3, "high": 10.0, "log": True},
+}
+
+def sample_params(space: Dict[str, Any], n_trials: int, seed: int) -> List[Dict[str, Any]]:
+    """Random-search parameter sets (deterministic for a seed)."""
+    rng = np.random.default_rng(seed)
+    trials = []
+    for _ in range(n_trials):
+        params = {}
+        for name, spec in space.items():
+            if isinstance(spec, list):
+                params[name] = spec[int(rng.integers(len(spec)))]
+                continue
+            low, high = float(spec["low"]), float(spec["high"])
+            if spec.get("log", False):
+                value = math.exp(rng.uniform(math.log(low), math.log(high)))
+            else:
+                value = rng.uniform(low, high)
+            params[name] = int(round(value)) if spec.get("int", False) else float(value)
+        trials.append(params)
+    return trials
+
+def should_prune(value: float, others: List[float], min_trials: int) -> bool:
+    """Median stopping rule: prune when below the median of other trials at the same round."""
+    if len(others) < min_trials:
+        return False
+    return value < float(np.median(others))
+
+class MedianPruner:
+    """
+    LightGBM callback reporting the validation metric every `every` rounds to a dict shared
+    across the pool and stopping the trial when should_prune() says so.
+    """
+
+    def __init__(self, trial: int, shared: dict, every: int, min_trials: int, warmup: int) -> None:
+        self.trial = trial
+        self.shared = shared
+        self.every = every
+        self.min_trials = min_trials
+        self.warmup = warmup
+        self.pruned_at: Optional[int] = None
+        self.order = 30  # after early_stopping (order 30 too, registered first) has seen the round
+
+    def __call__(self, env: lgb.callback.CallbackEnv) -> None:
+        rnd = env.iteration + 1
+        if rnd % self.every or not env.evaluation_result_list:
+            return
+        value = float(env.evaluation_result_list[0][2])
+        others = [v for (t, r), v in self.shared.items() if r == rnd and t != self.trial]
+        self.shared[(self.trial, rnd)] = value
+        if rnd >= self.warmup and should_prune(value, others, self.min_trials):
+            self.pruned_at = rnd
+            raise lgb.callback.EarlyStopException(env.iteration, env.evaluation_result_list)
+
+def _manifest(processed_dir: str, feat_cfg: dict) -> dict:
+    src = {}
+    for name in ("train.parquet", "val.parquet"):
+        st = os.stat(os.path.join(processed_dir, name))
+        src[name] = [st.st_size, st.st_mtime_ns]
+    encoding = {k: feat_cfg.get(k) for k in ("categorical_encoding", "max_categories", "high_cardinality", "hash_buckets")}
+    return {"sources": src, "encoding": encoding}
+
+def build_binned_datasets(processed_dir: str, out_dir: str, feat_cfg: dict, rebuild: bool = False) -> dict:
+    """
+    Encode the processed splits and save them as binned LightGBM binaries (val binned with the
+    train bin mappers). Skipped when the binaries were already built from the same splits/encoding.
+    feature_pre_filter is off so trials can lower min_data_in_leaf on the saved bins.
+    """
+    for name in ("train.parquet", "val.parquet"):
+        if not os.path.exists(os.path.join(processed_dir, name)):
+            raise FileNotFoundError(f"Missing {name} in {processed_dir}. Run train_ltr first.")
+    manifest = _manifest(processed_dir, feat_cfg)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if not rebuild and os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        if {k: saved.get(k) for k in manifest} == json.loads(json.dumps(manifest)):
+            print(f"✅ Reusing binned Datasets in {out_dir}")
+            return saved
+
+    t0 = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    train_df = pd.read_parquet(os.path.join(processed_dir, "train.parquet"))
+    val_df = pd.read_parquet(os.path.join(processed_dir, "val.parquet"))
+    # one encoding over both splits (fitted on the train rows), sliced back apart
+    train_rows, val_rows = slice(0, len(train_df)), slice(len(train_df), len(train_df) + len(val_df))
+    X, enc_meta = _encode_frame(pd.concat([train_df, val_df], ignore_index=True).drop(columns=DROP_COLS),
+                                train_rows, CAT_COLS, feat_cfg)
+    X_train, X_val = X.iloc[train_rows], X.iloc[val_rows]
+    categorical_feature = enc_meta.get("categorical_features", "auto")
+    ds_params = {"feature_pre_filter": False, "verbosity": -1}
+    train_set = lgb.Dataset(X_train, label=train_df["label"].astype(int).to_numpy(), group=_build_group_sizes(train_df),
+                            categorical_feature=categorical_feature, params=ds_params)
+    val_set = lgb.Dataset(X_val, label=val_df["label"].astype(int).to_numpy(), group=_build_group_sizes(val_df),
+                          reference=train_set, categorical_feature=categorical_feature, params=ds_params)
+    for ds, name in [(train_set, TRAIN_BIN), (val_set, VAL_BIN)]:
+        path = os.path.join(out_dir, name)
+        if os.path.exists(path):
+            os.remove(path)  # save_binary refuses to overwrite
+        ds.save_binary(path)
+
+    saved = {
+        **manifest,
+        "features": list(X_train.columns),
+        "categorical_encoding": enc_meta["categorical_encoding"],
+        "train_rows": int(len(X_train)),
+        "val_rows": int(len(X_val)),
+        "build_s": time.perf_counter() - t0,
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(saved, f, indent=2)
+    print(f"✅ Saved binned Datasets to {out_dir} ({saved['build_s']:.1f}s)")
+    return saved
+
+def run_trial(trial: int, overrides: Dict[str, Any], data_dir: str, model_cfg: dict, train_cfg: dict,
+              tune_cfg: dict, shared: dict) -> Dict[str, Any]:
+    """
+    Train one parameter set on the saved binaries; returns its leaderboard row.
+    A pruned trial's score is only the one it had when it was stopped, so it is kept under
+    `<metric>_at_prune` with no `<metric>` / best_iteration and never competes with finished trials.
+    """
+    t0 = time.perf_counter()
+    k = int(tune_cfg["eval_k"])
+    params = {
+        **_build_params({**model_cfg, **overrides}),
+        "metric": "ndcg",
+        "eval_at": [k],
+        "num_threads": int(tune_cfg["threads_per_trial"]),
+        "feature_pre_filter": False,
+    }
+    train_set = lgb.Dataset(os.path.join(data_dir, TRAIN_BIN), params={"feature_pre_filter": False})
+    val_set = lgb.Dataset(os.path.join(data_dir, VAL_BIN), reference=train_set)
+    pruner = MedianPruner(
+        trial, shared,
+        every=int(tune_cfg["prune_every"]),
+        min_trials=int(tune_cfg["prune_min_trials"]),
+        warmup=int(tune_cfg["prune_warmup_rounds"]),
+    )
+    callbacks = [lgb.early_stopping(int(train_cfg["early_stopping_rounds"]), verbose=False)]
+    if tune_cfg["pruning"]:
+        callbacks.append(pruner)
+    booster = lgb.train(
+        params=params,
+        train_set=train_set,
+        num_boost_round=int(model_cfg["n_estimators"]),
+        valid_sets=[val_set],
+        valid_names=["val"],
+        callbacks=callbacks,
+    )
+    pruned = pruner.pruned_at is not None
+    score = float(booster.best_score["val"][f"ndcg@{k}"])
+    return {
+        "trial": trial,
+        "status": "pruned" if pruned else "complete",
+        f"NDCG@{k}": None if pruned else score,
+        f"NDCG@{k}_at_prune": score if pruned else None,
+        "best_iteration": None if pruned else int(booster.best_iteration),
+        "rounds": int(pruner.pruned_at or booster.current_iteration()),
+        "wall_s": time.perf_counter() - t0,
+        "params": overrides,
+    }
+
+def main(config_path: str, rebuild: bool = False) -> None:
+    cfg = _load_yaml(config_path)
+    seed = int(cfg["project"]["seed"])
+    tcfg = cfg.get("tuning", {})
+    tune_cfg = {
+        "eval_k": int(cfg["features"]["eval_k"]),
+        "threads_per_trial": int(tcfg.get("threads_per_trial", 1)),
+        "pruning": bool(tcfg.get("pruning", True)),
+        "prune_every": int(tcfg.get("prune_every", 10)),
+        "prune_min_trials": int(tcfg.get("prune_min_trials", 3)),
+        "prune_warmup_rounds": int(tcfg.get("prune_warmup_rounds", 10)),
+    }
+    n_trials = int(tcfg.get("n_trials", 20))
+    workers = int(tcfg.get("workers", max(1, (os.cpu_count() or 1) // tune_cfg["threads_per_trial"])))
+    reports_dir = cfg["paths"]["artifacts_reports"]
+    data_dir = os.path.join(cfg["paths"]["processed_dir"], "tuning")
+
+    data_info = build_binned_datasets(cfg["paths"]["processed_dir"], data_dir, cfg["features"], rebuild=rebuild)
+    trials = sample_params(tcfg.get("search_space", DEFAULT_SPACE), n_trials, seed)
+
+    metric = f"NDCG@{tune_cfg['eval_k']}"
+    t0 = time.perf_counter()
+    rows = []
+    with mp.Manager() as manager:
+        shared = manager.dict()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(run_trial, i, p, data_dir, cfg["model"], cfg["training"], tune_cfg, shared)
+                for i, p in enumerate(trials)
+            ]
+            for fut in as_completed(futures):
+                row = fut.result()
+                rows.append(row)
+                score = row[metric] if row["status"] == "complete" else row[f"{metric}_at_prune"]
+                print(f"trial {row['trial']:>3} {row['status']:>8} {metric}={score:.4f} "
+                      f"rounds={row['rounds']:>4} wall={row['wall_s']:.1f}s")
+    total_s = time.perf_counter() - t0
+
+    # only finished trials are ranked; pruned ones are listed apart with their score at the prune
+    leaderboard = sorted((r for r in rows if r["status"] == "complete"), key=lambda r: (-r[metric], r["trial"]))
+    pruned = sorted((r for r in rows if r["status"] == "pruned"), key=lambda r: r["trial"])
+    report = {
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "metric": metric,
+        "n_trials": n_trials,
+        "workers": workers,
+        "threads_per_trial": tune_cfg["threads_per_trial"],
+        "search_wall_s": total_s,
+        "dataset": {k: data_info[k] for k in ("train_rows", "val_rows", "categorical_encoding", "build_s")},
+        "best_params": leaderboard[0]["params"] if leaderboard else None,
+        "leaderboard": leaderboard,
+        "pruned": pruned,
+    }
+    os.makedirs(reports_dir, exist_ok=True)
+    out_path = os.path.join(reports_dir, "tuning_leaderboard.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ {n_trials} trials ({len(pruned)} pruned) in {total_s:.1f}s; leaderboard: {out_path}")
+    if leaderboard:
+        print(f"🏆 Best {metric}={leaderboard[0][metric]:.4f}: {leaderboard[0]['params']}")
+    else:
+        print("⚠️ Every trial was pruned; no best parameters")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", required=True)
+    ap.add_argument("--rebuild", action="store_true", help="rebuild the binned Datasets even if up to date")
+    args = ap.parse_args()
+    main(args.config, args.rebuild)
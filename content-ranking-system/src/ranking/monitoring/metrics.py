@@ -0,0 +1,224 @@
+"""
+In-process counters and fixed-bucket histograms rendered in the Prometheus text format.
+
+Recording is a bucket search plus a few increments under a per-series lock; nothing is
+aggregated or formatted until /metrics is scraped.
+"""
+from __future__ import annotations
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# seconds: a sub-millisecond predict up to a cold model / catalog load
+LATENCY_BUCKETS_S = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+COUNT_BUCKETS = [1, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+class CounterSeries:
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+class HistogramSeries:
+    def __init__(self, bounds: List[float]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot: above the largest bound (+Inf)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> "_Timer":
+        """Observe the wall time (seconds) of a with-block, also when it raises."""
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+class _Timer:
+    __slots__ = ("series", "t0")
+
+    def __init__(self, series: HistogramSeries) -> None:
+        self.series = series
+
+    def __enter__(self) -> None:
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.series.observe(time.perf_counter() - self.t0)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """The series for these label values (created on first use; cache it on hot paths)."""
+        series = self._series.get(values)  # fast path: label values passed as str
+        if series is None:
+            key = tuple(str(v) for v in values)
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._series.items())
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_series(self) -> CounterSeries:
+        return CounterSeries()
+
+    def inc(self, *values: str, amount: float = 1.0) -> None:
+        self.labels(*values).inc(amount)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, s in self._items():
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_fmt(s.value)}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS_S) -> None:
+        super().__init__(name, help, labelnames)
+        self.bounds = sorted(float(b) for b in buckets if b != math.inf)
+
+    def _new_series(self) -> HistogramSeries:
+        return HistogramSeries(self.bounds)
+
+    def observe(self, value: float, *values: str) -> None:
+        self.labels(*values).observe(value)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, s in self._items():
+            counts, total, n = s.snapshot()
+            cumulative = 0
+            for ub, c in zip(self.bounds + [math.inf], counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _fmt(ub))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {repr(float(total))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+class Gauge(_Metric):
+    """Read at scrape time from a callback: fn() -> {label values tuple: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Dict[Tuple[str, ...], float]], labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, v in sorted(self.fn().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_fmt(v)}")
+        return lines
+
+class MetricsRegistry:
+    """Named metrics of one process; counter()/histogram()/gauge() return the existing metric on repeat calls."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.setdefault(metric.name, metric)
+        if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+            raise ValueError(f"Metric {metric.name} already registered as {existing.kind}{existing.labelnames}")
+        return existing
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_add(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS_S) -> Histogram:
+        return self._get_or_add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], Dict[Tuple[str, ...], float]], labelnames: Sequence[str] = ()) -> Gauge:
+        with self._lock:
+            self._metrics[name] = Gauge(name, help, fn, labelnames)  # latest callback wins
+        return self._metrics[name]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = [self._metrics[k] for k in sorted(self._metrics)]
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+_METRICS = MetricsRegistry()
+
+def get_metrics() -> MetricsRegistry:
+    return _METRICS
+
+# Serving metrics shared by the API, the ranker and the registry
+STAGE_SECONDS = _METRICS.histogram(
+    "ranking_stage_seconds", "Wall time of one ranking stage (per call; batched stages once per batch).", ["stage"],
+)
+REQUEST_SECONDS = _METRICS.histogram(
+    "ranking_request_seconds", "End-to-end HTTP request time by endpoint and status code.", ["endpoint", "status"],
+)
+CANDIDATES = _METRICS.histogram(
+    "ranking_candidates_per_request", "Candidates scored per ranking request.", buckets=COUNT_BUCKETS,
+)
+BATCH_SIZE = _METRICS.histogram(
+    "ranking_batch_size", "Requests per scoring batch.", buckets=COUNT_BUCKETS,
+)
+ERRORS = _METRICS.counter(
+    "ranking_errors_total", "Failed requests by endpoint and error type.", ["endpoint", "type"],
+)
+RESPONSE_CACHE = _METRICS.counter(
+    "ranking_response_cache_total", "Ranked-response cache events (hit, miss, expired, invalidated, evicted).", ["event"],
+)
+SHADOW_REQUESTS = _METRICS.counter(
+    "ranking_shadow_requests_total", "Requests handed to the shadow model (scored, dropped, error).", ["event"],
+)
+
+def stage(name: str) -> HistogramSeries:
+    """The ranking_stage_seconds series of one stage: `with stage("predict").time(): ...`"""
+    return STAGE_SECONDS.labels(name)
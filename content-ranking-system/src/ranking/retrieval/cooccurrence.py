@@ -0,0 +1,209 @@
+"""
+First-stage candidate retrieval: item-to-item co-occurrence over users' engaged items,
+blended with item popularity.
+
+    python -m src.ranking.retrieval.cooccurrence --config configs/ranker.yaml
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import yaml
+
+from src.ranking.data.interaction_store import read_interactions
+from src.ranking.data.negative_sampling import build_item_popularity
+
+INDEX_DIR = "retrieval"
+INDEX_FILE = "cooccurrence_index.npz"
+INDEX_META_FILE = "cooccurrence_meta.json"
+
+@dataclass
+class RetrievalConfig:
+    min_label: int = 1              # interactions that count as engagement
+    max_items_per_user: int = 200   # most recent engaged items per user (bounds the O(items^2) pairs)
+    max_neighbors: int = 100        # neighbors kept per item
+    pop_weight: float = 0.05        # popularity blend (popularity is scaled to max 1)
+    n_candidates: int = 300
+    history_items: int = 20         # recent items a request retrieves from
+
+    @classmethod
+    def from_cfg(cls, cfg: dict) -> "RetrievalConfig":
+        r = cfg.get("retrieval", {})
+        d = cls()
+        return cls(
+            min_label=int(r.get("min_label", d.min_label)),
+            max_items_per_user=int(r.get("max_items_per_user", d.max_items_per_user)),
+            max_neighbors=int(r.get("max_neighbors", d.max_neighbors)),
+            pop_weight=float(r.get("pop_weight", d.pop_weight)),
+            n_candidates=int(r.get("n_candidates", d.n_candidates)),
+            history_items=int(r.get("history_items", d.history_items)),
+        )
+
+class CooccurrenceIndex:
+    """
+    Sparse item x item similarity (top max_neighbors per row) plus a popularity prior.
+    retrieve() sums the neighbor rows of a user's recent items and adds pop_weight * popularity,
+    so users without history get the most popular items.
+    """
+
+    def __init__(self, item_ids: np.ndarray, neighbors: sp.csr_matrix, popularity: np.ndarray, pop_weight: float):
+        self.item_ids = np.asarray(item_ids)
+        self.neighbors = neighbors.tocsr()
+        self.popularity = np.asarray(popularity, dtype=np.float64)
+        self.pop_weight = float(pop_weight)
+        self.index: Dict[str, int] = {str(it): i for i, it in enumerate(self.item_ids)}
+        top = self.popularity.max() if len(self.popularity) else 0.0
+        self._prior = self.pop_weight * (self.popularity / top if top > 0 else self.popularity)
+
+    @property
+    def n_items(self) -> int:
+        return len(self.item_ids)
+
+    def scores(self, recent_items: Iterable[str]) -> np.ndarray:
+        codes = [self.index[it] for it in recent_items if it in self.index]
+        out = self._prior.copy()
+        if codes:
+            out += np.asarray(self.neighbors[codes].sum(axis=0)).ravel()
+        return out
+
+    def retrieve(self, recent_items: Iterable[str], n: int, exclude: Iterable[str] = ()) -> List[str]:
+        """Top-n item ids for a user whose recent engaged items are `recent_items`."""
+        recent_items = list(recent_items)
+        s = self.scores(recent_items)
+        drop = [self.index[it] for it in exclude if it in self.index]
+        s[drop] = -np.inf
+        n = min(int(n), self.n_items - len(set(drop)))
+        if n <= 0:
+            return []
+        top = np.argpartition(-s, n - 1)[:n]
+        top = top[np.argsort(-s[top], kind="stable")]
+        return [str(x) for x in self.item_ids[top]]
+
+    def save(self, path: str, meta: Optional[dict] = None) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.{os.getpid()}.npz"
+        np.savez(
+            tmp,
+            item_ids=self.item_ids.astype(str),
+            indptr=self.neighbors.indptr,
+            indices=self.neighbors.indices,
+            data=self.neighbors.data,
+            popularity=self.popularity,
+            pop_weight=np.array(self.pop_weight),
+        )
+        os.replace(tmp, path)
+        if meta is not None:
+            with open(os.path.join(os.path.dirname(path), INDEX_META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "CooccurrenceIndex":
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Missing retrieval index: {path}. Run src.ranking.retrieval.cooccurrence first.")
+        with np.load(path) as z:
+            n = len(z["item_ids"])
+            neighbors = sp.csr_matrix((z["data"], z["indices"], z["indptr"]), shape=(n, n))
+            return cls(z["item_ids"], neighbors, z["popularity"], float(z["pop_weight"]))
+
+def _top_k_rows(m: sp.csr_matrix, k: int) -> sp.csr_matrix:
+    """Keep the k largest entries of every row."""
+    m = m.tocsr()
+    m.sort_indices()
+    counts = np.diff(m.indptr)
+    if counts.max(initial=0) <= k:
+        return m
+    keep = np.ones(m.nnz, dtype=bool)
+    for r in np.flatnonzero(counts > k):
+        s, e = m.indptr[r], m.indptr[r + 1]
+        row = m.data[s:e]
+        drop = np.argpartition(-row, k)[k:]
+        keep[s + drop] = False
+    rows = np.repeat(np.arange(m.shape[0]), counts)[keep]
+    return sp.csr_matrix((m.data[keep], (rows, m.indices[keep])), shape=m.shape)
+
+def build_cooccurrence_index(interactions: pd.DataFrame, rcfg: RetrievalConfig = RetrievalConfig()) -> CooccurrenceIndex:
+    """
+    Cosine co-occurrence of items engaged by the same user:
+    sim(i, j) = |users(i) & users(j)| / sqrt(|users(i)| * |users(j)|), top max_neighbors per item.
+    Items only seen without engagement are still retrievable through the popularity prior.
+    """
+    pop = build_item_popularity(interactions)
+    item_ids = pop.index.to_numpy().astype(str)
+    item_codes = pd.Index(item_ids)
+
+    pos = interactions[interactions["label"] >= rcfg.min_label]
+    if "timestamp" in pos.columns:
+        pos = pos.sort_values("timestamp", kind="stable")
+    pos = pos.drop_duplicates(subset=["user_id", "item_id"], keep="last")
+    pos = pos.groupby("user_id", sort=False).tail(rcfg.max_items_per_user)
+
+    u_codes, _ = pd.factorize(pos["user_id"])
+    i_codes = item_codes.get_indexer(pos["item_id"].astype(str))
+    n_users = int(u_codes.max()) + 1 if len(u_codes) else 0
+    ui = sp.csr_matrix((np.ones(len(pos), dtype=np.float32), (u_codes, i_codes)), shape=(n_users, len(item_ids)))
+
+    co = (ui.T @ ui).tocsr()
+    deg = co.diagonal().astype(np.float64)
+    co.setdiag(0)
+    co.eliminate_zeros()
+    coo = co.tocoo()
+    norm = np.sqrt(deg[coo.row] * deg[coo.col])
+    sim = sp.csr_matrix((coo.data / norm, (coo.row, coo.col)), shape=co.shape)
+    return CooccurrenceIndex(item_ids, _top_k_rows(sim, rcfg.max_neighbors), pop.to_numpy(), rcfg.pop_weight)
+
+def recent_items_by_user(interactions: pd.DataFrame, n: int, min_label: int = 1) -> Dict[str, List[str]]:
+    """Each user's last n engaged items (oldest first), as the online store keeps them."""
+    pos = interactions[interactions["label"] >= min_label].sort_values("timestamp", kind="stable")
+    tail = pos.groupby("user_id", sort=False).tail(n)
+    return {str(u): g.astype(str).tolist() for u, g in tail.groupby("user_id", sort=False)["item_id"]}
+
+_cache_lock = threading.Lock()
+_cache: Dict[str, Tuple[int, CooccurrenceIndex]] = {}
+
+def get_index(path: str) -> CooccurrenceIndex:
+    """Process-wide cached index; reloaded when the file changes on disk."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Missing retrieval index: {path}. Run src.ranking.retrieval.cooccurrence first.")
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, CooccurrenceIndex.load(path))
+            _cache[path] = cached
+    return cached[1]
+
+def main(config_path: str) -> None:
+    with open(config_path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    rcfg = RetrievalConfig.from_cfg(cfg)
+    interactions = read_interactions(cfg["paths"]["raw_dir"], columns=["user_id", "item_id", "timestamp", "label"])
+    index = build_cooccurrence_index(interactions, rcfg)
+
+    path = os.path.join(cfg["paths"]["artifacts_models"], INDEX_DIR, INDEX_FILE)
+    meta = {
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "n_items": index.n_items,
+        "nnz": int(index.neighbors.nnz),
+        "interactions": int(len(interactions)),
+        "data_end": str(interactions["timestamp"].max()),
+        **rcfg.__dict__,
+    }
+    index.save(path, meta)
+    print(f"✅ Saved retrieval index: {path} ({index.n_items} items, {index.neighbors.nnz} neighbor links)")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", required=True)
+    args = ap.parse_args()
+    main(args.config)
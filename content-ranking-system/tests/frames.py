@@ -0,0 +1,51 @@
+"""Synthetic frames shared by several test modules."""
+import numpy as np
+import pandas as pd
+
+def train_frame() -> pd.DataFrame:
+    """Feature-joined ranking rows with every encoder input column."""
+    rng = np.random.default_rng(0)
+    n = 200
+    df = pd.DataFrame({
+        "user_id": rng.choice(["u1", "u2", "u3"], n),
+        "session_id": rng.choice(["s1", "s2"], n),
+        "device": rng.choice(["tv", "web", "mobile"], n),
+        "item_id": rng.choice(["i1", "i2", "i3", "i4"], n),
+        "is_negative": rng.integers(0, 2, n),
+        "age_bucket": rng.choice(["18-24", "25-34"], n),
+        "country": rng.choice(["US", "IN"], n),
+        "is_kids_profile": rng.integers(0, 2, n),
+        "genre": rng.choice(["Drama", "Kids", "Doc"], n),
+        "maturity": rng.choice(["G", "R"], n),
+        "release_year": rng.integers(1990, 2025, n),
+        "runtime_min": rng.integers(20, 160, n),
+        "u_watch_mins_30d": rng.random(n),
+        "u_plays_30d": rng.random(n),
+        "u_clicks_30d": rng.random(n),
+        "u_play_rate_30d": rng.random(n),
+        "i_watch_mins_30d": rng.random(n),
+        "i_plays_30d": rng.random(n),
+        "i_clicks_30d": rng.random(n),
+        "i_play_rate_30d": rng.random(n),
+        "hour": rng.integers(0, 24, n),
+        "day_of_week": rng.integers(0, 7, n),
+        "is_prime_time": rng.integers(0, 2, n),
+        "is_weekend": rng.integers(0, 2, n),
+        "item_age": rng.integers(0, 30, n),
+        "is_kids_content": rng.integers(0, 2, n),
+        "kids_mismatch": rng.integers(0, 2, n),
+    })
+    return df
+
+def interaction_log(n: int = 3000, seed: int = 0) -> pd.DataFrame:
+    """90 days of random interactions over 40 users and 25 items."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2025-01-01").value // 10**9
+    ts = rng.integers(start, start + 90 * 86400, n)
+    return pd.DataFrame({
+        "user_id": rng.choice([f"u{i}" for i in range(40)], n),
+        "item_id": rng.choice([f"i{i}" for i in range(25)], n),
+        "timestamp": pd.to_datetime(ts, unit="s"),
+        "label": rng.integers(0, 4, n),
+        "watch_minutes": rng.integers(0, 60, n),
+    })
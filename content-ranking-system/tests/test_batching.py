@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from src.ranking.api.batching import BatcherConfig, QueueFullError, RankBatcher
+
+class RecordingScorer:
+    """score_fn that records every batch; payload "bad" makes the whole call fail, like a poisoned request."""
+    def __init__(self, gate: threading.Event = None):
+        self.batches = []
+        self.gate = gate
+
+    def __call__(self, payloads):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(list(payloads))
+        if "bad" in payloads:
+            raise ValueError("bad payload")
+        return [f"r-{p}" for p in payloads]
+
+def _run(coro_fn, scorer, **cfg):
+    async def main():
+        batcher = RankBatcher(scorer, BatcherConfig(**cfg))
+        await batcher.start()
+        try:
+            return await coro_fn(batcher)
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+def test_window_coalesces_requests_and_slices_results():
+    scorer = RecordingScorer()
+    async def go(b):
+        return await asyncio.gather(*[b.submit(p) for p in ["a", "b", "c"]]), b.stats()
+    results, stats = _run(go, scorer, window_ms=50, max_batch_size=64)
+    assert results == ["r-a", "r-b", "r-c"]
+    assert scorer.batches == [["a", "b", "c"]]
+    assert stats["batches"] == 1
+
+def test_max_batch_size_flushes_before_window():
+    scorer = RecordingScorer()
+    async def go(b):
+        t0 = time.perf_counter()
+        res = await asyncio.gather(*[b.submit(i) for i in range(4)])
+        return res, time.perf_counter() - t0
+    results, elapsed = _run(go, scorer, window_ms=5000, max_batch_size=2)
+    assert results == [f"r-{i}" for i in range(4)]
+    assert [len(x) for x in scorer.batches] == [2, 2]
+    assert elapsed < 2.0
+
+def test_full_queue_rejects_and_app_maps_it_to_503(monkeypatch):
+    gate = threading.Event()
+    scorer = RecordingScorer(gate)
+    async def go(b):
+        first = asyncio.ensure_future(b.submit("a"))
+        await asyncio.sleep(0.05)  # the worker holds "a" inside score_fn
+        queued = asyncio.ensure_future(b.submit("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await b.submit("c")
+        gate.set()
+        return await asyncio.gather(first, queued), b.stats()["rejected"]
+    results, rejected = _run(go, scorer, window_ms=1, max_batch_size=1, max_queue_depth=1)
+    assert results == ["r-a", "r-b"] and rejected == 1
+
+    from src.ranking.api import app as api
+    class FullBatcher:
+        async def submit(self, payload):
+            raise QueueFullError("Rank queue full")
+    class Registry:
+        def route(self, paths, user_id):
+            return "control", type("Model", (), {"version": "v1"})
+    class Snap:
+        signature = "s"
+    monkeypatch.setattr(api, "batcher", FullBatcher())
+    monkeypatch.setattr(api, "get_registry", Registry)
+    monkeypatch.setattr(api.response_cache, "max_bytes", 0)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(api._score_cached("u1", ["i1"], {"user_id": "u1"}, [{"item_id": "i1"}], {}, Snap()))
+    assert e.value.status_code == 503
+
+def test_cancelled_request_is_not_scored():
+    gate = threading.Event()
+    scorer = RecordingScorer(gate)
+    async def go(b):
+        first = asyncio.ensure_future(b.submit("a"))
+        await asyncio.sleep(0.05)
+        dropped = asyncio.ensure_future(b.submit("gone"))
+        kept = asyncio.ensure_future(b.submit("b"))
+        await asyncio.sleep(0)
+        dropped.cancel()
+        gate.set()
+        return await asyncio.gather(first, kept)
+    assert _run(go, scorer, window_ms=20, max_batch_size=8) == ["r-a", "r-b"]
+    assert all("gone" not in batch for batch in scorer.batches)
+
+def test_failing_request_only_fails_itself():
+    scorer = RecordingScorer()
+    async def go(b):
+        return await asyncio.gather(*[b.submit(p) for p in ["a", "bad", "c"]], return_exceptions=True), b.stats()
+    (a, bad, c), stats = _run(go, scorer, window_ms=50, max_batch_size=64)
+    assert (a, c) == ("r-a", "r-c")
+    assert isinstance(bad, ValueError)
+    assert scorer.batches[0] == ["a", "bad", "c"]
+    assert (stats["errors"], stats["fallbacks"]) == (1, 1)
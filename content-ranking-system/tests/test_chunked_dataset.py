@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import yaml
+from src.ranking.models.chunked_dataset import ParquetChunkSequence, group_sizes_streaming, iter_row_groups, write_split_parquet
+from src.ranking.features.categorical import FrameEncoder
+from src.ranking.data.generate_interactions import main as generate_main
+from src.ranking.data.splits import Splits
+from src.ranking.data.stage_cache import StageCache
+from src.ranking.models.train_ltr import _build_group_sizes, build_pipeline, write_streaming_splits
+from src.ranking.inference.encoder import CAT_COLS
+from tests.frames import train_frame
+
+def test_chunked_split_matches_in_memory_encoding(tmp_path):
+    df = train_frame()
+    df["label"] = np.arange(len(df)) % 3
+    path = str(tmp_path / "train.parquet")
+    write_split_parquet(df, path, chunk_rows=17)  # groups straddle row-group boundaries
+
+    columns = [c for c in df.columns if c != "label"]
+    enc = FrameEncoder.fit_chunks(iter_row_groups(path, columns=CAT_COLS), CAT_COLS, {}, columns=columns)
+    seq = ParquetChunkSequence(path, enc)
+
+    ordered = df.sort_values(["user_id", "session_id"], kind="stable")
+    expected = pd.get_dummies(ordered[columns], columns=CAT_COLS, dummy_na=True)
+    assert enc.features == list(expected.columns)
+    np.testing.assert_array_equal(seq[0:len(seq)], expected.to_numpy(dtype=np.float32))
+    np.testing.assert_array_equal(seq[5], expected.to_numpy(dtype=np.float32)[5].astype(np.float64))
+    np.testing.assert_array_equal(group_sizes_streaming(path), _build_group_sizes(ordered[["user_id", "session_id"]]))
+
+def test_streaming_splits_match_in_memory_point_in_time_features(tmp_path):
+    cfg = {
+        "project": {"seed": 7},
+        "paths": {"raw_dir": str(tmp_path / "raw")},
+        "data_gen": {"n_users": 40, "n_items": 30, "n_interactions": 4000, "n_sessions": 100,
+                     "start_date": "2025-01-01", "end_date": "2025-02-28"},
+        "negative_sampling": {"negatives_per_positive": 2, "sampling_strategy": "popularity"},
+        "features": {"history_window_days": 7, "aggregate_windows_days": [3, 7], "point_in_time": True},
+        "splits": {"strategy": "time", "train_frac": 0.7, "val_frac": 0.15, "test_frac": 0.15},
+        "training": {"data_start": "2025-01-20 12:00", "chunk_days": 4},
+    }
+    (tmp_path / "cfg.yaml").write_text(yaml.safe_dump(cfg))
+    generate_main(str(tmp_path / "cfg.yaml"))
+    paths = [(n, str(tmp_path / f"{n}.parquet")) for n in ("train", "val", "test")]
+    written = write_streaming_splits(cfg, 7, paths, chunk_rows=50)
+
+    stages = build_pipeline(cfg, 7, StageCache(str(tmp_path / "cache"), enabled=False))
+    sp = Splits(**stages["split"].value)
+    streamed = {n: pd.read_parquet(p) for n, p in paths}
+    assert written["rows"] == {n: len(df) for n, df in streamed.items()}
+    assert streamed["train"]["timestamp"].max() <= streamed["val"]["timestamp"].min()
+    assert streamed["val"]["timestamp"].max() <= streamed["test"]["timestamp"].min()
+
+    def positives(df):
+        df = df[df["label"] > 0]
+        return df.sort_values(["timestamp", "user_id", "session_id", "item_id"], kind="stable").reset_index(drop=True)
+    a, b = positives(sp.frame), positives(pd.concat(streamed.values()))
+    assert list(a.columns) == list(b.columns)
+    assert a["timestamp"].min() >= pd.Timestamp("2025-01-20 12:00")
+    pd.testing.assert_frame_equal(a, b, check_dtype=False)
@@ -0,0 +1,51 @@
+import numpy as np
+import lightgbm as lgb
+from src.ranking.inference.compiled_forest import compile_booster
+from src.ranking.models.registry import RegistryPaths, load_compiled, load_model, save_model
+
+def _mixed_data(rng, n):
+    # feature 1 categorical, NaNs in 0 and 1, exact zeros in 2
+    X = rng.normal(size=(n, 5))
+    X[:, 1] = rng.integers(-2, 14, n)
+    X[rng.random(n) < 0.15, 0] = np.nan
+    X[rng.random(n) < 0.05, 1] = np.nan
+    X[rng.random(n) < 0.2, 2] = 0.0
+    return X
+
+def _booster(zero_as_missing=False, rounds=30):
+    rng = np.random.default_rng(0)
+    X = _mixed_data(rng, 3000)
+    X[:, 1] = np.clip(X[:, 1], 0, None)
+    y = (X[:, 1] % 3 == 0) * 1 + (np.nan_to_num(X[:, 0]) > 0) + (X[:, 2] > 0.3)
+    params = {"objective": "lambdarank", "num_leaves": 15, "min_data_in_leaf": 5,
+              "zero_as_missing": zero_as_missing, "verbosity": -1}
+    return lgb.train(params, lgb.Dataset(X, label=y, group=[30] * 100, categorical_feature=[1]), rounds)
+
+def test_compiled_scores_match_booster():
+    X = _mixed_data(np.random.default_rng(1), 500)
+    for zero_as_missing in (False, True):
+        booster = _booster(zero_as_missing)
+        forest = compile_booster(booster)
+        assert forest.cat_bitsets.shape[0] > 0
+        np.testing.assert_allclose(forest.predict(X), booster.predict(X), rtol=0, atol=1e-9)
+        np.testing.assert_allclose(compile_booster(booster, 10).predict(X), booster.predict(X, num_iteration=10),
+                                   rtol=0, atol=1e-9)
+    # numeric-only forest on NaN-free rows takes the plain threshold path
+    X_num = np.nan_to_num(X)
+    booster = lgb.train({"objective": "lambdarank", "verbosity": -1},
+                        lgb.Dataset(X_num, label=(X_num[:, 0] > 0) * 2, group=[50] * 10), 20)
+    np.testing.assert_allclose(compile_booster(booster).predict(X_num), booster.predict(X_num), rtol=0, atol=1e-9)
+
+def test_registry_exports_and_validates_compiled_forest(tmp_path):
+    booster = _booster(rounds=20)
+    X = _mixed_data(np.random.default_rng(2), 200)
+    paths = RegistryPaths(models_dir=str(tmp_path))
+    save_model(booster, {"best_iteration": 12}, paths)
+    model, meta = load_model(paths)
+    forest = load_compiled(model, meta, paths)
+    assert forest.n_trees == 12
+    np.testing.assert_allclose(forest.predict(X), booster.predict(X, num_iteration=12), rtol=0, atol=1e-9)
+
+    # an export from another model is ignored and the served booster is compiled instead
+    compile_booster(_booster(rounds=5), digest="stale").save(paths.resolve().compiled_path)
+    assert load_compiled(model, meta, paths).n_trees == 12
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+from src.ranking.features.categorical import encode_native, fit_categorical_spec
+from src.ranking.inference.encoder import FeatureEncoder, CAT_COLS
+from tests.frames import train_frame
+
+def _train_features():
+    return list(pd.get_dummies(train_frame(), columns=CAT_COLS, dummy_na=True).columns)
+
+def _online_rows(user_row, item_rows, context):
+    # the per-request DataFrame + get_dummies + reindex path the encoder replaces
+    rows = []
+    for it in item_rows:
+        row = {}
+        row.update(user_row)
+        row.update(it)
+        row.update({
+            "device": context.get("device", "tv"),
+            "hour": int(context.get("hour", 20)),
+            "day_of_week": int(context.get("day_of_week", 2)),
+            "is_prime_time": int(1 if 19 <= int(context.get("hour", 20)) <= 23 else 0),
+            "is_weekend": int(1 if int(context.get("day_of_week", 2)) in [5, 6] else 0),
+        })
+        row["item_age"] = int(context.get("current_year", 2026)) - int(row.get("release_year", 2020))
+        row["is_kids_content"] = int(1 if row.get("genre") == "Kids" else 0)
+        row["kids_mismatch"] = int(1 if int(row.get("is_kids_profile", 0)) == 1 and row.get("genre") != "Kids" else 0)
+        for c in ["u_watch_mins_30d", "u_plays_30d", "u_clicks_30d", "u_play_rate_30d",
+                  "i_watch_mins_30d", "i_plays_30d", "i_clicks_30d", "i_play_rate_30d"]:
+            row.setdefault(c, 0.0)
+        row.setdefault("session_id", context.get("session_id", "s_online"))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def _reference(user_row, item_rows, context, feature_cols):
+    x = pd.get_dummies(_online_rows(user_row, item_rows, context), columns=CAT_COLS, dummy_na=True)
+    return x.reindex(columns=feature_cols, fill_value=0).to_numpy(dtype=np.float32)
+
+USER = {"user_id": "u2", "age_bucket": "25-34", "country": "BR", "is_kids_profile": 1, "u_plays_30d": 3.0}
+ITEMS = [
+    {"item_id": "i1", "genre": "Kids", "maturity": "G", "release_year": 2001, "runtime_min": 90},
+    {"item_id": "i9", "genre": "Drama", "maturity": "R", "release_year": 2019, "runtime_min": 45, "i_clicks_30d": 7.0},
+    {"item_id": "i3", "genre": "Doc", "maturity": "PG", "release_year": 2024, "runtime_min": 120},
+]
+CONTEXTS = [{"device": "web", "hour": 21, "day_of_week": 6, "session_id": "s2"},
+            {"device": "console", "hour": 8, "day_of_week": 1}]
+
+def test_encoder_matches_get_dummies_reindex():
+    feature_cols = _train_features()
+    enc = FeatureEncoder(feature_cols)
+    for ctx in CONTEXTS:
+        expected = _reference(USER, ITEMS, ctx, feature_cols)
+        # twice: second call goes through the cached item blocks
+        np.testing.assert_array_equal(enc.transform(USER, ITEMS, ctx), expected)
+        np.testing.assert_array_equal(enc.transform(USER, ITEMS, ctx), expected)
+
+def test_encoder_matches_native_codes():
+    train = train_frame()
+    # item_id has 4 distinct values > max_categories: hashed or dropped
+    for strategy in ("hash", "drop"):
+        spec = fit_categorical_spec(train, CAT_COLS, max_categories=3, high_cardinality=strategy, hash_buckets=16)
+        feature_cols = list(encode_native(train, spec).columns)
+        meta = {"features": feature_cols, "categorical_encoding": "native", "categorical_spec": spec}
+        enc = FeatureEncoder.from_meta(meta)
+        for ctx in CONTEXTS:
+            x = encode_native(_online_rows(USER, ITEMS, ctx), spec)
+            expected = x.reindex(columns=feature_cols, fill_value=0).to_numpy(dtype=np.float32)
+            np.testing.assert_array_equal(enc.transform(USER, ITEMS, ctx), expected)
@@ -19,3 +19,20 @@ def test_group_eval_runs():
     })
     out = evaluate_ranking(df, "score", k=3)
     assert "NDCG@3" in out and "MAP@3" in out
+
+def test_vectorized_eval_matches_per_group_functions():
+    rng = np.random.default_rng(0)
+    n = 600
+    df = pd.DataFrame({
+        "user_id": rng.choice(["u1", "u2", "u3", "u4"], n),
+        "session_id": rng.choice(["s1", "s2", "s3", "s4", "s5"], n),
+        "label": rng.choice([0, 0, 0, 1, 2, 3], n),
+        "score": rng.random(n),
+    })
+    out = evaluate_ranking(df, "score", k=[1, 5, 20])
+    groups = [g.sort_values("score", ascending=False)["label"].to_numpy() for _, g in df.groupby(["user_id", "session_id"])]
+    assert out["num_groups"] == len(groups)
+    for k in (1, 5, 20):
+        assert np.isclose(out[f"NDCG@{k}"], np.mean([ndcg_at_k(r, k) for r in groups]))
+        assert np.isclose(out[f"MAP@{k}"], np.mean([map_at_k(r, k) for r in groups]))
+        assert np.isclose(out[f"Recall@{k}"], np.mean([(r[:k] > 0).sum() / max(1, (r > 0).sum()) for r in groups]))
@@ -0,0 +1,32 @@
+import pytest
+from src.ranking.monitoring.metrics import MetricsRegistry
+
+def test_histogram_and_counter_render_prometheus_text():
+    reg = MetricsRegistry()
+    h = reg.histogram("t_seconds", "Stage time.", ["stage"], buckets=[0.01, 0.1, 1.0])
+    for v in (0.005, 0.01, 0.5, 3.0):
+        h.labels("predict").observe(v)
+    with h.labels('enc"ode').time():
+        pass
+    reg.counter("t_errors_total", "Errors.", ["type"]).inc("unknown_id", amount=2)
+
+    lines = reg.render().splitlines()
+    assert "# TYPE t_seconds histogram" in lines
+    assert 't_seconds_bucket{stage="predict",le="0.01"} 2' in lines  # upper bounds are inclusive
+    assert 't_seconds_bucket{stage="predict",le="1"} 3' in lines
+    assert 't_seconds_bucket{stage="predict",le="+Inf"} 4' in lines
+    assert 't_seconds_count{stage="predict"} 4' in lines
+    assert 't_seconds_sum{stage="predict"} 3.515' in lines
+    assert 't_seconds_count{stage="enc\\"ode"} 1' in lines
+    assert 't_errors_total{type="unknown_id"} 2' in lines
+
+def test_registry_reuses_metrics_and_checks_labels():
+    reg = MetricsRegistry()
+    a = reg.counter("c_total", "C.", ["endpoint"])
+    assert reg.counter("c_total", "C.", ["endpoint"]) is a
+    with pytest.raises(ValueError):
+        reg.histogram("c_total", "C.", ["endpoint"])
+    with pytest.raises(ValueError):
+        a.inc("/rank", "extra")
+    reg.gauge("g", "G.", lambda: {("v1",): 1}, ["version"])
+    assert 'g{version="v1"} 1' in reg.render().splitlines()
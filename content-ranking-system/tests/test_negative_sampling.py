@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+from src.ranking.data.negative_sampling import NegativeSampler, build_alias_table, make_ranking_dataset
+
+def test_alias_table_matches_distribution():
+    probs = np.array([0.5, 0.25, 0.125, 0.125, 0.0])
+    accept, alias = build_alias_table(probs)
+    # probability mass carried by each slot (accept) plus what aliases redirect to it
+    mass = accept.copy()
+    np.add.at(mass, alias, 1.0 - accept)
+    np.testing.assert_allclose(mass / len(probs), probs)
+
+def test_sampler_excludes_history_and_is_deterministic():
+    items = np.array([f"i{j}" for j in range(20)])
+    pop = pd.Series(np.r_[np.full(5, 10.0), np.ones(15)], index=items) / 65.0
+    users = np.repeat(np.arange(3), [8, 8, 12])
+    seen = np.r_[np.arange(8), np.arange(4, 12), np.arange(12)]  # user 2 has most of the popular head
+    for strategy in ("uniform", "popularity"):
+        sampler = NegativeSampler(items, strategy=strategy, item_pop=pop)
+        sampler.set_history(users, seen)
+        a = sampler.sample(np.array([0, 1, 2, 2]), 50, np.random.default_rng(7))
+        b = sampler.sample(np.array([0, 1, 2, 2]), 50, np.random.default_rng(7))
+        np.testing.assert_array_equal(a, b)
+        for row, u in zip(a, [0, 1, 2, 2]):
+            assert not set(row) & set(seen[users == u])
+
+def test_ranking_dataset_tolerates_duplicate_catalog_ids():
+    log = pd.DataFrame({
+        "user_id": ["u1", "u1", "u2"], "session_id": ["s1", "s1", "s2"], "item_id": ["i1", "i2", "i1"],
+        "timestamp": pd.to_datetime(["2025-01-01", "2025-01-02", "2025-01-03"]), "device": "tv",
+        "label": [1, 0, 2], "watch_minutes": [0, 0, 12],
+    })
+    users = pd.DataFrame({"user_id": ["u1", "u1", "u2"], "age_bucket": ["18-24", "25-34", "35-44"]})
+    items = pd.DataFrame({"item_id": ["i1", "i2", "i3", "i3", "i4"], "genre": ["a", "b", "c", "d", "e"]})
+    ds = make_ranking_dataset(log, users, items, negatives_per_positive=2, strategy="uniform", seed=0)
+    assert len(ds) == 2 * 3
+    assert set(ds.loc[ds["user_id"] == "u1", "age_bucket"]) == {"25-34"}
+    assert "c" not in set(ds["genre"])
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from src.ranking.data.interaction_store import reset_store, write_partitioned
+from src.ranking.features.online_store import InteractionTailer, OnlineFeatureStore, StoreTailer
+from src.ranking.features.user_features import add_user_aggregate_features
+from src.ranking.features.item_features import add_item_aggregate_features
+from tests.frames import interaction_log
+
+def test_online_store_matches_offline_aggregates():
+    log = interaction_log()
+    users = pd.DataFrame({"user_id": [f"u{i}" for i in range(45)]})
+    items = pd.DataFrame({"item_id": [f"i{i}" for i in range(30)]})
+    u_off = add_user_aggregate_features(users, log, window_days=30)
+    i_off = add_item_aggregate_features(items, log, window_days=30)
+
+    bulk = OnlineFeatureStore(window_days=30)
+    bulk.ingest_frame(log)
+    streamed = OnlineFeatureStore(window_days=30)
+    for ev in log.sample(frac=1.0, random_state=1).to_dict(orient="records"):
+        streamed.ingest(ev)
+
+    for store in (bulk, streamed):
+        u_on = pd.DataFrame(store.user_features(users["user_id"].tolist()))
+        i_on = pd.DataFrame(store.item_features(items["item_id"].tolist()))
+        for c in u_on.columns:
+            np.testing.assert_allclose(u_on[c].to_numpy(), u_off[c].to_numpy(dtype=float))
+        for c in i_on.columns:
+            np.testing.assert_allclose(i_on[c].to_numpy(), i_off[c].to_numpy(dtype=float))
+
+def test_tailer_appends_and_rebuilds_on_rewrite_to_larger_file(tmp_path):
+    log = interaction_log(n=600)
+    path = tmp_path / "interactions.csv"
+    log.iloc[:200].to_csv(path, index=False)
+    store = OnlineFeatureStore(window_days=30)
+    tailer = InteractionTailer(str(path), store)
+    assert tailer.poll() == 200
+    with open(path, "a") as f:
+        log.iloc[200:300].to_csv(f, index=False, header=False)
+    assert tailer.poll() == 100 and store.generation == 0
+
+    # a new offline run rewrites the file in place with a different (and longer) log
+    other = interaction_log(n=600, seed=1)
+    other.to_csv(path, index=False)
+    assert tailer.poll() == 600
+    assert store.generation == 1
+
+    fresh = OnlineFeatureStore(window_days=30)
+    fresh.ingest_frame(other)
+    users = other["user_id"].unique().tolist()
+    assert store.user_features(users) == fresh.user_features(users)
+
+def test_store_tailer_follows_new_partitions_and_rebuilds_on_rewrite(tmp_path):
+    log = interaction_log()
+    root = str(tmp_path / "interactions_store")
+    early = log["timestamp"] < pd.Timestamp("2025-03-01")
+    write_partitioned(log[early], root, "part-00000")
+    store = OnlineFeatureStore(window_days=30)
+    tailer = StoreTailer(root, store)
+    assert 0 < tailer.poll() < early.sum()  # partitions older than the window are not read
+    write_partitioned(log[~early], root, "part-00001")
+    assert tailer.poll() == (~early).sum()
+    assert tailer.poll() == 0
+
+    users = log["user_id"].unique().tolist()
+    full = OnlineFeatureStore(window_days=30)
+    full.ingest_frame(log)
+    assert store.user_features(users) == full.user_features(users)
+
+    other = interaction_log(seed=1)
+    reset_store(root)
+    write_partitioned(other, root, "part-00000")
+    tailer.poll()
+    fresh = OnlineFeatureStore(window_days=30)
+    fresh.ingest_frame(other)
+    assert store.generation == 1
+    assert store.user_features(users) == fresh.user_features(users)
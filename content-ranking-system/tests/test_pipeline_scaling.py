@@ -0,0 +1,26 @@
+import pytest
+from src.ranking.bench.pipeline_scaling import compare_to_baseline, fit_exponent
+
+def _row(n, seconds, rss=100.0):
+    return {"n_interactions": n, "seconds": seconds, "peak_rss_mb": rss}
+
+def test_fit_exponent_recovers_power_law():
+    n = [1_000, 10_000, 100_000]
+    assert fit_exponent(n, [2e-6 * x for x in n]) == pytest.approx(1.0)
+    assert fit_exponent(n, [1e-9 * x ** 2 for x in n]) == pytest.approx(2.0)
+    assert fit_exponent([1_000], [0.5]) is None
+
+def test_compare_to_baseline_flags_slowdowns_memory_and_exponent():
+    baseline = {
+        "results": {"sample": [_row(1_000, 0.2), _row(10_000, 2.0)], "split": [_row(1_000, 0.001), _row(10_000, 0.002)]},
+        "exponents": {"sample": 1.0, "split": 0.3},
+    }
+    results = {
+        "sample": [_row(1_000, 0.21), _row(10_000, 6.0, rss=200.0)],
+        "split": [_row(1_000, 0.001), _row(10_000, 0.01)],  # 5x slower but under the noise floor
+    }
+    exponents = {"sample": fit_exponent([1_000, 10_000], [0.21, 6.0]), "split": 1.0}
+    got = compare_to_baseline(results, exponents, baseline, tolerance=0.25, min_seconds=0.05, exponent_tolerance=0.15)
+    assert {(r["stage"], r.get("n_interactions"), r["metric"]) for r in got} == {
+        ("sample", 10_000, "seconds"), ("sample", 10_000, "peak_rss_mb"), ("sample", None, "exponent"),
+    }
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from src.ranking.features.online_store import OnlineFeatureStore
+from src.ranking.features.point_in_time import add_point_in_time_aggregates
+from tests.frames import interaction_log
+
+def _brute_force(row, log, key, w):
+    day_start = row["timestamp"].normalize() - pd.Timedelta(days=w - 1)
+    ev = log[(log[key] == row[key]) & (log["timestamp"] >= day_start) & (log["timestamp"] < row["timestamp"])]
+    return ev["watch_minutes"].sum(), (ev["label"] >= 2).sum(), (ev["label"] >= 1).sum()
+
+def test_point_in_time_matches_brute_force():
+    log = interaction_log(n=800)
+    rows = log.sample(60, random_state=0).reset_index(drop=True)
+    rows.loc[0, "user_id"] = "u_unknown"
+    out = add_point_in_time_aggregates(rows, log, windows_days=[1, 7, 30])
+    for w in (1, 7, 30):
+        for key, p in [("user_id", "u"), ("item_id", "i")]:
+            expected = np.array([_brute_force(r, log, key, w) for _, r in rows.iterrows()], dtype=float)
+            got = out[[f"{p}_watch_mins_{w}d", f"{p}_plays_{w}d", f"{p}_clicks_{w}d"]].to_numpy()
+            np.testing.assert_allclose(got, expected)
+
+def test_point_in_time_matches_online_store_at_end_of_log():
+    log = interaction_log()
+    store = OnlineFeatureStore(window_days=30, extra_windows=[1, 7])
+    store.ingest_frame(log)
+    users = [f"u{i}" for i in range(40)]
+    q = pd.DataFrame({"user_id": users, "item_id": "i0", "timestamp": log["timestamp"].max() + pd.Timedelta(seconds=1)})
+    offline = add_point_in_time_aggregates(q, log, windows_days=[1, 7, 30])
+    online = pd.DataFrame(store.user_features(users))
+    for c in online.columns:
+        np.testing.assert_allclose(online[c].to_numpy(), offline[c].to_numpy())
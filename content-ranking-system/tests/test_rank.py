@@ -0,0 +1,100 @@
+import time
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+from src.ranking.inference.compiled_forest import compile_booster
+from src.ranking.inference.encoder import CAT_COLS
+from src.ranking.inference.rank import rank_candidates, rank_candidates_batch
+from src.ranking.models.registry import LoadedModel
+
+def _tiny_model() -> LoadedModel:
+    rng = np.random.default_rng(1)
+    n = 400
+    df = pd.DataFrame({
+        "user_id": rng.choice(["u1", "u2"], n),
+        "session_id": rng.choice(["s1", "s2"], n),
+        "item_id": rng.choice([f"i{i}" for i in range(8)], n),
+        "age_bucket": rng.choice(["18-24", "55+"], n),
+        "country": rng.choice(["US", "IN"], n),
+        "genre": rng.choice(["Drama", "Kids"], n),
+        "maturity": rng.choice(["G", "R"], n),
+        "device": rng.choice(["tv", "web"], n),
+        "is_kids_profile": rng.integers(0, 2, n),
+        "release_year": rng.integers(1990, 2025, n),
+        "runtime_min": rng.integers(20, 160, n),
+        "hour": rng.integers(0, 24, n),
+    })
+    X = pd.get_dummies(df, columns=CAT_COLS, dummy_na=True).astype(float)
+    y = rng.integers(0, 4, n)
+    booster = lgb.train(
+        {"objective": "lambdarank", "num_leaves": 7, "min_data_in_leaf": 5, "verbosity": -1},
+        lgb.Dataset(X, label=y, group=[20] * 20),
+        num_boost_round=20,
+    )
+    meta = {"features": list(X.columns), "best_iteration": 0}
+    return LoadedModel(booster=booster, meta=meta, version="test", signature=(), loaded_at=time.time())
+
+def test_batch_matches_single_requests():
+    model = _tiny_model()
+    items = [{"item_id": f"i{i}", "genre": ["Drama", "Kids"][i % 2], "maturity": "G",
+              "release_year": 2000 + i, "runtime_min": 60 + i} for i in range(8)]
+    requests = [
+        {"user_row": {"user_id": "u1", "age_bucket": "18-24", "country": "US", "is_kids_profile": 0},
+         "item_rows": items[:5], "context": {"device": "tv", "hour": 21}},
+        {"user_row": {"user_id": "u2", "age_bucket": "55+", "country": "IN", "is_kids_profile": 1},
+         "item_rows": items[2:], "context": {"device": "web", "hour": 9, "session_id": "s2"}},
+    ]
+    batch = rank_candidates_batch(requests, model=model)
+    single = [rank_candidates(r["user_row"], r["item_rows"], r["context"], model=model) for r in requests]
+    assert batch == single
+    assert [len(b) for b in batch] == [5, 6]
+
+def test_compiled_scorer_ranks_like_the_booster():
+    model = _tiny_model()
+    model = LoadedModel(model.booster, model.meta, model.version, model.signature, model.loaded_at,
+                        compiled=compile_booster(model.booster))
+    items = [{"item_id": f"i{i}", "genre": ["Drama", "Kids"][i % 2], "maturity": "G",
+              "release_year": 2000 + i, "runtime_min": 60 + i} for i in range(8)]
+    user = {"user_id": "u1", "age_bucket": "18-24", "country": "US", "is_kids_profile": 0}
+    context = {"device": "tv", "hour": 21}
+    got = rank_candidates(user, items, context, model=model, scorer="compiled")
+    want = rank_candidates(user, items, context, model=model)
+    assert [r["item_id"] for r in got] == [r["item_id"] for r in want]
+    np.testing.assert_allclose([r["score"] for r in got], [r["score"] for r in want], rtol=0, atol=1e-9)
+
+def test_batch_routes_per_request_models_and_feeds_the_shadow():
+    a, b = _tiny_model(), _tiny_model()
+    b = LoadedModel(b.booster, {**b.meta, "best_iteration": 5}, "b", (), b.loaded_at)
+    items = [{"item_id": f"i{i}", "genre": "Drama", "maturity": "G", "release_year": 2000 + i, "runtime_min": 60}
+             for i in range(6)]
+    requests = [{"user_row": {"user_id": f"u{k}", "country": "US"}, "item_rows": items[k:], "context": {"hour": k}}
+                for k in range(4)]
+    models = [a, b, a, b]
+
+    class Sink:
+        def submit(self, model, reqs, scores, versions, X):
+            self.job = (model, reqs, scores, versions, X)
+
+    sink = Sink()
+    got = rank_candidates_batch(requests, models=models, shadow_model=b, shadow=sink)
+    assert got == [rank_candidates(r["user_row"], r["item_rows"], r["context"], model=m) for r, m in zip(requests, models)]
+    # both models share a layout: one matrix, grouped by model, handed to the shadow as is
+    _, reqs, scores, versions, X = sink.job
+    assert versions == ["test", "test", "b", "b"]
+    assert [r["user_row"]["user_id"] for r in reqs] == ["u0", "u2", "u1", "u3"]
+    assert X.shape[0] == sum(len(s) for s in scores) == 6 + 4 + 5 + 3
+
+def test_models_with_another_feature_layout_are_encoded_separately():
+    a = _tiny_model()
+    c = LoadedModel(a.booster, {**a.meta, "features": a.meta["features"][::-1]}, "reordered", (), a.loaded_at)
+    items = [{"item_id": f"i{i}", "genre": "Drama", "maturity": "G", "release_year": 2000, "runtime_min": 60} for i in range(3)]
+    requests = [{"user_row": {"user_id": f"u{k}", "country": "US"}, "item_rows": items, "context": {"hour": k}} for k in range(2)]
+
+    class Sink:
+        def submit(self, model, reqs, scores, versions, X):
+            self.X = X
+
+    sink = Sink()
+    got = rank_candidates_batch(requests, models=[a, c], shadow_model=c, shadow=sink)
+    assert got == [rank_candidates(r["user_row"], r["item_rows"], r["context"], model=m) for r, m in zip(requests, [a, c])]
+    assert sink.X is not None and sink.X.shape[0] == 3  # only the reordered model's own group is reused
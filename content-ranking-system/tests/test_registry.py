@@ -0,0 +1,83 @@
+import threading
+import time
+import lightgbm as lgb
+import numpy as np
+import pytest
+from src.ranking.models.registry import ModelRegistry, RegistryPaths, artifact_version, register_version, save_model
+
+def _booster(rounds):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 4))
+    y = (X[:, 0] > 0).astype(int) + (X[:, 1] > 0.5)
+    params = {"objective": "lambdarank", "num_leaves": 7, "min_data_in_leaf": 5, "verbosity": -1}
+    return lgb.train(params, lgb.Dataset(X, label=y, group=[20] * 30), rounds)
+
+def test_hot_reload_while_saving_never_pairs_a_model_with_another_meta(tmp_path):
+    paths = RegistryPaths(models_dir=str(tmp_path))
+    boosters = {n: _booster(n) for n in (3, 8)}
+    save_model(boosters[3], {"rounds": 3}, paths)
+    registry = ModelRegistry(check_interval_s=0)
+    registry.get(paths)  # later loads run on the reload thread
+
+    stop = threading.Event()
+    def rewrite():
+        i = 0
+        while not stop.is_set():
+            n = (8, 3)[i % 2]
+            save_model(boosters[n], {"rounds": n}, paths)
+            i += 1
+            time.sleep(0.002)
+    writer = threading.Thread(target=rewrite)
+    writer.start()
+    versions = {}
+    try:
+        deadline = time.monotonic() + 2.0
+        while time.monotonic() < deadline:
+            m = registry.get(paths)
+            assert m.booster.num_trees() == m.meta["rounds"] == m.compiled.n_trees
+            versions.setdefault(m.meta["rounds"], set()).add(m.version)
+    finally:
+        stop.set()
+        writer.join()
+    assert set(versions) == {3, 8}  # reloads happened while the files were being replaced
+    assert all(len(v) == 1 for v in versions.values())
+
+    deadline = time.monotonic() + 5.0
+    while registry.get(paths).version != artifact_version(paths) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert registry.get(paths).version == artifact_version(paths)
+
+def test_register_version_promotes_by_pointer(tmp_path):
+    paths = RegistryPaths(models_dir=str(tmp_path))
+    first = register_version(_booster(3), {"rounds": 3}, paths)
+    second = register_version(_booster(8), {"rounds": 8}, paths, promote=False)
+    assert paths.current() == f"versions/{first}"
+    assert ModelRegistry().get(paths).meta == {"rounds": 3, "version_id": first}
+    assert ModelRegistry().get_version(paths, second).meta["rounds"] == 8
+
+def test_first_load_racing_saves_is_retried(tmp_path):
+    paths = RegistryPaths(models_dir=str(tmp_path))
+    boosters = {n: _booster(n) for n in (3, 8)}
+    save_model(boosters[3], {"rounds": 3}, paths)
+
+    stop = threading.Event()
+    def rewrite():
+        i = 0
+        while not stop.is_set():
+            n = (8, 3)[i % 2]
+            save_model(boosters[n], {"rounds": n}, paths)
+            i += 1
+            time.sleep(0.002)
+    writer = threading.Thread(target=rewrite)
+    writer.start()
+    try:
+        for _ in range(30):  # a fresh registry each time: every get is a first load
+            m = ModelRegistry().get(paths)
+            assert m.booster.num_trees() == m.meta["rounds"] == m.compiled.n_trees
+    finally:
+        stop.set()
+        writer.join()
+
+def test_first_load_of_a_missing_model_fails_fast(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ModelRegistry().get(RegistryPaths(models_dir=str(tmp_path)))
@@ -0,0 +1,41 @@
+from src.ranking.api.response_cache import ResponseCache, candidates_digest, context_bucket
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+def test_cache_hits_expires_and_invalidates_on_stamp_change():
+    clock = FakeClock()
+    cache = ResponseCache(max_bytes=1000, ttl_s=10, clock=clock)
+    key = ("u1", candidates_digest(["i2", "i1"]), context_bucket({"device": "tv", "hour": 21}, hour_bucket=3))
+    assert key[1] == candidates_digest(["i1", "i2"]) == candidates_digest(["i1", "i2", "i1"])
+    assert key[2] == context_bucket({"device": "tv", "hour": 23}, hour_bucket=3)
+    assert key[2] != context_bucket({"device": "tv", "hour": 18}, hour_bucket=3)
+
+    assert cache.get(key, ("v1", 0)) is None
+    cache.put(key, ("v1", 0), ["ranked"], nbytes=100)
+    assert cache.get(key, ("v1", 0)) == ["ranked"]
+    assert cache.get(key, ("v2", 0)) is None  # new model version: entry dropped
+    assert cache.get(key, ("v1", 0)) is None
+
+    cache.put(key, ("v2", 1), ["ranked"], nbytes=100)
+    clock.t = 11
+    assert cache.get(key, ("v2", 1)) is None
+    s = cache.stats()
+    assert (s["hit"], s["miss"], s["invalidated"], s["expired"], s["entries"], s["bytes"]) == (1, 4, 1, 1, 0, 0)
+
+def test_cache_evicts_least_recently_used_by_bytes():
+    cache = ResponseCache(max_bytes=250, ttl_s=60)
+    for k in ("a", "b"):
+        cache.put(k, 0, k, nbytes=100)
+    assert cache.get("a", 0) == "a"  # b is now the least recently used
+    cache.put("c", 0, "c", nbytes=100)
+    assert cache.get("b", 0) is None
+    assert cache.get("a", 0) == "a" and cache.get("c", 0) == "c"
+    cache.put("huge", 0, "x", nbytes=1000)  # larger than the cache: not stored
+    s = cache.stats()
+    assert (s["evicted"], s["entries"], s["bytes"]) == (1, 2, 200)
+    assert ResponseCache(max_bytes=0, ttl_s=60).get("a", 0) is None
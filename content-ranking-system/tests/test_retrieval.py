@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from src.ranking.features.online_store import OnlineFeatureStore
+from src.ranking.retrieval.cooccurrence import CooccurrenceIndex, RetrievalConfig, build_cooccurrence_index
+
+def _clustered_log(seed=0):
+    # users 0-19 engage with a* items, users 20-39 with b*; everybody clicks the blockbuster z0
+    rng = np.random.default_rng(seed)
+    rows = []
+    for u in range(40):
+        prefix = "a" if u < 20 else "b"
+        for j in rng.choice(10, size=5, replace=False):
+            rows.append((f"u{u}", f"{prefix}{j}", 2))
+        rows += [(f"u{u}", "z0", 1)] * 3
+    df = pd.DataFrame(rows, columns=["user_id", "item_id", "label"])
+    df["timestamp"] = pd.date_range("2025-01-01", periods=len(df), freq="min")
+    df["watch_minutes"] = 10.0
+    return df
+
+def test_neighbors_come_from_the_same_cluster():
+    index = build_cooccurrence_index(_clustered_log(), RetrievalConfig(pop_weight=0.01))
+    got = index.retrieve(["a1", "a2"], 8, exclude=["a1", "a2", "z0"])
+    assert len(got) == 8 and all(i.startswith("a") for i in got)
+    assert "a1" not in got and "a2" not in got
+
+def test_no_history_falls_back_to_popularity_and_roundtrips(tmp_path):
+    index = build_cooccurrence_index(_clustered_log(), RetrievalConfig(max_neighbors=3))
+    assert index.retrieve([], 1) == ["z0"]
+    assert int(np.diff(index.neighbors.indptr).max()) <= 3
+    path = str(tmp_path / "idx.npz")
+    index.save(path)
+    loaded = CooccurrenceIndex.load(path)
+    assert loaded.retrieve(["b3"], 5) == index.retrieve(["b3"], 5)
+
+def test_online_store_keeps_recent_engaged_items():
+    log = _clustered_log()
+    store = OnlineFeatureStore(recent_items=3)
+    store.ingest_frame(log.iloc[:4])
+    store.ingest({"user_id": "u0", "item_id": "q9", "timestamp": log["timestamp"].iloc[4], "label": 1, "watch_minutes": 1.0})
+    store.ingest({"user_id": "u0", "item_id": "q8", "timestamp": log["timestamp"].iloc[4], "label": 0, "watch_minutes": 0.0})
+    expected = log.iloc[:4].query("user_id == 'u0' and label >= 1")["item_id"].tolist()[-2:] + ["q9"]
+    assert store.recent_items("u0") == expected
+    assert store.recent_items("nobody") == []
@@ -0,0 +1,31 @@
+import json
+import numpy as np
+import pytest
+from src.ranking.inference.shadow import compare_scores
+from src.ranking.models.registry import RegistryPaths, Routing, load_routing
+
+def test_routing_splits_users_by_weight_and_sticks():
+    routing = Routing(arms=(("control", None, 80.0), ("candidate", "v2", 20.0)), salt="exp")
+    arms = [routing.arm(f"u{i}") for i in range(5000)]
+    share = sum(a == ("candidate", "v2") for a in arms) / len(arms)
+    assert 0.17 < share < 0.23
+    assert arms == [routing.arm(f"u{i}") for i in range(5000)]
+    assert routing.arm("u1") == Routing(arms=routing.arms, salt="exp").arm("u1")
+
+def test_load_routing_checks_versions(tmp_path):
+    paths = RegistryPaths(models_dir=str(tmp_path))
+    assert load_routing(paths) is None
+    (tmp_path / "routing.json").write_text(json.dumps({"arms": [{"name": "control"}], "shadow": "v9"}))
+    with pytest.raises(FileNotFoundError):
+        load_routing(paths)
+    (tmp_path / "versions" / "v9").mkdir(parents=True)
+    (tmp_path / "versions" / "v9" / "ltr_model.txt").write_text("")
+    assert load_routing(paths).versions() == [None, "v9"]
+
+def test_compare_scores():
+    p = np.array([3.0, 2.0, 1.0, 0.0])
+    out = compare_scores(p, p[::-1].copy(), top_k=2)
+    assert out["spearman"] == pytest.approx(-1.0)
+    assert out["top2_overlap"] == 0.0 and not out["same_top1"]
+    assert out["mean_abs_delta"] == pytest.approx(2.0)
+    assert compare_scores(p, p + 1, top_k=2)["spearman"] == pytest.approx(1.0)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.ranking.data.splits import random_split, time_split
+from src.ranking.models.train_ltr import CAT_COLS, _build_group_sizes, _encode_frame, _one_hot_encode
+
+def _frame(n: int = 400) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "user_id": rng.choice([f"u{i}" for i in range(15)], n),
+        "session_id": rng.choice(["s1", "s2", None], n),
+        "item_id": rng.choice([f"i{i}" for i in range(60)], n),
+        "age_bucket": "18-24", "country": rng.choice(["US", "IN", None], n), "genre": "Drama", "maturity": "G",
+        "device": rng.choice(["tv", "web"], n),
+        "release_year": rng.integers(1990, 2025, n),
+        "timestamp": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 10**6, n), unit="s"),
+        "label": rng.integers(0, 4, n),
+    })
+
+def test_splits_are_group_sorted_blocks_of_one_frame():
+    df = _frame()
+    sp = time_split(df, 0.6, 0.2, 0.2)
+    assert [len(sp.train), len(sp.val), len(sp.test)] == [240, 80, 80]
+    assert sp.take("train")["timestamp"].max() <= sp.take("val")["timestamp"].min()
+    assert sorted(sp.frame["timestamp"]) == sorted(df["timestamp"])
+    for name in ("train", "val", "test"):
+        sizes = sp.group_sizes(name)
+        assert sizes.sum() == len(getattr(sp, name))
+        np.testing.assert_array_equal(sizes, _build_group_sizes(sp.take(name)))
+    # same membership as shuffling the rows of df
+    idx = np.arange(len(df))
+    np.random.default_rng(7).shuffle(idx)
+    assert sorted(random_split(df, 0.5, 0.5, 0.0, seed=7).take("val")["release_year"]) == sorted(df["release_year"].to_numpy()[idx[200:]])
+    with pytest.raises(ValueError):
+        _build_group_sizes(df)  # unsorted rows: groups are not contiguous
+
+def test_single_encoding_matches_per_split_onehot():
+    sp = random_split(_frame(), 0.3, 0.35, 0.35, seed=1)
+    X, _ = _encode_frame(sp.frame.drop(columns=["label", "timestamp"]), sp.rows("train"), CAT_COLS, {})
+    X_train = _one_hot_encode(sp.take("train").drop(columns=["label", "timestamp"]), CAT_COLS)
+    assert list(X.columns) == list(X_train.columns)
+    for name in ("train", "val", "test"):
+        want = _one_hot_encode(sp.take(name).drop(columns=["label", "timestamp"]), CAT_COLS).reindex(columns=X_train.columns, fill_value=0)
+        np.testing.assert_array_equal(X.iloc[sp.rows(name)].to_numpy(float), want.to_numpy(float))
@@ -0,0 +1,58 @@
+import os
+import numpy as np
+import pandas as pd
+from src.ranking.data.stage_cache import StageCache
+
+def _double(cfg, up):
+    return {"df": up["df"].assign(x=up["df"]["x"] * cfg["factor"]), "n": int(len(up["df"]))}
+
+def _pipeline(root, factor):
+    calls = []
+    cache = StageCache(str(root))
+
+    def source():
+        calls.append("source")
+        return {"df": pd.DataFrame({"x": [1.0, 2.0, 3.0]}), "ids": np.arange(3)}
+
+    src = cache.stage("source", source, config={"rows": 3}, code=[_pipeline])
+    dbl = cache.stage("double", lambda up: _double({"factor": factor}, up), [src], {"factor": factor}, [_double])
+    return cache, src, dbl, calls
+
+def test_second_run_loads_from_cache_and_skips_inputs(tmp_path):
+    cache, src, dbl, calls = _pipeline(tmp_path, 2)
+    first = dbl.value
+    assert [s["status"] for s in cache.report()] == ["miss", "miss"] and calls == ["source"]
+
+    cache, src, dbl, calls = _pipeline(tmp_path, 2)
+    second = dbl.value
+    pd.testing.assert_frame_equal(first["df"], second["df"])
+    assert second["n"] == 3
+    assert [s["status"] for s in cache.report()] == ["skipped", "hit"] and calls == []
+    np.testing.assert_array_equal(src.value["ids"], np.arange(3))
+
+def test_config_change_only_invalidates_downstream(tmp_path):
+    _pipeline(tmp_path, 2)[2].value
+    cache, src, dbl, calls = _pipeline(tmp_path, 3)
+    assert dbl.value["df"]["x"].tolist() == [3.0, 6.0, 9.0]
+    assert [s["status"] for s in cache.report()] == ["hit", "miss"] and calls == []
+
+def test_disabled_cache_always_recomputes(tmp_path):
+    _pipeline(tmp_path, 2)[2].value
+    cache, src, dbl, calls = _pipeline(tmp_path, 2)
+    cache.enabled = False
+    dbl.value
+    assert [s["status"] for s in cache.report()] == ["uncached", "uncached"] and calls == ["source"]
+
+def test_each_stage_keeps_only_its_most_recently_used_keys(tmp_path):
+    for factor in (2, 3, 4, 5):
+        _pipeline(tmp_path, factor)[2].value
+    keys = lambda: sorted(os.listdir(tmp_path / "double"))
+    assert len(keys()) == 3 and len(os.listdir(tmp_path / "source")) == 1
+
+    cache, _, dbl, _ = _pipeline(tmp_path, 3)  # a hit makes factor 3 the most recent
+    dbl.value
+    _pipeline(tmp_path, 6)[2].value
+    _pipeline(tmp_path, 7)[2].value
+    cache, _, dbl, _ = _pipeline(tmp_path, 3)
+    dbl.value
+    assert cache.report()[1]["status"] == "hit" and len(keys()) == 3
@@ -0,0 +1,46 @@
+import os
+import numpy as np
+import lightgbm as lgb
+from src.ranking.models.tune import DEFAULT_SPACE, TRAIN_BIN, VAL_BIN, run_trial, sample_params, should_prune
+
+MODEL_CFG = {
+    "objective": "lambdarank", "metric": "ndcg", "boosting_type": "gbdt", "num_leaves": 7,
+    "learning_rate": 0.1, "min_data_in_leaf": 5, "feature_fraction": 1.0, "bagging_fraction": 1.0,
+    "bagging_freq": 0, "lambda_l1": 0.0, "lambda_l2": 0.0, "random_state": 0, "n_estimators": 50,
+}
+TUNE_CFG = {"eval_k": 5, "threads_per_trial": 1, "pruning": True, "prune_every": 10, "prune_min_trials": 2, "prune_warmup_rounds": 10}
+
+def _save_binaries(d):
+    rng = np.random.default_rng(0)
+    train = None
+    for name, n_groups in [(TRAIN_BIN, 60), (VAL_BIN, 20)]:
+        X = rng.normal(size=(n_groups * 10, 4))
+        y = np.clip((X[:, 0] + rng.normal(scale=0.5, size=len(X)) + 1).round(), 0, 3).astype(int)
+        ds = lgb.Dataset(X, label=y, group=[10] * n_groups, reference=train, params={"feature_pre_filter": False, "verbosity": -1})
+        ds.save_binary(os.path.join(d, name))
+        train = ds
+
+def test_sample_params_deterministic_and_in_range():
+    a = sample_params(DEFAULT_SPACE, 10, seed=3)
+    assert a == sample_params(DEFAULT_SPACE, 10, seed=3)
+    for p in a:
+        assert p["num_leaves"] in DEFAULT_SPACE["num_leaves"]
+        assert 0.01 <= p["learning_rate"] <= 0.2
+        assert isinstance(p["min_data_in_leaf"], int) and 5 <= p["min_data_in_leaf"] <= 100
+
+def test_should_prune_needs_enough_trials():
+    assert not should_prune(0.1, [0.9], min_trials=2)
+    assert should_prune(0.1, [0.9, 0.8], min_trials=2)
+    assert not should_prune(0.95, [0.9, 0.8], min_trials=2)
+
+def test_trial_on_saved_binaries_completes_or_is_pruned(tmp_path):
+    _save_binaries(str(tmp_path))
+    row = run_trial(0, {"num_leaves": 3}, str(tmp_path), MODEL_CFG, {"early_stopping_rounds": 100}, TUNE_CFG, {})
+    assert row["status"] == "complete" and 0.0 < row["NDCG@5"] <= 1.0
+
+    # every other trial was perfect at round 10 -> this one stops there
+    shared = {(1, 10): 1.0, (2, 10): 1.0}
+    row = run_trial(3, {"num_leaves": 3}, str(tmp_path), MODEL_CFG, {"early_stopping_rounds": 100}, TUNE_CFG, shared)
+    assert row["status"] == "pruned" and row["rounds"] == 10
+    assert row["NDCG@5"] is None and row["best_iteration"] is None and 0.0 < row["NDCG@5_at_prune"] <= 1.0
+    assert (3, 10) in shared